@@ -0,0 +1,149 @@
+# analytics.py
+
+# Per-user time-bucketed rollups of score_history. Ingest adds each new score into
+# its daily and weekly bucket (per mod combination), so the analytics endpoint reads
+# one row per bucket instead of aggregating raw scores. The rollups can always be
+# rebuilt from score_history (plus the archive) with rebuild_rollups().
+from datetime import date, timedelta
+from psycopg2.extras import execute_values
+from archive import archived_scores
+from scoring import bitmask_to_combination
+
+# period -> (table, Postgres date_trunc unit)
+ROLLUP_PERIODS = {
+    'day': ('score_rollups_daily', 'day'),
+    'week': ('score_rollups_weekly', 'week'),
+}
+
+def create_rollup_tables(cur):
+    for table, _ in ROLLUP_PERIODS.values():
+        cur.execute(f"""
+            CREATE TABLE IF NOT EXISTS {table} (
+                user_id BIGINT,
+                bucket DATE,
+                mod_combination TEXT,
+                plays INT DEFAULT 0,
+                fc_count INT DEFAULT 0,
+                acc_sum FLOAT DEFAULT 0,
+                eff_stars_sum FLOAT DEFAULT 0,
+                PRIMARY KEY (user_id, bucket, mod_combination)
+            );
+        """)
+
+def bucket_start(ts, period):
+    """Start date of the bucket a timestamp falls in (weeks start on Monday, like date_trunc)."""
+    day = ts.date() if hasattr(ts, 'date') else ts
+    if period == 'week':
+        return day - timedelta(days=day.weekday())
+    return day
+
+def record_scores(cur, user_id, scores):
+    """
+    Adds freshly ingested scores to the rollups.
+    scores: iterable of (timestamp, mod_combination, is_fc, accuracy, effective_stars)
+    """
+    scores = list(scores)
+    if not scores: return
+
+    for period, (table, _) in ROLLUP_PERIODS.items():
+        buckets = {}
+        for ts, mod_combination, is_fc, acc, eff_stars in scores:
+            _add_to_bucket(buckets, (bucket_start(ts, period), mod_combination or 'NM'), 1, 1 if is_fc else 0, acc or 0, eff_stars or 0)
+        _upsert_buckets(cur, table, user_id, buckets)
+
+def _add_to_bucket(buckets, key, plays, fc_count, acc_sum, eff_sum):
+    b = buckets.setdefault(key, [0, 0, 0.0, 0.0])
+    b[0] += plays
+    b[1] += fc_count
+    b[2] += acc_sum
+    b[3] += eff_sum
+
+def _upsert_buckets(cur, table, user_id, buckets):
+    if not buckets: return
+    execute_values(cur, f"""
+        INSERT INTO {table} (user_id, bucket, mod_combination, plays, fc_count, acc_sum, eff_stars_sum)
+        VALUES %s
+        ON CONFLICT (user_id, bucket, mod_combination) DO UPDATE SET
+            plays = {table}.plays + EXCLUDED.plays,
+            fc_count = {table}.fc_count + EXCLUDED.fc_count,
+            acc_sum = {table}.acc_sum + EXCLUDED.acc_sum,
+            eff_stars_sum = {table}.eff_stars_sum + EXCLUDED.eff_stars_sum
+    """, [(user_id, k[0], k[1], *v) for k, v in buckets.items()])
+
+def rebuild_rollups(cur, user_id):
+    """Recomputes a user's rollups from score_history and score_archive (offline repair / after reclassification)."""
+    delete_rollups(cur, user_id)
+
+    # Daily totals per stored mod bitmask; weeks are summed from the days
+    cur.execute("""
+        SELECT timestamp::date, mod_bits, COUNT(*), COUNT(*) FILTER (WHERE is_fc),
+               COALESCE(SUM(accuracy), 0), COALESCE(SUM(effective_stars), 0)
+        FROM score_history
+        WHERE user_id = %s AND timestamp IS NOT NULL
+        GROUP BY 1, 2
+    """, (user_id,))
+    days = cur.fetchall()
+    # Archived detail rows still count towards their buckets
+    days += [
+        (a['timestamp'].date(), a['mod_bits'], 1, 1 if a['is_fc'] else 0, a['accuracy'] or 0, a['effective_stars'] or 0)
+        for a in archived_scores(cur, user_id) if a['timestamp']
+    ]
+
+    for period, (table, _) in ROLLUP_PERIODS.items():
+        buckets = {}
+        for day, mod_bits, plays, fc_count, acc_sum, eff_sum in days:
+            _add_to_bucket(buckets, (bucket_start(day, period), bitmask_to_combination(mod_bits)), plays, fc_count, acc_sum, eff_sum)
+        _upsert_buckets(cur, table, user_id, buckets)
+
+def delete_rollups(cur, user_id):
+    for table, _ in ROLLUP_PERIODS.values():
+        cur.execute(f"DELETE FROM {table} WHERE user_id = %s", (user_id,))
+
+def get_analytics(cur, user_id, period='day', days=30):
+    """
+    Returns chart-ready series from the rollups:
+    {'period', 'buckets': [iso dates], 'series': {mod_combination | 'ALL': [point or None per bucket]}}
+    Each point has plays, fc_rate, avg_acc and avg_eff_stars.
+    """
+    table, _ = ROLLUP_PERIODS[period]
+    since = bucket_start(date.today() - timedelta(days=days), period)
+    cur.execute(f"""
+        SELECT bucket, mod_combination, plays, fc_count, acc_sum, eff_stars_sum
+        FROM {table}
+        WHERE user_id = %s AND bucket >= %s
+        ORDER BY bucket
+    """, (user_id, since))
+    rows = cur.fetchall()
+
+    buckets = sorted({r[0] for r in rows})
+    index = {b: i for i, b in enumerate(buckets)}
+    totals = {}
+    for bucket, mod_combination, plays, fc_count, acc_sum, eff_sum in rows:
+        for key in (mod_combination, 'ALL'):
+            series = totals.setdefault(key, [None] * len(buckets))
+            point = series[index[bucket]] or [0, 0, 0.0, 0.0]
+            point[0] += plays
+            point[1] += fc_count
+            point[2] += acc_sum
+            point[3] += eff_sum
+            series[index[bucket]] = point
+
+    return {
+        'period': period,
+        'buckets': [b.isoformat() for b in buckets],
+        'series': {
+            key: [_format_point(p) for p in points]
+            for key, points in totals.items()
+        }
+    }
+
+def _format_point(point):
+    if not point or point[0] == 0:
+        return None
+    plays, fc_count, acc_sum, eff_sum = point
+    return {
+        'plays': plays,
+        'fc_rate': round(fc_count / plays, 4),
+        'avg_acc': round(acc_sum / plays * 100, 2),
+        'avg_eff_stars': round(eff_sum / plays, 3)
+    }
@@ -1,17 +1,51 @@
 import os
-import requests
 import psycopg2
 import json
 import csv
 import io
 import traceback
+import hashlib
+import time
+from datetime import datetime
 from flask import Flask, redirect, request, session, url_for, render_template, make_response, jsonify
 from dotenv import load_dotenv
+from scoring import MASTERY_WEIGHT, get_mod_group, calculate_effective_stars, classify_fc, difficulty_mod_bitmask, mods_to_bitmask, bitmask_to_mods, bitmask_to_combination, matching_mod_bitmask, parse_mod_combination
+from beatmaps import create_beatmaps_table, beatmap_from_api, upsert_beatmaps, ensure_beatmaps
+from beatmap_search import create_search_indexes, search_beatmaps
+from difficulty import create_attributes_table, get_difficulty_attributes
+from analytics import ROLLUP_PERIODS, create_rollup_tables, record_scores, delete_rollups, get_analytics
+from goals_definitions import get_goal_by_id
+from goal_progress import STREAK_BREAK_RULES, DEFAULT_STREAK_BREAK, MOD_MATCH_RULES, DEFAULT_MOD_MATCH, GoalBatch, goal_facts
+from windows import GOAL_WINDOWS, to_epoch, window_progress
+from assets import register_assets
+from osu_api import OSU_AUTHORIZE_URL, get_me, get_recent_scores, exchange_code, rate_limit_retry_after
+from sync_lock import SYNC_ACQUIRED, SYNC_WAITED, SYNC_BUSY, acquire_sync_lock, synced_recently, mark_synced
+from goal_engine import create_achievements_table, score_facts, apply_scores, assign_achievement, reset_achievements, get_achievements
+from archive import create_score_history_table, create_archive_tables, fc_star_counts, archived_scores, delete_archive
+from dashboard_cache import create_dashboard_cache, get_state_version, bump_state_version
+from db import PRIMARY_PIN_SECONDS, run_read, on_replica
+from rank_history import create_rank_history_table, record_rank, get_rank_series, delete_rank_history
+from performance import create_performance_table, record_performance, delete_performance
+from recommendations import get_recommendations
+from quantiles import METRICS, create_sketch_table, record_sketches, delete_sketches, get_quantiles
+from poll_schedule import SHED_RETRY_SECONDS, SyncSlot, overloaded, next_poll_seconds
+from leaderboards import BOARDS, create_leaderboard_tables, refresh_in_background_if_stale, get_top, get_position, get_refreshed_at
+from goal_reconcile import create_reconcile_tables
+from token_store import check_token_key, create_token_table, save_tokens, get_access_token, expire_access_token, refresh_in_background_if_due, delete_tokens
+from challenges import (create_challenge_tables, create_challenge, join_challenge, leave_challenge, ChallengeBatch,
+                        compact_in_background_if_due, get_standings, get_user_challenges, delete_challenge_memberships)
 
 load_dotenv()
 
 app = Flask(__name__)
 app.secret_key = os.environ.get("FLASK_SECRET_KEY")
+# Fingerprinted, precompressed static files (asset_url() in templates)
+register_assets(app)
+# Rendered dashboard shell (contains no user data)
+_shell_cache = {}
+# Per-user dashboard state, keyed by osu_users.state_version (see dashboard_cache.py).
+# Serialized with the app's JSON provider so cached values render exactly like fresh ones.
+_dashboard_cache = create_dashboard_cache(app.json.dumps, app.json.loads)
 
 # --- CONFIGURATION ---
 CLIENT_ID = os.environ.get("OSU_CLIENT_ID")
@@ -19,11 +53,30 @@ CLIENT_SECRET = os.environ.get("OSU_CLIENT_SECRET")
 # NOTE: Update this to your Render/Vercel URL callback when deploying
 REDIRECT_URI = os.environ.get("REDIRECT_URI", "http://127.0.0.1:5000/callback") 
 DATABASE_URL = os.environ.get("DATABASE_URL")
+# Refuse to start without a key for the stored osu! tokens (token_store.py)
+check_token_key()
 
 # --- DATABASE HELPERS ---
 def get_db_connection():
     return psycopg2.connect(DATABASE_URL)
 
+def run_read_query(read):
+    """Read-only routes: read(cur) on DATABASE_READ_URL if set and healthy, unless this session just wrote (see db.py)."""
+    return run_read(read, get_db_connection, pinned=session.get('primary_until', 0) > time.time())
+
+def user_access_token(cur):
+    """The session user's osu! token from the token store, refreshed if it is about to expire (token_store.py)."""
+    # Sessions from before the token store still carry the access token in the cookie
+    return get_access_token(cur, session['user_id'], get_db_connection) or session.get('token')
+
+def mark_state_changed(cur, user_id):
+    """
+    After a write the user will read back: invalidates their cached dashboard (in this
+    transaction) and sends this session's replica reads to the primary for a while.
+    """
+    bump_state_version(cur, user_id)
+    session['primary_until'] = time.time() + PRIMARY_PIN_SECONDS
+
 def init_db():
     """Initializes the database tables if they don't exist. (V6: Final Schema)"""
     try:
@@ -35,7 +88,9 @@ def init_db():
             CREATE TABLE IF NOT EXISTS osu_users (
                 user_id BIGINT PRIMARY KEY, 
                 username TEXT, 
-                global_rank INT
+                global_rank INT,
+                last_synced_at TIMESTAMP,
+                state_version BIGINT NOT NULL DEFAULT 0
             );
         """)
         
@@ -63,29 +118,18 @@ def init_db():
                 is_locked BOOLEAN DEFAULT FALSE, 
                 is_paused BOOLEAN DEFAULT FALSE,
                 assigned_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                completed_at TIMESTAMP
+                completed_at TIMESTAMP,
+                streak_current INT DEFAULT 0,
+                streak_best INT DEFAULT 0,
+                streak_last_score_id BIGINT,
+                window_state JSONB
             );
         """)
         
-        cur.execute("""
-            CREATE TABLE IF NOT EXISTS score_history (
-                id SERIAL PRIMARY KEY, 
-                user_id BIGINT, 
-                osu_score_id BIGINT, 
-                beatmap_name TEXT, 
-                mods TEXT, 
-                mod_combination TEXT,
-                stars FLOAT, 
-                effective_stars FLOAT, 
-                accuracy FLOAT, 
-                timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                is_fc BOOLEAN DEFAULT FALSE,
-                is_pfc BOOLEAN DEFAULT FALSE,
-                beatmap_id BIGINT,
-                map_length INT,
-                max_combo INT
-            );
-        """)
+        # Hash-partitioned by user_id (see archive.py)
+        create_score_history_table(cur)
+        # Cold tier for archived score rows + their FC aggregates
+        create_archive_tables(cur)
         
         # Table to track which scores contributed to which goals
         cur.execute("""
@@ -99,17 +143,75 @@ def init_db():
             );
         """)
         
-        # Add columns if they don't exist (for existing databases)
+        # Beatmap metadata cache, referenced by score_history.beatmap_id
+        create_beatmaps_table(cur)
+        # Mod-adjusted star ratings per (beatmap_id, mods)
+        create_attributes_table(cur)
+        # Daily/weekly analytics rollups
+        create_rollup_tables(cur)
+        # Leaderboard snapshots (+ indexes backing the refresh)
+        create_leaderboard_tables(cur)
+        # Per-user state for the predetermined achievements (goal_engine)
+        create_achievements_table(cur)
+        # Global rank samples (written on change, downsampled over time)
+        create_rank_history_table(cur)
+        # Per mod/star bucket aggregates for goal recommendations
+        create_performance_table(cur)
+        # Monthly quantile sketches per mod combination and star bucket
+        create_sketch_table(cur)
+        create_challenge_tables(cur)
+        create_reconcile_tables(cur)
+        create_token_table(cur)
+        
+        # Add columns if they don't exist (for existing databases). Each one runs under a
+        # savepoint: a failed ALTER would otherwise abort the transaction for everything after it.
+        column_upgrades = [
+            "ALTER TABLE score_history ADD COLUMN IF NOT EXISTS mod_bits INT;",
+            "ALTER TABLE score_history ADD COLUMN IF NOT EXISTS beatmap_id BIGINT;",
+            "ALTER TABLE score_history ADD COLUMN IF NOT EXISTS map_length INT;",
+            "ALTER TABLE score_history ADD COLUMN IF NOT EXISTS max_combo INT;",
+            "ALTER TABLE score_history ADD COLUMN IF NOT EXISTS is_fc BOOLEAN DEFAULT FALSE;",
+            "ALTER TABLE score_history ADD COLUMN IF NOT EXISTS is_pfc BOOLEAN DEFAULT FALSE;",
+            "ALTER TABLE user_active_goals ADD COLUMN IF NOT EXISTS completed_at TIMESTAMP;",
+            "ALTER TABLE score_history ADD COLUMN IF NOT EXISTS score_rank TEXT;",
+            "ALTER TABLE score_history ADD COLUMN IF NOT EXISTS miss_count INT;",
+            "ALTER TABLE score_history ADD COLUMN IF NOT EXISTS map_max_combo INT;",
+            "ALTER TABLE score_history ADD COLUMN IF NOT EXISTS stars_adjusted BOOLEAN DEFAULT FALSE;",
+            "ALTER TABLE user_active_goals ADD COLUMN IF NOT EXISTS streak_current INT DEFAULT 0;",
+            "ALTER TABLE user_active_goals ADD COLUMN IF NOT EXISTS streak_best INT DEFAULT 0;",
+            "ALTER TABLE user_active_goals ADD COLUMN IF NOT EXISTS streak_last_score_id BIGINT;",
+            "ALTER TABLE user_active_goals ADD COLUMN IF NOT EXISTS window_state JSONB;",
+            "ALTER TABLE osu_users ADD COLUMN IF NOT EXISTS last_synced_at TIMESTAMP;",
+            "ALTER TABLE osu_users ADD COLUMN IF NOT EXISTS state_version BIGINT NOT NULL DEFAULT 0;",
+            "ALTER TABLE osu_users ADD COLUMN IF NOT EXISTS last_played_at TIMESTAMPTZ;",
+            "ALTER TABLE beatmaps ADD COLUMN IF NOT EXISTS play_count INT DEFAULT 0;",
+            """
+            ALTER TABLE beatmaps ADD COLUMN IF NOT EXISTS search_text TEXT GENERATED ALWAYS AS (
+                lower(COALESCE(artist, '') || ' ' || COALESCE(title, '') || ' ' || COALESCE(version, ''))
+            ) STORED;
+            """,
+        ]
+        for statement in column_upgrades:
+            cur.execute("SAVEPOINT add_column")
+            try:
+                cur.execute(statement)
+                cur.execute("RELEASE SAVEPOINT add_column")
+            except psycopg2.Error as e:
+                cur.execute("ROLLBACK TO SAVEPOINT add_column")
+                print(f">>> Skipped schema upgrade ({(e.pgerror or str(e)).strip()}): {' '.join(statement.split())}")
+
+        # Beatmap autocomplete (trigram index when pg_trgm is available)
+        create_search_indexes(cur)
+
+        # One row per (user, osu! score), on top of the sync lock and ingest's NOT EXISTS check.
+        # Fails on databases that still hold duplicates; update.py (v17) removes them first.
+        cur.execute("SAVEPOINT score_history_unique")
         try:
-            cur.execute("ALTER TABLE score_history ADD COLUMN IF NOT EXISTS mod_combination TEXT;")
-            cur.execute("ALTER TABLE score_history ADD COLUMN IF NOT EXISTS beatmap_id BIGINT;")
-            cur.execute("ALTER TABLE score_history ADD COLUMN IF NOT EXISTS map_length INT;")
-            cur.execute("ALTER TABLE score_history ADD COLUMN IF NOT EXISTS max_combo INT;")
-            cur.execute("ALTER TABLE score_history ADD COLUMN IF NOT EXISTS is_fc BOOLEAN DEFAULT FALSE;")
-            cur.execute("ALTER TABLE score_history ADD COLUMN IF NOT EXISTS is_pfc BOOLEAN DEFAULT FALSE;")
-            cur.execute("ALTER TABLE user_active_goals ADD COLUMN IF NOT EXISTS completed_at TIMESTAMP;")
-        except:
-            pass  # Columns might already exist
+            cur.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_score_history_user_score ON score_history (user_id, osu_score_id);")
+            cur.execute("RELEASE SAVEPOINT score_history_unique")
+        except psycopg2.Error as e:
+            cur.execute("ROLLBACK TO SAVEPOINT score_history_unique")
+            print(f">>> Skipped unique score index ({e.pgerror or e}). Syncs still work; run update.py to de-duplicate score_history.")
         
         conn.commit()
         cur.close()
@@ -118,7 +220,7 @@ def init_db():
     except Exception as e:
         print(f">>> Database initialization failed: {e}")
 
-def save_user_to_db(user_data):
+def save_user_to_db(user_data, tokens):
     conn = get_db_connection()
     cur = conn.cursor()
     
@@ -131,21 +233,18 @@ def save_user_to_db(user_data):
     """
     rank = user_data['statistics'].get('global_rank') or 0
     cur.execute(sql, (user_data['id'], user_data['username'], rank))
+    record_rank(cur, user_data['id'], rank)
     
     # 2. Ensure Mastery Row Exists
     cur.execute("INSERT INTO user_mastery (user_id) VALUES (%s) ON CONFLICT (user_id) DO NOTHING;", (user_data['id'],))
+
+    # 3. Keep the OAuth tokens server-side (encrypted, refreshed before they expire)
+    save_tokens(cur, user_data['id'], tokens)
     
     conn.commit()
     cur.close()
     conn.close()
 
-def calculate_effective_stars(stars, acc, max_combo, map_max_combo):
-    if map_max_combo and map_max_combo > 0:
-        combo_ratio = max_combo / map_max_combo
-    else:
-        combo_ratio = 1.0
-    return stars * (acc ** 3) * combo_ratio
-
 # --- MAIN ROUTES ---
 
 @app.route('/')
@@ -153,21 +252,141 @@ def home():
     if 'user_id' not in session:
         return render_template('login.html')
 
+    # The dashboard is a static shell (same HTML for everyone, so reloads revalidate to a 304);
+    # static/dashboard.js fills it from /bootstrap
+    if 'index.html' not in _shell_cache:
+        _shell_cache['index.html'] = render_template('index.html')
+    response = make_response(_shell_cache['index.html'])
+    response.set_etag(hashlib.sha1(response.get_data()).hexdigest())
+    response.headers['Cache-Control'] = 'private, no-cache'
+    response.headers['Vary'] = 'Cookie'
+    return response.make_conditional(request)
+
+def _window_ref(criteria, window_state):
+    """What apply_window_progress() needs for a windowed goal (None for other goals)."""
+    window = (criteria or {}).get('window')
+    if window not in GOAL_WINDOWS: return None
+    return {'window': window, 'state': window_state}
+
+def apply_window_progress(goals, key):
+    """Replaces goal[key] with the current in-window count. Runs after the cache read, since it depends on the clock."""
+    for goal in goals:
+        ref = goal.pop('_window', None)
+        if ref:
+            goal[key] = window_progress({'window': ref['window']}, ref['state'])
+    return goals
+
+def read_dashboard(cur, user_id):
+    """Everything /bootstrap shows apart from the user and rank. Cached by get_or_load, so it must be JSON-able."""
+    # 2. Fetch Mastery Stats
+    cur.execute("SELECT nm_rating, hd_rating, hr_rating, dt_rating, fl_rating FROM user_mastery WHERE user_id = %s", (user_id,))
+    stats = cur.fetchone()
+    if not stats: stats = (0, 0, 0, 0, 0)
+
+    # 3. Fetch Active Goals
+    cur.execute("""
+        SELECT id, title, current_progress, target_progress, criteria, is_locked, is_paused, streak_best, window_state
+        FROM user_active_goals 
+        WHERE user_id = %s AND is_completed = FALSE
+        ORDER BY display_order ASC, assigned_at DESC
+    """, (user_id,))
+    active_rows = cur.fetchall()
+    
+    formatted_goals = []
+    for row in active_rows:
+        # FIX: Handle NULL/None values for current_progress
+        current_prog = row[2] if row[2] is not None else 0
+        
+        formatted_goals.append({
+            "id": row[0],
+            "title": row[1],
+            "current_count": current_prog, 
+            "count_needed": row[3],
+            "criteria": row[4],
+            "is_locked": row[5],
+            "is_paused": row[6],
+            "type": row[4].get('type', 'count').upper(),
+            "is_streak": row[4].get('streak', False),
+            "streak_best": row[7] or 0,
+            "window_label": GOAL_WINDOWS[row[4]['window']][0] if row[4].get('window') in GOAL_WINDOWS else None,
+            # Windowed goals: plays age out of the window, so their count is computed on every read
+            "_window": _window_ref(row[4], row[8])
+        })
+
+    # 4. Fetch Star Counts (V6: Strict FCs only)
+    star_data = fc_star_counts(cur, user_id)
+
+    # 5. Fetch persistent feed (last 100 scores)
+    cur.execute("""
+        SELECT COALESCE(b.title, sh.beatmap_name), sh.mod_bits, sh.stars, sh.is_fc, sh.timestamp
+        FROM score_history sh
+        LEFT JOIN beatmaps b ON b.beatmap_id = sh.beatmap_id
+        WHERE sh.user_id = %s 
+        ORDER BY sh.timestamp DESC 
+        LIMIT 100
+    """, (user_id,))
+    persistent_feed = []
+    for row in cur.fetchall():
+        persistent_feed.append({
+            'title': row[0],
+            'mod_combination': bitmask_to_combination(row[1]),
+            'stars': round(row[2], 2),
+            'is_fc': row[3],
+            'timestamp': row[4].isoformat() if row[4] else ''
+        })
+
+    # 6. Fetch Completed Goals
+    cur.execute("""
+        SELECT id, title, current_progress, target_progress, criteria, COALESCE(completed_at, assigned_at) as completed_at
+        FROM user_active_goals 
+        WHERE user_id = %s AND is_completed = TRUE
+        ORDER BY COALESCE(completed_at, assigned_at) DESC
+    """, (user_id,))
+    completed_rows = cur.fetchall()
+    
+    completed_goals = []
+    for row in completed_rows:
+        completed_goals.append({
+            "id": row[0],
+            "title": row[1],
+            "current_count": row[2] if row[2] is not None else 0,
+            "count_needed": row[3],
+            "criteria": row[4],
+            "completed_at": row[5].strftime('%Y-%m-%d %H:%M') if row[5] else None,  # Using assigned_at as completion time for now
+            "type": row[4].get('type', 'count').upper() if row[4] else 'COUNT'
+        })
+
+    # 7. Predetermined achievements
+    achievements = get_achievements(cur, user_id)
+
+    return {
+        'goals': formatted_goals,
+        'completed_goals': completed_goals,
+        'stats': list(stats),
+        'fc_counts': star_data,
+        'persistent_feed': persistent_feed,
+        'achievements': achievements
+    }
+
+@app.route('/bootstrap')
+def bootstrap():
+    if 'user_id' not in session: return jsonify({'error': 'Unauthorized'}), 401
+
     try:
         conn = get_db_connection()
         cur = conn.cursor()
 
         # 1. Fetch User Info and refresh rank from API
-        token = session.get('token')
+        token = user_access_token(cur)
         if token:
             try:
-                headers = {'Authorization': f'Bearer {token}'}
-                user_response = requests.get('https://osu.ppy.sh/api/v2/me/osu', headers=headers)
+                user_response = get_me(token)
                 if user_response.status_code == 200:
                     user_data = user_response.json()
                     current_rank = user_data['statistics'].get('global_rank') or 0
                     # Update rank in database
                     cur.execute("UPDATE osu_users SET global_rank = %s WHERE user_id = %s", (current_rank, session['user_id']))
+                    record_rank(cur, session['user_id'], current_rank)
                     conn.commit()
                 else:
                     # Fallback to database rank
@@ -185,93 +404,19 @@ def home():
             current_rank = user_row[1] if user_row and user_row[1] else 0
 
         # SAFETY CHECK: If user is in session (cookies) but not in DB, force logout
-        cur.execute("SELECT username FROM osu_users WHERE user_id = %s", (session['user_id'],))
-        user_row = cur.fetchone()
-        if not user_row:
+        state_version = get_state_version(cur, session['user_id'])
+        if state_version is None:
             cur.close()
             conn.close()
             session.clear()
-            return redirect('/')
+            return jsonify({'error': 'Unauthorized'}), 401
 
-        # 2. Fetch Mastery Stats
-        cur.execute("SELECT nm_rating, hd_rating, hr_rating, dt_rating, fl_rating FROM user_mastery WHERE user_id = %s", (session['user_id'],))
-        stats = cur.fetchone()
-        if not stats: stats = (0, 0, 0, 0, 0)
-
-        # 3. Fetch Active Goals
-        cur.execute("""
-            SELECT id, title, current_progress, target_progress, criteria, is_locked, is_paused
-            FROM user_active_goals 
-            WHERE user_id = %s AND is_completed = FALSE
-            ORDER BY display_order ASC, assigned_at DESC
-        """, (session['user_id'],))
-        active_rows = cur.fetchall()
-        
-        formatted_goals = []
-        for row in active_rows:
-            # FIX: Handle NULL/None values for current_progress
-            current_prog = row[2] if row[2] is not None else 0
-            
-            formatted_goals.append({
-                "id": row[0],
-                "title": row[1],
-                "current_count": current_prog, 
-                "count_needed": row[3],
-                "criteria": row[4],
-                "is_locked": row[5],
-                "is_paused": row[6],
-                "type": row[4].get('type', 'count').upper()
-            })
-
-        # 4. Fetch Star Counts (V6: Strict FCs only)
-        cur.execute("""
-            SELECT FLOOR(stars) as star_int, COUNT(*) 
-            FROM score_history 
-            WHERE user_id = %s AND is_fc = TRUE
-            GROUP BY star_int 
-            ORDER BY star_int
-        """, (session['user_id'],))
-        hist_rows = cur.fetchall()
-        star_data = {int(r[0]): r[1] for r in hist_rows}
-
-        # 5. Fetch persistent feed (last 100 scores)
-        cur.execute("""
-            SELECT beatmap_name, mod_combination, stars, is_fc, timestamp
-            FROM score_history 
-            WHERE user_id = %s 
-            ORDER BY timestamp DESC 
-            LIMIT 100
-        """, (session['user_id'],))
-        persistent_feed = []
-        for row in cur.fetchall():
-            persistent_feed.append({
-                'title': row[0],
-                'mod_combination': row[1] or 'NM',
-                'stars': round(row[2], 2),
-                'is_fc': row[3],
-                'timestamp': row[4].isoformat() if row[4] else ''
-            })
-
-        # 6. Fetch Completed Goals
-        cur.execute("""
-            SELECT id, title, current_progress, target_progress, criteria, COALESCE(completed_at, assigned_at) as completed_at
-            FROM user_active_goals 
-            WHERE user_id = %s AND is_completed = TRUE
-            ORDER BY COALESCE(completed_at, assigned_at) DESC
-        """, (session['user_id'],))
-        completed_rows = cur.fetchall()
-        
-        completed_goals = []
-        for row in completed_rows:
-            completed_goals.append({
-                "id": row[0],
-                "title": row[1],
-                "current_count": row[2] if row[2] is not None else 0,
-                "count_needed": row[3],
-                "criteria": row[4],
-                "completed_at": row[5],  # Using assigned_at as completion time for now
-                "type": row[4].get('type', 'count').upper() if row[4] else 'COUNT'
-            })
+        # 2-7. Everything else comes from the cache until ingest or a goal change bumps the state version
+        user_id = session['user_id']
+        # (loaded from the read replica once it has replayed this version)
+        dashboard = _dashboard_cache.get_or_load('bootstrap', user_id, state_version, lambda: on_replica(
+            lambda read_cur: read_dashboard(read_cur, user_id), cur, user_id, state_version))
+        formatted_goals = apply_window_progress(dashboard['goals'], 'current_count')
 
         cur.close()
         conn.close()
@@ -282,22 +427,111 @@ def home():
             'id': session['user_id']
         }
 
-        return render_template('index.html', 
-                               user=user_obj, 
-                               rank=current_rank,
-                               goals=formatted_goals,
-                               completed_goals=completed_goals,
-                               stats=stats,
-                               star_data=star_data,
-                               persistent_feed=persistent_feed)
+        response = jsonify({
+            'user': user_obj,
+            'rank': current_rank,
+            'goals': formatted_goals,
+            'completed_goals': dashboard['completed_goals'],
+            'stats': dashboard['stats'],
+            'fc_counts': dashboard['fc_counts'],
+            'persistent_feed': dashboard['persistent_feed'],
+            'achievements': dashboard['achievements']
+        })
+        # Unchanged dashboards revalidate to a 304 instead of re-sending the payload
+        response.set_etag(hashlib.sha1(response.get_data()).hexdigest())
+        response.headers['Cache-Control'] = 'private, no-cache'
+        return response.make_conditional(request)
     except Exception as e:
         # Debugging: Print error to console for Render Logs
-        print(f"Error in home route: {e}")
+        print(f"Error in bootstrap route: {e}")
         traceback.print_exc()
-        return f"App Error: {e}", 500
+        return jsonify({'error': 'Internal Error', 'details': str(e)}), 500
 
 # --- GOAL MANAGEMENT ROUTES ---
 
+def parse_goal_form(data):
+    """(count, criteria, title) from the goal form fields (/add_goal, also used for group challenges)."""
+    # 1. Safe conversions
+    try:
+        count = int(data.get('count_needed', 1))
+    except (ValueError, TypeError):
+        count = 1
+
+    try:
+        min_stars = float(data.get('target_stars', 0))
+    except (ValueError, TypeError):
+        min_stars = 0.0
+    
+    goal_type = data.get('type', 'count')
+    use_acc = data.get('use_accuracy', False)
+    
+    try:
+        acc_needed = float(data.get('accuracy_needed', 0)) if use_acc else 0
+    except (ValueError, TypeError):
+        acc_needed = 0.0
+
+    # V6: New Mod Field - now always uses mod combination from checkboxes
+    use_mod_combo = data.get('use_mod_combo', True)  # Default to True since we always use checkboxes now
+    mod_combination = data.get('mod_combination', 'NM')  # Default to NM if not provided
+    mod_match = data.get('mod_match', DEFAULT_MOD_MATCH)
+    if mod_match not in MOD_MATCH_RULES:
+        mod_match = DEFAULT_MOD_MATCH
+    beatmap_id = data.get('beatmap_id', None)
+    beatmap_name = data.get('beatmap_name', None)
+    use_length = data.get('use_length', False)
+    use_combo = data.get('use_combo', False)
+    use_stars = data.get('use_stars', False)  # Check if stars checkbox is enabled
+    streak = bool(data.get('streak', False))
+    streak_break = data.get('streak_break', DEFAULT_STREAK_BREAK)
+    if streak_break not in STREAK_BREAK_RULES:
+        streak_break = DEFAULT_STREAK_BREAK
+    window = data.get('window') or None
+    if window not in GOAL_WINDOWS:
+        window = None
+    if window:
+        streak = False  # A windowed goal counts plays, it can't also require them in a row
+    
+    try:
+        map_length = int(data.get('map_length', 0)) if use_length else 0
+    except (ValueError, TypeError):
+        map_length = 0
+        
+    try:
+        min_combo = int(data.get('min_combo', 0)) if use_combo else 0
+    except (ValueError, TypeError):
+        min_combo = 0
+
+    # 2. Build Criteria JSON
+    criteria = {
+        "type": goal_type,
+        "min_stars": min_stars if use_stars else 0,  # Only enforce if checkbox is checked
+        "mod": 'Any',  # Not used anymore, always use mod_combination
+        "mod_combination": mod_combination if mod_combination else 'NM',  # Always set, default to NM
+        "mod_bits": matching_mod_bitmask(parse_mod_combination(mod_combination)),
+        "mod_match": mod_match,
+        "use_acc": use_acc,
+        "acc_needed": acc_needed,
+        "beatmap_id": int(beatmap_id) if beatmap_id else None,
+        "beatmap_name": beatmap_name,
+        "use_length": use_length,
+        "map_length": map_length,
+        "use_combo": use_combo,
+        "min_combo": min_combo,
+        "streak": streak,
+        "streak_break": streak_break if streak else None,
+        "window": window
+    }
+
+    # 3. Generate Title
+    title = data.get('title')
+    if not title:
+        if beatmap_name:
+            title = f"FC {beatmap_name}"
+        else:
+            title = f"{min_stars}★+ {goal_type.upper()}"
+
+    return count, criteria, title
+
 @app.route('/add_goal', methods=['POST'])
 def add_goal():
     if 'user_id' not in session: return jsonify({'error': 'Unauthorized'}), 401
@@ -305,68 +539,7 @@ def add_goal():
     data = request.json
     
     try:
-        # 1. Safe conversions
-        try:
-            count = int(data.get('count_needed', 1))
-        except (ValueError, TypeError):
-            count = 1
-
-        try:
-            min_stars = float(data.get('target_stars', 0))
-        except (ValueError, TypeError):
-            min_stars = 0.0
-        
-        goal_type = data.get('type', 'count')
-        use_acc = data.get('use_accuracy', False)
-        
-        try:
-            acc_needed = float(data.get('accuracy_needed', 0)) if use_acc else 0
-        except (ValueError, TypeError):
-            acc_needed = 0.0
-
-        # V6: New Mod Field - now always uses mod combination from checkboxes
-        use_mod_combo = data.get('use_mod_combo', True)  # Default to True since we always use checkboxes now
-        mod_combination = data.get('mod_combination', 'NM')  # Default to NM if not provided
-        beatmap_id = data.get('beatmap_id', None)
-        beatmap_name = data.get('beatmap_name', None)
-        use_length = data.get('use_length', False)
-        use_combo = data.get('use_combo', False)
-        use_stars = data.get('use_stars', False)  # Check if stars checkbox is enabled
-        
-        try:
-            map_length = int(data.get('map_length', 0)) if use_length else 0
-        except (ValueError, TypeError):
-            map_length = 0
-            
-        try:
-            min_combo = int(data.get('min_combo', 0)) if use_combo else 0
-        except (ValueError, TypeError):
-            min_combo = 0
-
-        # 2. Build Criteria JSON
-        criteria = {
-            "type": goal_type,
-            "min_stars": min_stars if use_stars else 0,  # Only enforce if checkbox is checked
-            "mod": 'Any',  # Not used anymore, always use mod_combination
-            "mod_combination": mod_combination if mod_combination else 'NM',  # Always set, default to NM
-            "use_acc": use_acc,
-            "acc_needed": acc_needed,
-            "beatmap_id": int(beatmap_id) if beatmap_id else None,
-            "beatmap_name": beatmap_name,
-            "use_length": use_length,
-            "map_length": map_length,
-            "use_combo": use_combo,
-            "min_combo": min_combo,
-            "streak": False 
-        }
-
-        # 3. Generate Title
-        title = data.get('title')
-        if not title:
-            if beatmap_name:
-                title = f"FC {beatmap_name}"
-            else:
-                title = f"{min_stars}★+ {goal_type.upper()}"
+        count, criteria, title = parse_goal_form(data)
 
         conn = get_db_connection()
         cur = conn.cursor()
@@ -384,6 +557,7 @@ def add_goal():
             )
             VALUES (%s, %s, 0, %s, %s, %s, FALSE, FALSE)
         """, (session['user_id'], title, count, json.dumps(criteria), new_order))
+        mark_state_changed(cur, session['user_id'])
         
         conn.commit()
         return jsonify({'status': 'success'})
@@ -397,6 +571,22 @@ def add_goal():
         if 'cur' in locals(): cur.close()
         if 'conn' in locals(): conn.close()
 
+@app.route('/assign_achievement', methods=['POST'])
+def assign_achievement_route():
+    if 'user_id' not in session: return jsonify({'error': 'Unauthorized'}), 401
+
+    goal = get_goal_by_id(request.json.get('goal_id'))
+    if not goal: return jsonify({'error': 'Unknown achievement'}), 400
+
+    conn = get_db_connection()
+    cur = conn.cursor()
+    assign_achievement(cur, session['user_id'], goal['id'])
+    mark_state_changed(cur, session['user_id'])
+    conn.commit()
+    cur.close()
+    conn.close()
+    return jsonify({'status': 'success'})
+
 @app.route('/update_goal_status', methods=['POST'])
 def update_goal_status():
     if 'user_id' not in session: return jsonify({'error': 'Unauthorized'}), 401
@@ -418,6 +608,7 @@ def update_goal_status():
         cur.execute("UPDATE user_active_goals SET is_paused = TRUE WHERE id = %s AND user_id = %s", (goal_id, session['user_id']))
     elif action == 'unpause':
         cur.execute("UPDATE user_active_goals SET is_paused = FALSE WHERE id = %s AND user_id = %s", (goal_id, session['user_id']))
+    mark_state_changed(cur, session['user_id'])
 
     conn.commit()
     cur.close()
@@ -427,10 +618,40 @@ def update_goal_status():
 
 @app.route('/check_scores', methods=['POST'])
 def check_scores():
-    # V6: Returns rich JSON payload for live updates
-    result = process_session_logic()
+    # V6: Returns rich JSON payload for live updates, plus when to poll next (poll_schedule.py)
+    if overloaded():
+        response = jsonify({"status": "busy", "next_poll_ms": SHED_RETRY_SECONDS * 1000})
+        response.status_code = 503
+        response.headers['Retry-After'] = str(SHED_RETRY_SECONDS)
+        return response
+
+    with SyncSlot():
+        result = process_session_logic()
+
+    if result.get('retry_after'):
+        result['next_poll_ms'] = result['retry_after'] * 1000
+        response = jsonify(result)
+        response.status_code = 429
+        response.headers['Retry-After'] = str(result['retry_after'])
+        return response
+
+    # Idle time counts from the newest play, or from when this tab's session started
+    idle = [time.time() - result['last_played_at']] if result.get('last_played_at') else []
+    session_age = (request.get_json(silent=True) or {}).get('session_age')
+    try:
+        if session_age is not None:
+            idle.append(max(float(session_age), 0))
+    except (TypeError, ValueError):
+        pass
+    result['next_poll_ms'] = next_poll_seconds(min(idle) if idle else None) * 1000
     return jsonify(result)
 
+@app.route('/cache_stats')
+def cache_stats():
+    """Hit/miss counters and size of this worker's dashboard cache"""
+    if 'user_id' not in session: return jsonify({'error': 'Unauthorized'}), 401
+    return jsonify(_dashboard_cache.stats())
+
 @app.route('/get_goal_maps', methods=['POST'])
 def get_goal_maps():
     """Returns list of maps that contributed to a goal"""
@@ -439,30 +660,233 @@ def get_goal_maps():
     data = request.json
     goal_id = data.get('goal_id')
     
-    conn = get_db_connection()
-    cur = conn.cursor()
-    
-    cur.execute("""
-        SELECT sh.beatmap_name, sh.stars, sh.mod_combination, sh.timestamp, sh.is_fc
-        FROM goal_contributions gc
-        JOIN score_history sh ON gc.score_history_id = sh.id
-        WHERE gc.goal_id = %s AND gc.user_id = %s
-        ORDER BY sh.timestamp DESC
-    """, (goal_id, session['user_id']))
+    user_id = session['user_id']
+    def load(cur):
+        cur.execute("""
+            SELECT COALESCE(b.title, sh.beatmap_name), sh.stars, sh.mod_bits, sh.timestamp, sh.is_fc
+            FROM goal_contributions gc
+            JOIN score_history sh ON sh.user_id = gc.user_id AND sh.id = gc.score_history_id
+            LEFT JOIN beatmaps b ON b.beatmap_id = sh.beatmap_id
+            WHERE gc.goal_id = %s AND gc.user_id = %s
+            ORDER BY sh.timestamp DESC
+        """, (goal_id, user_id))
+        return cur.fetchall()
     
     maps = []
-    for row in cur.fetchall():
+    for row in run_read_query(load):
         maps.append({
             'name': row[0],
             'stars': round(row[1], 2),
-            'mods': row[2] or 'NM',
+            'mods': bitmask_to_combination(row[2]),
             'timestamp': row[3].isoformat() if row[3] else '',
             'is_fc': row[4]
         })
     
+    return jsonify({'maps': maps})
+
+@app.route('/search_beatmaps')
+def search_beatmaps_route():
+    """Autocomplete over beatmaps our users have played (title/artist/difficulty words, or an id)"""
+    if 'user_id' not in session: return jsonify({'error': 'Unauthorized'}), 401
+
+    query = request.args.get('q', '')[:100]
+    try:
+        limit = min(max(int(request.args.get('limit', 10)), 1), 25)
+    except (ValueError, TypeError):
+        limit = 10
+
+    results = run_read_query(lambda cur: search_beatmaps(cur, query, limit))
+    return jsonify({'results': results})
+
+@app.route('/get_analytics')
+def get_analytics_data():
+    """Accuracy, effective stars, FC rate and play count over time, per mod combination"""
+    if 'user_id' not in session: return jsonify({'error': 'Unauthorized'}), 401
+
+    period = request.args.get('period', 'day')
+    if period not in ROLLUP_PERIODS: period = 'day'
+    try:
+        days = min(max(int(request.args.get('days', 30)), 1), 730)
+    except (ValueError, TypeError):
+        days = 30
+
+    user_id = session['user_id']
+    data = run_read_query(lambda cur: get_analytics(cur, user_id, period, days))
+    return jsonify(data)
+
+@app.route('/recommend_goals')
+def recommend_goals():
+    """Achievable goal suggestions from the user's own FC rates, accuracy and trend (cached per state version)"""
+    if 'user_id' not in session: return jsonify({'error': 'Unauthorized'}), 401
+
+    user_id = session['user_id']
+    conn = get_db_connection()
+    cur = conn.cursor()
+    version = get_state_version(cur, user_id)
+    if version is None:
+        cur.close()
+        conn.close()
+        return jsonify({'error': 'Unauthorized'}), 401
+    data = _dashboard_cache.get_or_load('recommendations', user_id, version, lambda: on_replica(
+        lambda read_cur: get_recommendations(read_cur, user_id), cur, user_id, version))
     cur.close()
     conn.close()
-    return jsonify({'maps': maps})
+    return jsonify(data)
+
+def parse_month(value):
+    """'2024-05' -> date(2024, 5, 1); None for anything else"""
+    try:
+        return datetime.strptime(value, '%Y-%m').date()
+    except (ValueError, TypeError):
+        return None
+
+@app.route('/percentiles')
+def percentiles():
+    """
+    Quantiles of accuracy, stars or effective stars from the merged sketches, e.g.
+    /percentiles?metric=acc&q=0.5&mods=DTHD&stars=6 or ?metric=eff_stars&q=0.9&from=2024-05&to=2024-05
+    stars is a bucket ('6' = 6.00-6.99★) or a range ('5-7'); from/to are months.
+    """
+    if 'user_id' not in session: return jsonify({'error': 'Unauthorized'}), 401
+
+    metric = request.args.get('metric', 'acc')
+    if metric not in METRICS:
+        return jsonify({'error': f"metric must be one of {', '.join(METRICS)}"}), 400
+    try:
+        quantiles = [float(q) for q in request.args.get('q', '0.5').split(',')][:10]
+        low, dash, high = request.args.get('stars', '').partition('-')
+        min_stars = int(low) if low else None
+        max_stars = (int(high) if high else None) if dash else min_stars
+    except ValueError:
+        return jsonify({'error': 'Invalid q or stars'}), 400
+    if any(not 0 <= q <= 1 for q in quantiles):
+        return jsonify({'error': 'q must be between 0 and 1'}), 400
+    mods = request.args.get('mods') or None
+
+    user_id = session['user_id']
+    since, until = parse_month(request.args.get('from')), parse_month(request.args.get('to'))
+    data = run_read_query(lambda cur: get_quantiles(cur, user_id, metric, quantiles, mods, min_stars, max_stars, since, until))
+    data['quantiles'] = {str(q): v for q, v in data['quantiles'].items()}
+    return jsonify(data)
+
+@app.route('/rank_history')
+def rank_history():
+    """Global rank over the last `days` as chart points (only changes are stored)"""
+    if 'user_id' not in session: return jsonify({'error': 'Unauthorized'}), 401
+
+    try:
+        days = min(max(int(request.args.get('days', 90)), 1), 3650)
+    except (ValueError, TypeError):
+        days = 90
+
+    user_id = session['user_id']
+    data = run_read_query(lambda cur: get_rank_series(cur, user_id, days))
+    return jsonify(data)
+
+# --- LEADERBOARDS ---
+
+@app.route('/leaderboards')
+def leaderboards():
+    if 'user_id' not in session: return redirect('/')
+    return render_template('leaderboard.html', boards=BOARDS, username=session.get('username'))
+
+@app.route('/get_leaderboard')
+def get_leaderboard():
+    """Top-K for a board plus the current user's position, served from the ranking snapshot"""
+    if 'user_id' not in session: return jsonify({'error': 'Unauthorized'}), 401
+
+    board = request.args.get('board', 'mastery_nm')
+    if board not in BOARDS: return jsonify({'error': 'Unknown board'}), 400
+    try:
+        limit = min(max(int(request.args.get('limit', 50)), 1), 100)
+        offset = max(int(request.args.get('offset', 0)), 0)
+    except (ValueError, TypeError):
+        limit, offset = 50, 0
+
+    # Serve whatever snapshot we have; refresh it in the background if it's old
+    refresh_in_background_if_stale(get_db_connection)
+
+    user_id = session['user_id']
+    def load(cur):
+        return get_top(cur, board, limit, offset), get_position(cur, board, user_id), get_refreshed_at(cur, board)
+    entries, me, (refreshed_at, total) = run_read_query(load)
+
+    return jsonify({
+        'board': board,
+        'title': BOARDS[board],
+        'refreshed_at': refreshed_at.isoformat() if refreshed_at else None,
+        'total': total,
+        'entries': entries,
+        'me': me
+    })
+
+# --- GROUP CHALLENGES ---
+
+@app.route('/create_challenge', methods=['POST'])
+def create_challenge_route():
+    """A shared goal (same form as /add_goal); the count is the group target"""
+    if 'user_id' not in session: return jsonify({'error': 'Unauthorized'}), 401
+
+    count, criteria, title = parse_goal_form(request.json)
+    # A challenge counts the group's successful plays: no streaks or time windows
+    criteria.update(streak=False, streak_break=None, window=None)
+
+    conn = get_db_connection()
+    cur = conn.cursor()
+    challenge_id, join_code = create_challenge(cur, session['user_id'], title, max(count, 1), json.dumps(criteria))
+    conn.commit()
+    cur.close()
+    conn.close()
+    return jsonify({'status': 'success', 'id': challenge_id, 'join_code': join_code})
+
+@app.route('/join_challenge', methods=['POST'])
+def join_challenge_route():
+    if 'user_id' not in session: return jsonify({'error': 'Unauthorized'}), 401
+
+    conn = get_db_connection()
+    cur = conn.cursor()
+    challenge_id = join_challenge(cur, session['user_id'], request.json.get('join_code'))
+    conn.commit()
+    cur.close()
+    conn.close()
+    if challenge_id is None:
+        return jsonify({'error': 'Unknown, finished or full challenge'}), 404
+    return jsonify({'status': 'success', 'id': challenge_id})
+
+@app.route('/leave_challenge', methods=['POST'])
+def leave_challenge_route():
+    if 'user_id' not in session: return jsonify({'error': 'Unauthorized'}), 401
+
+    conn = get_db_connection()
+    cur = conn.cursor()
+    left = leave_challenge(cur, session['user_id'], request.json.get('challenge_id'))
+    conn.commit()
+    cur.close()
+    conn.close()
+    return jsonify({'status': 'success' if left else 'not_a_member'})
+
+@app.route('/get_challenges')
+def get_challenges():
+    if 'user_id' not in session: return jsonify({'error': 'Unauthorized'}), 401
+
+    compact_in_background_if_due(get_db_connection)
+    user_id = session['user_id']
+    challenges = run_read_query(lambda cur: get_user_challenges(cur, user_id))
+    return jsonify({'challenges': challenges})
+
+@app.route('/get_challenge_standings')
+def get_challenge_standings():
+    """Group total and per-member contributions (members only), cached for a few seconds"""
+    if 'user_id' not in session: return jsonify({'error': 'Unauthorized'}), 401
+    try:
+        challenge_id = int(request.args.get('id'))
+    except (ValueError, TypeError):
+        return jsonify({'error': 'Missing challenge id'}), 400
+
+    standings = run_read_query(lambda cur: get_standings(cur, challenge_id))
+    if not standings or not any(m['user_id'] == session['user_id'] for m in standings['members']):
+        return jsonify({'error': 'Unknown challenge'}), 404
+    return jsonify(standings)
 
 # --- DATA MANAGEMENT ---
 
@@ -479,6 +903,11 @@ def delete_account():
     cur = conn.cursor()
     
     cur.execute("DELETE FROM osu_users WHERE user_id = %s", (session['user_id'],))
+    delete_rank_history(cur, session['user_id'])
+    delete_performance(cur, session['user_id'])
+    delete_sketches(cur, session['user_id'])
+    delete_challenge_memberships(cur, session['user_id'])
+    delete_tokens(cur, session['user_id'])
     
     conn.commit()
     cur.close()
@@ -500,6 +929,7 @@ def reorder_goals():
     for index, goal_id in enumerate(new_order_ids):
         cur.execute("UPDATE user_active_goals SET display_order = %s WHERE id = %s AND user_id = %s", 
                     (index, goal_id, session['user_id']))
+    mark_state_changed(cur, session['user_id'])
         
     conn.commit()
     cur.close()
@@ -511,15 +941,30 @@ def reorder_goals():
 def export_data():
     if 'user_id' not in session: return redirect('/')
     
-    conn = get_db_connection()
-    cur = conn.cursor()
-    
-    cur.execute("""
-        SELECT beatmap_name, mod_combination, mods, stars, effective_stars, accuracy, is_fc, timestamp 
-        FROM score_history WHERE user_id = %s ORDER BY timestamp DESC
-    """, (session['user_id'],))
-    rows = cur.fetchall()
-    
+    user_id = session['user_id']
+    def load(cur):
+        cur.execute("""
+            SELECT COALESCE(b.title, sh.beatmap_name), sh.mod_bits, sh.stars, sh.effective_stars, sh.accuracy, sh.is_fc, sh.timestamp 
+            FROM score_history sh
+            LEFT JOIN beatmaps b ON b.beatmap_id = sh.beatmap_id
+            WHERE sh.user_id = %s ORDER BY sh.timestamp DESC
+        """, (user_id,))
+        rows = cur.fetchall()
+
+        # Older plays live in the archive
+        archived = archived_scores(cur, user_id)
+        if archived:
+            cur.execute("SELECT beatmap_id, title FROM beatmaps WHERE beatmap_id = ANY(%s)", (list({a['beatmap_id'] for a in archived}),))
+            titles = dict(cur.fetchall())
+            rows += [
+                (titles.get(a['beatmap_id']), a['mod_bits'], a['stars'], a['effective_stars'], a['accuracy'], a['is_fc'], a['timestamp'])
+                for a in archived
+            ]
+            # Rows pinned by goal contributions stay hot even when they're older than the archive
+            rows.sort(key=lambda r: r[6].timestamp() if r[6] else 0, reverse=True)
+        return rows
+    rows = run_read_query(load)
+
     si = io.StringIO()
     cw = csv.writer(si)
     cw.writerow(['Map Name', 'Mod Combination', 'Mod Group', 'Stars', 'Effective Stars', 'Accuracy', 'Is FC', 'Date'])
@@ -528,22 +973,19 @@ def export_data():
     for row in rows:
         formatted_rows.append([
             row[0],  # beatmap_name
-            row[1] or 'NM',  # mod_combination
-            row[2] or 'NM',  # mods (mod_group)
-            row[3],  # stars
-            row[4],  # effective_stars
-            f"{row[5]*100:.2f}%" if row[5] else "0%",  # accuracy as percentage
-            'Yes' if row[6] else 'No',  # is_fc
-            row[7].strftime('%Y-%m-%d %H:%M:%S') if row[7] else ''  # timestamp
+            bitmask_to_combination(row[1]),  # mod_combination
+            get_mod_group(bitmask_to_mods(row[1])),  # mod_group
+            round(row[2], 2) if row[2] is not None else None,  # stars (REAL)
+            round(row[3], 3) if row[3] is not None else None,  # effective_stars (REAL)
+            f"{row[4]*100:.2f}%" if row[4] else "0%",  # accuracy as percentage
+            'Yes' if row[5] else 'No',  # is_fc
+            row[6].strftime('%Y-%m-%d %H:%M:%S') if row[6] else ''  # timestamp
         ])
     cw.writerows(formatted_rows)
     
     output = make_response(si.getvalue())
     output.headers["Content-Disposition"] = "attachment; filename=osu_tracker_export.csv"
     output.headers["Content-type"] = "text/csv"
-    
-    cur.close()
-    conn.close()
     return output
 
 @app.route('/reset_history')
@@ -560,6 +1002,10 @@ def reset_history():
         WHERE user_id = %s
     """, (user_id,))
     cur.execute("DELETE FROM score_history WHERE user_id = %s", (user_id,))
+    delete_archive(cur, user_id)
+    delete_rollups(cur, user_id)
+    delete_performance(cur, user_id)
+    delete_sketches(cur, user_id)
     cur.execute("""
         UPDATE user_mastery 
         SET nm_rating=0, hd_rating=0, hr_rating=0, dt_rating=0, fl_rating=0 
@@ -567,9 +1013,12 @@ def reset_history():
     """, (user_id,))
     cur.execute("""
         UPDATE user_active_goals 
-        SET current_progress = 0, is_completed = FALSE, completed_at = NULL 
+        SET current_progress = 0, is_completed = FALSE, completed_at = NULL,
+            streak_current = 0, streak_best = 0, streak_last_score_id = NULL, window_state = NULL
         WHERE user_id = %s
     """, (user_id,))
+    reset_achievements(cur, user_id)
+    mark_state_changed(cur, user_id)
     
     conn.commit()
     cur.close()
@@ -578,252 +1027,216 @@ def reset_history():
 
 # --- SESSION ENGINE (V6 Logic) ---
 
+def read_session_state(cur, user_id):
+    """Dashboard values the live update refreshes after a sync (or instead of one)."""
+    version = get_state_version(cur, user_id)
+    state = _dashboard_cache.get_or_load('session', user_id, version, lambda: on_replica(
+        lambda read_cur: load_session_state(read_cur, user_id), cur, user_id, version))
+    apply_window_progress(state['goals'], 'current')
+    return state
+
+def load_session_state(cur, user_id):
+    """Uncached read_session_state(); the result goes through the cache, so it must be JSON-able."""
+    # V6: Fetch necessary data for live frontend update
+    cur.execute("SELECT nm_rating, hd_rating, hr_rating, dt_rating, fl_rating FROM user_mastery WHERE user_id = %s", (user_id,))
+    new_stats = cur.fetchone()
+
+    cur.execute("SELECT id, current_progress, target_progress, streak_best, criteria, window_state FROM user_active_goals WHERE user_id = %s AND is_completed = FALSE", (user_id,))
+    goal_states = []
+    for r in cur.fetchall():
+        goal_states.append({'id': r[0], 'current': r[1] if r[1] is not None else 0, 'target': r[2],
+                            'streak_best': r[3] or 0, '_window': _window_ref(r[4], r[5])})
+
+    fc_counts = fc_star_counts(cur, user_id)
+
+    # Newest ingested play (epoch seconds), for the poll interval
+    cur.execute("SELECT EXTRACT(EPOCH FROM last_played_at)::float FROM osu_users WHERE user_id = %s", (user_id,))
+    row = cur.fetchone()
+    last_played_at = row[0] if row else None
+
+    achievements = [
+        {'id': a['id'], 'progress': a['progress'], 'target': a['target'], 'is_completed': a['is_completed']}
+        for a in get_achievements(cur, user_id) if a['assigned']
+    ]
+
+    # Fetch persistent feed (last 100 scores)
+    cur.execute("""
+        SELECT COALESCE(b.title, sh.beatmap_name), sh.mod_bits, sh.stars, sh.is_fc, sh.timestamp
+        FROM score_history sh
+        LEFT JOIN beatmaps b ON b.beatmap_id = sh.beatmap_id
+        WHERE sh.user_id = %s 
+        ORDER BY sh.timestamp DESC 
+        LIMIT 100
+    """, (user_id,))
+    persistent_feed = []
+    for row in cur.fetchall():
+        persistent_feed.append({
+            'title': row[0],
+            'mod_combination': bitmask_to_combination(row[1]),
+            'stars': round(row[2], 2),
+            'is_fc': row[3]
+        })
+
+    return {
+        "persistent_feed": persistent_feed,
+        "stats": list(new_stats) if new_stats else [0,0,0,0,0],
+        "goals": goal_states,
+        "fc_counts": fc_counts,
+        "achievements": achievements,
+        "last_played_at": last_played_at
+    }
+
+def serve_stored_state(conn, cur, lock_state):
+    """/check_scores result without calling osu!: what the last (or the concurrent) sync stored."""
+    conn.commit()
+    state = read_session_state(cur, session['user_id'])
+    cur.close()
+    conn.close()
+    return {
+        "status": "success",
+        "updated": lock_state == SYNC_WAITED,
+        "syncing": lock_state == SYNC_BUSY,
+        "feed": [],
+        **state,
+        "completed_achievements": []
+    }
+
 def process_session_logic():
     if 'user_id' not in session: return {"status": "error", "message": "Not logged in"}
-    token = session.get('token') 
-    if not token: return {"status": "error", "message": "Token expired"}
 
-    headers = {'Authorization': f'Bearer {token}'}
+    conn = None
     try:
+        conn = get_db_connection()
+        # Everything up to the writes runs in autocommit, so no transaction (and no lock)
+        # stays open while osu! responds
+        conn.autocommit = True
+        cur = conn.cursor()
+
+        # A sync that just finished (or osu!'s Retry-After from an earlier 429) is served from the database
+        if synced_recently(cur, session['user_id']) or rate_limit_retry_after():
+            return serve_stored_state(conn, cur, SYNC_ACQUIRED)
+
+        token = user_access_token(cur)
+        if not token:
+            conn.close()
+            return {"status": "error", "message": "Token expired"}
+
         # V6: Limit to 20 plays for efficiency
-        response = requests.get(f'https://osu.ppy.sh/api/v2/users/{session["user_id"]}/scores/recent?include_fails=0&limit=20', headers=headers)
+        response = get_recent_scores(session['user_id'], token, limit=20)
         
-        if response.status_code != 200: return {"status": "error", "message": "API Error"}
+        if response.status_code == 401:
+            # Revoked or expired early: refresh it on the next poll
+            expire_access_token(cur, session['user_id'])
+            conn.close()
+            return {"status": "error", "message": "Token expired"}
+        if response.status_code == 429:
+            conn.close()
+            return {"status": "error", "message": "Rate limited", "retry_after": rate_limit_retry_after()}
+        if response.status_code != 200:
+            conn.close()
+            return {"status": "error", "message": "API Error"}
             
         recent_scores = response.json()
         new_feed_items = []
         updates_made = False
-        
-        conn = get_db_connection()
-        cur = conn.cursor()
 
-        cur.execute("SELECT id, current_progress, target_progress, criteria, is_paused FROM user_active_goals WHERE user_id = %s AND is_completed = FALSE", (session['user_id'],))
-        active_goals = cur.fetchall()
+        # V6: Duplication check (one query for the whole batch)
+        cur.execute("SELECT osu_score_id FROM score_history WHERE user_id = %s AND osu_score_id = ANY(%s)", (session['user_id'], [s['id'] for s in recent_scores]))
+        known_score_ids = {r[0] for r in cur.fetchall()}
+        new_scores = [s for s in reversed(recent_scores) if s['id'] not in known_score_ids]
 
-        for score in reversed(recent_scores):
-            osu_score_id = score['id']
-            
-            # V6: Duplication check
-            cur.execute("SELECT id FROM score_history WHERE osu_score_id = %s", (osu_score_id,)) 
-            if cur.fetchone(): continue
+        # Cache beatmap metadata from the payload, then fill gaps (max_combo is sometimes missing) from the lookup API
+        upsert_beatmaps(cur, [beatmap_from_api(s['beatmap'], s['beatmapset']) for s in new_scores])
+        beatmap_rows = ensure_beatmaps(cur, [s['beatmap']['id'] for s in new_scores], token)
+
+        # Mod-adjusted star ratings for the batch (only mods that change difficulty need a lookup)
+        attribute_keys = {(s['beatmap']['id'], difficulty_mod_bitmask(s['mods'])) for s in new_scores}
+        attributes = get_difficulty_attributes(cur, [k for k in attribute_keys if k[1]], token)
 
+        # The writes: one short transaction under the user's sync lock (released on commit).
+        # A request that had to wait for another sync serves the state that sync stored.
+        conn.autocommit = False
+        lock_state = acquire_sync_lock(cur, session['user_id'])
+        if lock_state != SYNC_ACQUIRED:
+            return serve_stored_state(conn, cur, lock_state)
+
+        goal_batch = GoalBatch(cur, session['user_id'])
+        challenge_batch = ChallengeBatch(cur, session['user_id'])
+
+        rollup_rows = []
+        last_played_at = 0
+        performance_rows = []
+        sketch_rows = []
+        achievement_facts = []
+
+        for score in new_scores:
+            osu_score_id = score['id']
             updates_made = True
             
             beatmap = score['beatmap']
             beatmapset = score['beatmapset']
-            stars = beatmap['difficulty_rating']
+            beatmap_id = beatmap.get('id', 0)
+            beatmap_row = beatmap_rows.get(beatmap_id, {})
             acc = score['accuracy']
             raw_mods = score['mods']
-            
-            # Convert mods array to string combination (e.g., ["HD", "DT"] -> "HDDT")
-            # Sort mods alphabetically for consistent matching (HDDT, HRHD, etc.)
-            if isinstance(raw_mods, list):
-                # Filter out empty strings and sort
-                mod_list = sorted([m for m in raw_mods if m])
-                mod_combination = ''.join(mod_list) if mod_list else 'NM'
+            mod_bits = mods_to_bitmask(raw_mods)
+            mod_combination = bitmask_to_combination(mod_bits)
+            mod_group = get_mod_group(raw_mods)
+
+            # Stars are mod-adjusted (e.g. DT/HR); fall back to the nomod rating if the lookup failed
+            diff_mods = difficulty_mod_bitmask(raw_mods)
+            mod_attributes = attributes.get((beatmap_id, diff_mods))
+            if mod_attributes:
+                stars = mod_attributes['star_rating']
             else:
-                mod_combination = raw_mods if raw_mods else 'NM'
-            if not mod_combination or mod_combination == '[]': mod_combination = 'NM'
+                stars = beatmap['difficulty_rating']
+            stars_adjusted = diff_mods == 0 or mod_attributes is not None
             
             # Get map_max_combo from beatmap (do NOT fallback to score max_combo for FC calculation)
-            # If beatmap max_combo is not available, we can't reliably determine FC
-            map_max_combo = beatmap.get('max_combo', 0)
-            # NOTE: We intentionally do NOT fallback to score['max_combo'] because that would
-            # incorrectly mark all no-miss scores as FC when map_max_combo is unavailable
+            map_max_combo = beatmap_row.get('max_combo') or beatmap.get('max_combo') or 0
             
-            # Get map length and beatmap_id
-            map_length = beatmap.get('total_length', 0)  # in seconds
-            beatmap_id = beatmap.get('id', 0)
+            # Get map length
+            map_length = beatmap_row.get('total_length') or beatmap.get('total_length', 0)  # in seconds
             
             # Get score rank and statistics
             score_rank = score.get('rank', '')
             statistics = score.get('statistics', {})
             miss_count = statistics.get('miss_count', 0)
-            count_100 = statistics.get('count_100', 0)
-            count_50 = statistics.get('count_50', 0)
-            count_300 = statistics.get('count_300', 0)
-            
-            # PFC (Perfect Full Combo) Logic:
-            # PFC = max_combo exactly matches map_max_combo AND no misses
-            # Can be S rank or SS rank, can have 100s/50s (missing slider ends)
-            # The key is: combo matches exactly, meaning no slider breaks occurred
-            # Requires valid map_max_combo from beatmap
-            is_pfc = (miss_count == 0 and 
-                     map_max_combo > 0 and 
-                     score['max_combo'] == map_max_combo)
-            
-            # FC (Full Combo) Logic (Community Definition):
-            # True FC = no misses, no slider breaks, only missing slider ends
-            # FC scores that lost combo only via dropped slider ends (100s/50s) are widely 
-            # considered by the community to be full combos, even if max_combo < map_max_combo.
-            # This differs from the game client and website's display.
-            #
-            # The challenge: Distinguishing dropped slider ends from slider breaks
-            # - Dropped slider ends: combo is close to map max (e.g., 370/371, 1130/1159) = FC
-            # - Slider break: combo is significantly lower (e.g., 183/442) = NOT FC
-            #
-            # Algorithm:
-            # 1. F rank or has misses = NOT FC
-            # 2. SS rank (X/XH) with no misses = Always FC (even if map_max_combo unavailable)
-            # 3. If map_max_combo is available:
-            #    - If combo matches map max exactly = PFC (and FC)
-            #    - If combo is close to map max (within threshold) = FC (dropped slider ends)
-            #    - If combo is significantly lower = NOT FC (slider break)
-            # 4. If map_max_combo unavailable = Only SS rank can be FC (conservative)
-            #
-            # Threshold: Use percentage-based approach with reasonable limits
-            # Examples: 370/371 (0.27% off) = FC, 1130/1159 (2.5% off) = FC
-            # Use 3% or 30 combo, whichever is smaller, to account for larger maps
-            # But be strict: 183/442 (58% off) = NOT FC (slider break)
-            
-            is_fc = False
-            if score_rank == 'F':
-                # F rank = Failed, never FC
-                is_fc = False
-            elif miss_count > 0:
-                # Has misses = NOT FC
-                is_fc = False
-            elif score_rank in ['X', 'XH']:
-                # SS rank with no misses = Always FC (even if map_max_combo unavailable)
-                is_fc = True
-            elif map_max_combo > 0:
-                # We have valid map_max_combo, can calculate FC properly
-                combo_diff = map_max_combo - score['max_combo']
-                
-                if combo_diff == 0:
-                    # Combo matches exactly = PFC (and FC)
-                    is_fc = True
-                elif combo_diff < 0:
-                    # Player combo exceeds map max (shouldn't happen, but be safe)
-                    is_fc = False
-                else:
-                    # Calculate threshold: 3% of map max combo, or 30 combo, whichever is smaller
-                    # This handles cases like 370/371 (1 off) and 1130/1159 (29 off)
-                    # But rejects cases like 183/442 (259 off, 58% difference)
-                    percentage_threshold = int(map_max_combo * 0.03)
-                    absolute_threshold = 30
-                    threshold = min(percentage_threshold, absolute_threshold)
-                    
-                    if combo_diff <= threshold:
-                        # Combo is close to map max (likely dropped slider ends) = FC
-                        is_fc = True
-                    else:
-                        # Combo is significantly lower (likely slider break) = NOT FC
-                        is_fc = False
-            else:
-                # map_max_combo unavailable - be conservative, only SS rank is FC
-                is_fc = False
 
-            mod_group = "NM"
-            if "DT" in raw_mods or "NC" in raw_mods: mod_group = "DT"
-            elif "HR" in raw_mods: mod_group = "HR"
-            elif "HD" in raw_mods: mod_group = "HD"
-            elif "FL" in raw_mods: mod_group = "FL"
+            # FC/PFC rules live in scoring.classify_fc so stored rows can be reclassified later
+            is_fc, is_pfc = classify_fc(score_rank, miss_count, score['max_combo'], map_max_combo)
 
             eff_stars = calculate_effective_stars(stars, acc, score['max_combo'], map_max_combo)
 
-            # Track goal contributions for this score
-            goal_contributions_for_score = []
-
-            # CHECK GOALS
-            for goal in active_goals:
-                g_id, g_current, g_target, g_criteria, g_is_paused = goal
-                
-                if g_current is None: g_current = 0
-
-                if g_is_paused: continue
-                
-                # Star Check (must be >= required)
-                # Note: min_stars defaults to 0, so if not set (use_stars was false), any star rating passes
-                min_stars_req = g_criteria.get('min_stars', 0)
-                if min_stars_req > 0 and stars < min_stars_req: continue 
-                
-                # Mod Check - support both single mod and mod combination
-                # Priority: mod_combination > mod
-                req_mod_combination = g_criteria.get('mod_combination', None)
-                req_mod = g_criteria.get('mod', 'Any')
-                
-                if req_mod_combination and req_mod_combination != 'Any' and req_mod_combination:
-                    # Check if mod combination matches exactly (case-sensitive)
-                    if mod_combination != req_mod_combination: continue
-                elif req_mod != 'Any' and req_mod:
-                    # Single mod check - must match mod_group
-                    if req_mod != mod_group: continue
-
-                # Map-specific goal check (must match exactly)
-                req_beatmap_id = g_criteria.get('beatmap_id', None)
-                if req_beatmap_id is not None:
-                    if beatmap_id != int(req_beatmap_id): continue
-                
-                # Map length check (must be >= required)
-                if g_criteria.get('use_length', False):
-                    req_length = int(g_criteria.get('map_length', 0))
-                    if map_length < req_length: continue
-                
-                # Combo check (must be >= required)
-                if g_criteria.get('use_combo', False):
-                    req_combo = int(g_criteria.get('min_combo', 0))
-                    if score['max_combo'] < req_combo: continue
-
-                # Accuracy Check (must be >= required)
-                if g_criteria.get('use_acc', False):
-                    required_acc = float(g_criteria.get('acc_needed', 0))
-                    if (acc * 100) < required_acc: continue
-                
-
-                req_type = g_criteria.get('type', 'count')
-                success = False
-                
-                if req_type == 'pass':
-                    success = (score['rank'] != 'F')
-                elif req_type == 'fc':
-                    success = is_fc # Use osu! FC logic (SS rank or combo matches map max)
-                elif req_type == 'ss':
-                    if score['rank'] in ['X', 'XH']:
-                        success = True
-                elif req_type == 'count':
-                     success = True
-
-                if success:
-                    new_prog = g_current + 1
-                    completed = (new_prog >= g_target)
-                    if completed:
-                        # Set completed_at timestamp when goal is completed
-                        cur.execute("""
-                            UPDATE user_active_goals 
-                            SET current_progress = %s, is_completed = %s, completed_at = CURRENT_TIMESTAMP 
-                            WHERE id = %s AND completed_at IS NULL
-                        """, (new_prog, completed, g_id))
-                        # If already completed, just update progress
-                        if cur.rowcount == 0:
-                            cur.execute("UPDATE user_active_goals SET current_progress = %s WHERE id = %s", (new_prog, g_id))
-                    else:
-                        cur.execute("UPDATE user_active_goals SET current_progress = %s, is_completed = %s WHERE id = %s", (new_prog, completed, g_id))
-                    
-                    # Track which score contributed to this goal
-                    goal_contributions_for_score.append(g_id)
-                else:
-                    if g_criteria.get('streak', False):
-                        cur.execute("UPDATE user_active_goals SET current_progress = 0 WHERE id = %s", (g_id,))
-
-            # Save History (includes is_fc, is_pfc, mod_combination, beatmap_id, map_length, max_combo)
+            # Save History (beatmap text/length/max combo live in the beatmaps table; score_rank and
+            # miss_count are kept so is_fc/is_pfc can be reclassified)
+            # NOT EXISTS rather than ON CONFLICT: databases that still hold duplicates don't have
+            # the unique (user_id, osu_score_id) index yet, and the sync lock already keeps
+            # concurrent syncs of this user out
             cur.execute("""
-                INSERT INTO score_history (user_id, osu_score_id, beatmap_name, mods, mod_combination, stars, effective_stars, accuracy, is_fc, is_pfc, beatmap_id, map_length, max_combo)
-                VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-                RETURNING id
-            """, (session['user_id'], osu_score_id, beatmapset['title'], mod_group, mod_combination, stars, eff_stars, acc, is_fc, is_pfc, beatmap_id, map_length, score['max_combo']))
+                INSERT INTO score_history (user_id, osu_score_id, mod_bits, stars, effective_stars, accuracy, is_fc, is_pfc, beatmap_id, max_combo, score_rank, miss_count, stars_adjusted)
+                SELECT %s::bigint, %s::bigint, %s::int, %s::real, %s::real, %s::real, %s::boolean, %s::boolean, %s::bigint, %s::int, %s::text, %s::int, %s::boolean
+                WHERE NOT EXISTS (SELECT 1 FROM score_history WHERE user_id = %s AND osu_score_id = %s)
+                RETURNING id, timestamp
+            """, (session['user_id'], osu_score_id, mod_bits, stars, eff_stars, acc, is_fc, is_pfc, beatmap_id, score['max_combo'], score_rank, miss_count, stars_adjusted,
+                  session['user_id'], osu_score_id))
             
-            score_history_id = cur.fetchone()[0]
-            
-            # Track goal contributions
-            for g_id in goal_contributions_for_score:
-                cur.execute("""
-                    INSERT INTO goal_contributions (goal_id, score_history_id, user_id)
-                    VALUES (%s, %s, %s)
-                """, (g_id, score_history_id, session['user_id']))
+            inserted = cur.fetchone()
+            if not inserted: continue  # Stored by a sync that finished after the duplication check above
+            score_history_id, played_at = inserted
+            rollup_rows.append((played_at, mod_combination, is_fc, acc, eff_stars))
+            last_played_at = max(last_played_at, to_epoch(score.get('created_at')))
+            performance_rows.append((mod_bits, stars, acc, is_fc, score_rank != 'F', score['max_combo'], map_length))
+            sketch_rows.append((played_at, mod_combination, stars, acc, eff_stars))
+            achievement_facts.append(score_facts(score_history_id, stars, acc, is_fc, is_pfc, score_rank, raw_mods, score['max_combo'], map_length))
+
+            # CHECK GOALS (every play, in play order; written back once after the loop)
+            facts = goal_facts(score_history_id, stars, acc, is_fc, score_rank, mod_bits, beatmap_id, score['max_combo'], map_length, to_epoch(score.get('created_at')))
+            goal_batch.apply(facts)
+            challenge_batch.apply(facts)
             
             col_name = f"{mod_group.lower()}_rating"
-            cur.execute(f"UPDATE user_mastery SET {col_name} = ({col_name} * 0.95) + ({eff_stars} * 0.05) WHERE user_id = %s", (session['user_id'],))
+            cur.execute(f"UPDATE user_mastery SET {col_name} = ({col_name} * {1 - MASTERY_WEIGHT}) + ({eff_stars} * {MASTERY_WEIGHT}) WHERE user_id = %s", (session['user_id'],))
             
             # V6: Prepare feed item with mod combination
             new_feed_items.append({
@@ -836,36 +1249,35 @@ def process_session_logic():
                 'timestamp': score.get('created_at', '')
             })
 
+        # Custom goals: one UPDATE for every changed goal, one INSERT for the contributions
+        goal_batch.flush()
+        # Group challenges: one appended delta row per challenge, no shared row is updated
+        challenge_deltas = challenge_batch.flush()
 
-        conn.commit()
-        
-        # V6: Fetch necessary data for live frontend update
-        cur.execute("SELECT nm_rating, hd_rating, hr_rating, dt_rating, fl_rating FROM user_mastery WHERE user_id = %s", (session['user_id'],))
-        new_stats = cur.fetchone()
+        mark_synced(cur, session['user_id'])
 
-        cur.execute("SELECT id, current_progress, target_progress FROM user_active_goals WHERE user_id = %s AND is_completed = FALSE", (session['user_id'],))
-        goal_states = [{'id': r[0], 'current': r[1] if r[1] is not None else 0, 'target': r[2]} for r in cur.fetchall()]
+        # Analytics rollups (one upsert per bucket, not per score)
+        record_scores(cur, session['user_id'], rollup_rows)
+        # Recommendation aggregates (one upsert per mod/star bucket)
+        record_performance(cur, session['user_id'], performance_rows)
+        # Percentile sketches (one read-merge-write per touched month/mods/star bucket)
+        record_sketches(cur, session['user_id'], sketch_rows)
 
-        cur.execute("""SELECT FLOOR(stars) as star_int, COUNT(*) FROM score_history WHERE user_id = %s AND is_fc = TRUE GROUP BY star_int ORDER BY star_int""", (session['user_id'],))
-        fc_counts = {int(r[0]): r[1] for r in cur.fetchall()}
+        # Predetermined achievements: O(1) state update per score, one write per achievement
+        completed_achievements = apply_scores(cur, session['user_id'], achievement_facts)
 
-        # Fetch persistent feed (last 100 scores) - BEFORE closing connection
-        cur.execute("""
-            SELECT beatmap_name, mod_combination, stars, is_fc, timestamp
-            FROM score_history 
-            WHERE user_id = %s 
-            ORDER BY timestamp DESC 
-            LIMIT 100
-        """, (session['user_id'],))
-        persistent_feed = []
-        for row in cur.fetchall():
-            persistent_feed.append({
-                'title': row[0],
-                'mod_combination': row[1] or 'NM',
-                'stars': round(row[2], 2),
-                'is_fc': row[3]
-            })
+        if rollup_rows:
+            cur.execute("UPDATE osu_users SET last_played_at = GREATEST(last_played_at, to_timestamp(%s)) WHERE user_id = %s",
+                        (last_played_at, session['user_id']))
+            # New scores: the cached dashboard state is stale once this commits
+            mark_state_changed(cur, session['user_id'])
+
+        conn.commit()
+        if challenge_deltas:
+            compact_in_background_if_due(get_db_connection)
+        refresh_in_background_if_due(get_db_connection)
         
+        state = read_session_state(cur, session['user_id'])
         cur.close()
         conn.close()
         
@@ -874,21 +1286,21 @@ def process_session_logic():
             "status": "success", 
             "updated": updates_made, 
             "feed": new_feed_items,
-            "persistent_feed": persistent_feed,
-            "stats": list(new_stats) if new_stats else [0,0,0,0,0],
-            "goals": goal_states,
-            "fc_counts": fc_counts
+            **state,
+            "completed_achievements": completed_achievements
         }
         
     except Exception as e:
         print(f"Session Error: {e}")
+        if conn is not None:
+            conn.close()  # Also releases the sync lock
         return {"status": "error", "message": str(e)}
 
 # --- AUTH ROUTES ---
 
 @app.route('/login')
 def login():
-    osu_auth_url = f"https://osu.ppy.sh/oauth/authorize?client_id={CLIENT_ID}&redirect_uri={REDIRECT_URI}&response_type=code&scope=public identify"
+    osu_auth_url = f"{OSU_AUTHORIZE_URL}?client_id={CLIENT_ID}&redirect_uri={REDIRECT_URI}&response_type=code&scope=public identify"
     return redirect(osu_auth_url)
 
 @app.route('/callback')
@@ -896,22 +1308,19 @@ def callback():
     code = request.args.get('code')
     if not code: return "Error: No code"
 
-    token_url = "https://osu.ppy.sh/oauth/token"
-    data = { 'client_id': CLIENT_ID, 'client_secret': CLIENT_SECRET, 'code': code, 'grant_type': 'authorization_code', 'redirect_uri': REDIRECT_URI }
-    response = requests.post(token_url, data=data)
-    tokens = response.json()
+    tokens = exchange_code(code, CLIENT_ID, CLIENT_SECRET, REDIRECT_URI)
     access_token = tokens.get('access_token')
 
-    headers = {'Authorization': f'Bearer {access_token}'}
-    me_response = requests.get('https://osu.ppy.sh/api/v2/me/osu', headers=headers)
+    me_response = get_me(access_token)
     user_data = me_response.json()
 
-    save_user_to_db(user_data)
+    save_user_to_db(user_data, tokens)
 
     session['user_id'] = user_data['id']
     session['username'] = user_data['username']
     session['rank'] = user_data['statistics'].get('global_rank')
-    session['token'] = access_token
+    # The token stays server-side (token_store.py); drop one left in an old session cookie
+    session.pop('token', None)
     
     return redirect('/')
 
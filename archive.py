@@ -0,0 +1,296 @@
+# archive.py
+
+# score_history is hash-partitioned by user_id: every hot query (dashboard, sync
+# de-dup, feed, export, maintenance chunks) filters on one user, so the planner only
+# touches that user's partition, and the (user_id, osu_score_id) unique key that
+# makes syncs idempotent includes the partition key as Postgres requires.
+#
+# Old detail rows are moved to a cold tier by archive_user(): one score_archive row
+# per user and calendar month holding the rows as gzip'd JSON. Aggregates stay
+# correct without the detail rows - FC star counts move into score_archive_fc_counts
+# (fc_star_counts() adds them back) and the analytics rollups are never touched.
+# When the FC rules change, reclassify_archive() re-runs them over the payloads and
+# rebuilds score_archive_fc_counts, so hot and archived counts use the same rules;
+# adjust_archived_stars() is the archive pass of the mod-adjusted star backfill.
+# Rows referenced by goal_contributions stay hot so the goal map lists still work.
+import gzip
+import json
+from datetime import date, datetime, timedelta
+from psycopg2.extras import execute_values
+from scoring import (bitmask_to_combination, bitmask_to_mods, combination_to_bitmask, classify_fc_batch,
+                     difficulty_mod_bitmask, effective_stars_batch)
+
+SCORE_HISTORY_PARTITIONS = 16
+# Detail rows older than this (rounded down to a month start) get archived
+ARCHIVE_AFTER_DAYS = 365
+
+SCORE_HISTORY_COLUMNS = """
+    id SERIAL,
+    user_id BIGINT NOT NULL,
+    osu_score_id BIGINT,
+    beatmap_name TEXT,
+    mod_bits INT NOT NULL DEFAULT 0,
+    stars REAL,
+    effective_stars REAL,
+    accuracy REAL,
+    timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    is_fc BOOLEAN DEFAULT FALSE,
+    is_pfc BOOLEAN DEFAULT FALSE,
+    beatmap_id BIGINT,
+    map_length INT,
+    max_combo INT,
+    score_rank TEXT,
+    miss_count INT,
+    map_max_combo INT,
+    stars_adjusted BOOLEAN DEFAULT FALSE,
+    PRIMARY KEY (user_id, id)
+"""
+
+# Columns kept in the archive payload (beatmap metadata lives in `beatmaps`)
+ARCHIVED_COLUMNS = ['id', 'osu_score_id', 'timestamp', 'beatmap_id', 'mod_bits', 'stars', 'effective_stars',
+                    'accuracy', 'is_fc', 'is_pfc', 'max_combo', 'score_rank', 'miss_count', 'map_max_combo',
+                    'stars_adjusted']
+
+def is_partitioned(cur, table='score_history'):
+    cur.execute("SELECT 1 FROM pg_partitioned_table p JOIN pg_class c ON c.oid = p.partrelid WHERE c.relname = %s", (table,))
+    return cur.fetchone() is not None
+
+def create_score_history_table(cur, table='score_history', columns=SCORE_HISTORY_COLUMNS):
+    """Creates the hash-partitioned score_history (and its partitions) if missing."""
+    cur.execute(f"CREATE TABLE IF NOT EXISTS {table} ({columns}) PARTITION BY HASH (user_id);")
+    if not is_partitioned(cur, table):
+        print(f">>> {table} is not partitioned yet. Run update.py (v18) to convert it.")
+        return
+    for i in range(SCORE_HISTORY_PARTITIONS):
+        cur.execute(f"""
+            CREATE TABLE IF NOT EXISTS {table}_p{i} PARTITION OF {table}
+            FOR VALUES WITH (MODULUS {SCORE_HISTORY_PARTITIONS}, REMAINDER {i});
+        """)
+
+def create_archive_tables(cur):
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS score_archive (
+            user_id BIGINT,
+            month DATE,
+            row_count INT,
+            payload BYTEA,
+            archived_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (user_id, month)
+        );
+    """)
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS score_archive_fc_counts (
+            user_id BIGINT,
+            star_int INT,
+            fc_count INT DEFAULT 0,
+            PRIMARY KEY (user_id, star_int)
+        );
+    """)
+
+def archive_cutoff(days=ARCHIVE_AFTER_DAYS, today=None):
+    """First day of the month `days` ago; everything before it is archived in whole months."""
+    day = (today or date.today()) - timedelta(days=days)
+    return day.replace(day=1)
+
+def _encode(rows):
+    return gzip.compress(json.dumps({'columns': ARCHIVED_COLUMNS, 'rows': rows}, default=str).encode(), mtime=0)
+
+def _decode(payload):
+    data = json.loads(gzip.decompress(bytes(payload)))
+    records = [dict(zip(data['columns'], row)) for row in data['rows']]
+    if 'mod_bits' not in data['columns']:
+        # Chunks archived before v19 stored the mod combination text
+        for record in records:
+            record['mod_bits'] = combination_to_bitmask(record.get('mod_combination'))
+    return records
+
+def archive_user(cur, user_id, before, dry_run=False):
+    """
+    Moves a user's score_history rows played before `before` into score_archive.
+    Must run inside a transaction (the caller commits). Returns the number of rows archived.
+    """
+    columns = ', '.join(f"sh.{c}" for c in ARCHIVED_COLUMNS)
+    if dry_run:
+        cur.execute("""
+            SELECT COUNT(*) FROM score_history sh
+            WHERE sh.user_id = %s AND sh.timestamp < %s
+              AND NOT EXISTS (SELECT 1 FROM goal_contributions gc WHERE gc.user_id = sh.user_id AND gc.score_history_id = sh.id)
+        """, (user_id, before))
+        return cur.fetchone()[0]
+
+    cur.execute(f"""
+        DELETE FROM score_history sh
+        WHERE sh.user_id = %s AND sh.timestamp < %s
+          AND NOT EXISTS (SELECT 1 FROM goal_contributions gc WHERE gc.user_id = sh.user_id AND gc.score_history_id = sh.id)
+        RETURNING {columns}
+    """, (user_id, before))
+    rows = cur.fetchall()
+    if not rows:
+        return 0
+
+    by_month = {}
+    for row in rows:
+        by_month.setdefault(row[ARCHIVED_COLUMNS.index('timestamp')].date().replace(day=1), []).append(list(row))
+    fc_counts = _fc_counts(dict(zip(ARCHIVED_COLUMNS, row)) for row in rows)
+
+    # A month can be archived in several passes (e.g. rows that were pinned by a goal); merge into its chunk
+    cur.execute("SELECT month, payload FROM score_archive WHERE user_id = %s AND month = ANY(%s) FOR UPDATE",
+                (user_id, list(by_month)))
+    for month, payload in cur.fetchall():
+        existing = [[r.get(c) for c in ARCHIVED_COLUMNS] for r in _decode(payload)]
+        by_month[month] = sorted(existing + by_month[month], key=lambda r: r[0])
+
+    execute_values(cur, """
+        INSERT INTO score_archive (user_id, month, row_count, payload)
+        VALUES %s
+        ON CONFLICT (user_id, month) DO UPDATE SET
+            row_count = EXCLUDED.row_count, payload = EXCLUDED.payload, archived_at = CURRENT_TIMESTAMP
+    """, [(user_id, month, len(chunk), _encode(chunk)) for month, chunk in by_month.items()])
+
+    if fc_counts:
+        execute_values(cur, """
+            INSERT INTO score_archive_fc_counts (user_id, star_int, fc_count)
+            VALUES %s
+            ON CONFLICT (user_id, star_int) DO UPDATE SET fc_count = score_archive_fc_counts.fc_count + EXCLUDED.fc_count
+        """, [(user_id, star_int, count) for star_int, count in fc_counts.items()])
+    return len(rows)
+
+def _fc_counts(records):
+    """{star_int: FC count} of archived records."""
+    counts = {}
+    for record in records:
+        if record.get('is_fc') and record.get('stars') is not None:
+            star_int = int(record['stars'] // 1)
+            counts[star_int] = counts.get(star_int, 0) + 1
+    return counts
+
+def _write_fc_counts(cur, user_id, fc_counts):
+    cur.execute("DELETE FROM score_archive_fc_counts WHERE user_id = %s", (user_id,))
+    if fc_counts:
+        execute_values(cur, "INSERT INTO score_archive_fc_counts (user_id, star_int, fc_count) VALUES %s",
+                       [(user_id, star_int, count) for star_int, count in fc_counts.items()])
+
+def _archived_months(cur, user_id):
+    cur.execute("SELECT month, payload FROM score_archive WHERE user_id = %s ORDER BY month FOR UPDATE", (user_id,))
+    return [(month, _decode(payload)) for month, payload in cur.fetchall()]
+
+def _map_combos(cur, months):
+    """{beatmap_id: max_combo} from beatmaps for the maps in the archived months."""
+    beatmap_ids = list({r['beatmap_id'] for _, records in months for r in records if r.get('beatmap_id')})
+    if not beatmap_ids:
+        return {}
+    cur.execute("SELECT beatmap_id, max_combo FROM beatmaps WHERE beatmap_id = ANY(%s) AND max_combo IS NOT NULL",
+                (beatmap_ids,))
+    return dict(cur.fetchall())
+
+def _map_combo_column(records, map_combos):
+    # Same as COALESCE(b.max_combo, sh.map_max_combo) for hot rows
+    return [map_combos.get(r.get('beatmap_id'), r.get('map_max_combo')) for r in records]
+
+def _rewrite_months(cur, user_id, months):
+    for month, records in months:
+        cur.execute("UPDATE score_archive SET payload = %s WHERE user_id = %s AND month = %s",
+                    (_encode([[r.get(c) for c in ARCHIVED_COLUMNS] for r in records]), user_id, month))
+
+def rebuild_archive_fc_counts(cur, user_id):
+    """Recomputes score_archive_fc_counts from the archived payloads (offline repair)."""
+    _write_fc_counts(cur, user_id, _fc_counts(r for _, records in _archived_months(cur, user_id) for r in records))
+
+def reclassify_archive(cur, user_id, dry_run=False):
+    """
+    Re-runs the FC/PFC rules over a user's archived rows (the archive pass of
+    maintenance.py reclassify), rewrites the months that changed and rebuilds
+    score_archive_fc_counts. Rows without miss_count are skipped like in score_history.
+    Must run inside a transaction (the caller commits). Returns (rows_checked, rows_changed).
+    """
+    months = _archived_months(cur, user_id)
+    map_combos = _map_combos(cur, months)
+
+    checked = changed = 0
+    rewrites = []
+    for month, records in months:
+        rows = [r for r in records if r.get('miss_count') is not None]
+        if not rows:
+            continue
+        new_fc, new_pfc = classify_fc_batch(
+            [r.get('score_rank') for r in rows], [r['miss_count'] for r in rows], [r.get('max_combo') for r in rows],
+            _map_combo_column(rows, map_combos))
+        month_changed = 0
+        for record, is_fc, is_pfc in zip(rows, new_fc, new_pfc):
+            if bool(record.get('is_fc')) != is_fc or bool(record.get('is_pfc')) != is_pfc:
+                record['is_fc'], record['is_pfc'] = bool(is_fc), bool(is_pfc)
+                month_changed += 1
+        checked += len(rows)
+        changed += month_changed
+        if month_changed:
+            rewrites.append((month, records))
+
+    if not dry_run:
+        _rewrite_months(cur, user_id, rewrites)
+        # Rebuilt even without changes: counts archived under older rules are repaired too
+        _write_fc_counts(cur, user_id, _fc_counts(r for _, records in months for r in records))
+    return checked, changed
+
+def adjust_archived_stars(cur, user_id, lookup_attributes):
+    """
+    The archive pass of maintenance.py backfill-star-ratings: archived rows not marked
+    stars_adjusted (payloads from before the column was archived count as unadjusted) get
+    mod-adjusted stars and matching effective stars. lookup_attributes(keys) returns
+    {(beatmap_id, difficulty mod bits): {'star_rating', ...}} like difficulty.get_difficulty_attributes.
+    Must run inside a transaction (the caller commits). Returns (rows_checked, rows_updated).
+    """
+    months = _archived_months(cur, user_id)
+    # (month index, record, (beatmap_id, difficulty mod bits)) for every row to adjust
+    rows = [(i, r, (r.get('beatmap_id'), difficulty_mod_bitmask(bitmask_to_mods(r.get('mod_bits') or 0))))
+            for i, (_, records) in enumerate(months) for r in records
+            if not r.get('stars_adjusted') and r.get('stars') is not None]
+    if not rows:
+        return 0, 0
+    attributes = lookup_attributes({key for _, _, key in rows if key[0] and key[1]})
+
+    # Nomod rows keep their stars; rows whose lookup failed stay unadjusted
+    resolved = [(i, r, r['stars'] if key[1] == 0 else attributes[key]['star_rating'])
+                for i, r, key in rows if key[1] == 0 or key in attributes]
+    if resolved:
+        map_combos = _map_combos(cur, months)
+        new_eff = effective_stars_batch([stars for _, _, stars in resolved], [r.get('accuracy') or 0 for _, r, _ in resolved],
+                                        [r.get('max_combo') for _, r, _ in resolved],
+                                        _map_combo_column([r for _, r, _ in resolved], map_combos))
+        for (_, r, stars), eff in zip(resolved, new_eff):
+            r['stars'], r['effective_stars'], r['stars_adjusted'] = float(stars), float(eff), True
+        _rewrite_months(cur, user_id, [months[i] for i in sorted({i for i, _, _ in resolved})])
+        # FC counts are bucketed by star rating
+        _write_fc_counts(cur, user_id, _fc_counts(r for _, records in months for r in records))
+    return len(rows), len(resolved)
+
+def archived_scores(cur, user_id):
+    """Every archived row of a user as dicts (timestamps as datetimes, plus mod_combination), oldest month first."""
+    cur.execute("SELECT payload FROM score_archive WHERE user_id = %s ORDER BY month", (user_id,))
+    scores = []
+    for (payload,) in cur.fetchall():
+        for record in _decode(payload):
+            if record['timestamp']:
+                record['timestamp'] = datetime.fromisoformat(record['timestamp'])
+            record['mod_combination'] = bitmask_to_combination(record['mod_bits'])
+            scores.append(record)
+    return scores
+
+def fc_star_counts(cur, user_id):
+    """{star_int: FC count} over hot and archived scores."""
+    cur.execute("""
+        SELECT star_int, SUM(fc_count) FROM (
+            SELECT FLOOR(stars)::int AS star_int, COUNT(*) AS fc_count
+            FROM score_history
+            WHERE user_id = %s AND is_fc = TRUE
+            GROUP BY 1
+            UNION ALL
+            SELECT star_int, fc_count FROM score_archive_fc_counts WHERE user_id = %s
+        ) counts
+        GROUP BY star_int
+        ORDER BY star_int
+    """, (user_id, user_id))
+    return {int(r[0]): int(r[1]) for r in cur.fetchall()}
+
+def delete_archive(cur, user_id):
+    cur.execute("DELETE FROM score_archive WHERE user_id = %s", (user_id,))
+    cur.execute("DELETE FROM score_archive_fc_counts WHERE user_id = %s", (user_id,))
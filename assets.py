@@ -0,0 +1,111 @@
+# assets.py
+
+# Fingerprinted, precompressed static assets. At startup every file under static/
+# is hashed and text files are compressed once (gzip, plus brotli when the optional
+# `brotli` package is installed). Templates link to asset_url('style.css'), which
+# resolves to /assets/style.<hash>.css; those URLs never change content, so they
+# are served with a one-year immutable Cache-Control. Edited files get a new hash.
+import os
+import gzip
+import hashlib
+import mimetypes
+import threading
+from flask import request, abort, Response
+
+try:
+    import brotli
+except ImportError:  # Optional: gzip only
+    brotli = None
+
+ASSET_URL_PREFIX = '/assets'
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+COMPRESSIBLE_TYPES = ('text/', 'application/javascript', 'application/json', 'image/svg+xml')
+# Don't bother compressing tiny files
+MIN_COMPRESS_BYTES = 512
+
+_manifest = {}   # logical path -> fingerprinted path
+_files = {}      # fingerprinted path -> {'body', 'gzip', 'br', 'mimetype', 'etag'}
+_manifest_lock = threading.Lock()
+
+def fingerprinted_name(path, digest):
+    root, ext = os.path.splitext(path)
+    return f"{root}.{digest}{ext}"
+
+def build_manifest(static_folder):
+    """Hashes and compresses every file under static_folder. Returns the number of assets."""
+    manifest, files = {}, {}
+    for dirpath, _, filenames in os.walk(static_folder):
+        for filename in filenames:
+            full_path = os.path.join(dirpath, filename)
+            path = os.path.relpath(full_path, static_folder).replace(os.sep, '/')
+            with open(full_path, 'rb') as f:
+                body = f.read()
+
+            digest = hashlib.sha256(body).hexdigest()[:12]
+            mimetype = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+            entry = {'body': body, 'gzip': None, 'br': None, 'mimetype': mimetype, 'etag': digest}
+            if mimetype.startswith(COMPRESSIBLE_TYPES) and len(body) >= MIN_COMPRESS_BYTES:
+                entry['gzip'] = gzip.compress(body, compresslevel=9, mtime=0)
+                if brotli:
+                    entry['br'] = brotli.compress(body)
+
+            fingerprinted = fingerprinted_name(path, digest)
+            manifest[path] = fingerprinted
+            files[fingerprinted] = entry
+
+    with _manifest_lock:
+        _manifest.clear()
+        _manifest.update(manifest)
+        _files.clear()
+        _files.update(files)
+    return len(files)
+
+def asset_url(path):
+    """URL of the current version of a static file (falls back to the plain static URL)."""
+    fingerprinted = _manifest.get(path)
+    if not fingerprinted:
+        return f"/static/{path}"
+    return f"{ASSET_URL_PREFIX}/{fingerprinted}"
+
+def _accepted_encodings():
+    header = request.headers.get('Accept-Encoding', '')
+    accepted = set()
+    for part in header.split(','):
+        name, _, params = part.strip().partition(';')
+        if params.replace(' ', '') in ('q=0', 'q=0.0', 'q=0.00', 'q=0.000'):
+            continue
+        accepted.add(name.strip().lower())
+    return accepted
+
+def serve_asset(filename):
+    entry = _files.get(filename)
+    if not entry:
+        abort(404)
+
+    if f'"{entry["etag"]}"' in request.headers.get('If-None-Match', ''):
+        response = Response(status=304)
+    else:
+        accepted = _accepted_encodings()
+        body, encoding = entry['body'], None
+        if entry['br'] and 'br' in accepted:
+            body, encoding = entry['br'], 'br'
+        elif entry['gzip'] and ('gzip' in accepted or '*' in accepted):
+            body, encoding = entry['gzip'], 'gzip'
+
+        response = Response(body, mimetype=entry['mimetype'])
+        if encoding:
+            response.headers['Content-Encoding'] = encoding
+
+    response.headers['Cache-Control'] = IMMUTABLE_CACHE_CONTROL
+    response.headers['ETag'] = f'"{entry["etag"]}"'
+    if entry['gzip']:
+        response.headers['Vary'] = 'Accept-Encoding'
+    return response
+
+def register_assets(app):
+    """Builds the manifest, adds the /assets route and the asset_url() template global."""
+    count = build_manifest(app.static_folder)
+    app.add_url_rule(f"{ASSET_URL_PREFIX}/<path:filename>", 'assets', serve_asset)
+    app.jinja_env.globals['asset_url'] = asset_url
+
+    print(f">>> Fingerprinted {count} static assets (brotli {'on' if brotli else 'off'}).")
@@ -0,0 +1,126 @@
+# beatmap_search.py
+
+# Beatmap autocomplete for goal creation, over the beatmaps table (every map our
+# users have played, see beatmaps.py) and without calling osu!.
+#
+# beatmaps.search_text holds "artist title version" lowercased. With pg_trgm a query
+# matches maps containing every word of it (LIKE, served by a trigram GIN index).
+# Without the extension - and for queries shorter than a trigram - it matches titles
+# starting with the query (btree text_pattern_ops index). Either way results are
+# ordered by beatmaps.play_count, which refresh_play_counts() recomputes from
+# score_history (maintenance.py refresh-beatmap-search, e.g. daily from cron).
+#
+# Each worker keeps recent result sets in an LRU. A set that was complete (fewer than
+# SEARCH_FETCH_ROWS rows) also answers any longer query extending it, by filtering in
+# memory, so typing "blue zen" after "blue" doesn't touch the database.
+import time
+import psycopg2
+from cache import LRUCache
+
+SEARCH_FETCH_ROWS = 100
+SEARCH_CACHE_TTL_SECONDS = 300
+# pg_trgm can't use its index for fewer characters than this
+MIN_TRIGRAM_QUERY = 3
+
+SEARCH_COLUMNS = ('beatmap_id', 'title', 'artist', 'version', 'difficulty_rating', 'play_count')
+
+_search_cache = LRUCache(maxsize=4096)
+_trigram_index = None  # checked once per process
+
+def create_search_indexes(cur):
+    """Title prefix index, plus pg_trgm and the trigram index when the extension can be installed."""
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_beatmaps_title_prefix ON beatmaps (lower(title) text_pattern_ops);")
+    cur.execute("SAVEPOINT beatmap_trgm")
+    try:
+        cur.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm;")
+        cur.execute("CREATE INDEX IF NOT EXISTS idx_beatmaps_search_trgm ON beatmaps USING gin (search_text gin_trgm_ops);")
+        cur.execute("RELEASE SAVEPOINT beatmap_trgm")
+        return True
+    except psycopg2.Error as e:
+        cur.execute("ROLLBACK TO SAVEPOINT beatmap_trgm")
+        print(f">>> pg_trgm unavailable ({str(e).splitlines()[0]}); beatmap search will match title prefixes only.")
+        return False
+
+def refresh_play_counts(cur):
+    """Recomputes beatmaps.play_count from score_history. Returns the number of maps changed."""
+    cur.execute("""
+        UPDATE beatmaps b SET play_count = c.plays
+        FROM (SELECT beatmap_id, COUNT(*) AS plays FROM score_history WHERE beatmap_id IS NOT NULL GROUP BY beatmap_id) c
+        WHERE b.beatmap_id = c.beatmap_id AND b.play_count IS DISTINCT FROM c.plays
+    """)
+    changed = cur.rowcount
+    # Maps whose plays were all reset or archived
+    cur.execute("""
+        UPDATE beatmaps b SET play_count = 0
+        WHERE b.play_count <> 0 AND NOT EXISTS (SELECT 1 FROM score_history sh WHERE sh.beatmap_id = b.beatmap_id)
+    """)
+    return changed + cur.rowcount
+
+def trigram_search_available(cur):
+    global _trigram_index
+    if _trigram_index is None:
+        cur.execute("SELECT 1 FROM pg_indexes WHERE indexname = 'idx_beatmaps_search_trgm'")
+        _trigram_index = cur.fetchone() is not None
+    return _trigram_index
+
+def normalize_query(query):
+    return ' '.join((query or '').lower().split())
+
+def _like_escape(text):
+    return text.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+def _search_text(row):
+    # Same text as the beatmaps.search_text column
+    return f"{row['artist'] or ''} {row['title'] or ''} {row['version'] or ''}".lower()
+
+def _matches(mode, query, row):
+    if mode == 'words':
+        text = _search_text(row)
+        return all(word in text for word in query.split(' '))
+    return (row['title'] or '').lower().startswith(query)
+
+def _cached(mode, query):
+    now = time.time()
+    entry = _search_cache.get((mode, query))
+    if entry and now - entry[0] < SEARCH_CACHE_TTL_SECONDS:
+        return entry[1]
+    # Anything matching the query also matched each of its prefixes
+    for end in range(len(query) - 1, 0, -1):
+        entry = _search_cache.get((mode, query[:end]))
+        if entry and now - entry[0] < SEARCH_CACHE_TTL_SECONDS and len(entry[1]) < SEARCH_FETCH_ROWS:
+            rows = [r for r in entry[1] if _matches(mode, query, r)]
+            _search_cache.put((mode, query), (entry[0], rows))
+            return rows
+    return None
+
+def _fetch(cur, mode, query):
+    if mode == 'words':
+        words = query.split(' ')
+        where = ' AND '.join(["search_text LIKE %s"] * len(words))
+        params = [f"%{_like_escape(w)}%" for w in words]
+    else:
+        where = "lower(title) LIKE %s"
+        params = [f"{_like_escape(query)}%"]
+    cur.execute(f"""
+        SELECT {', '.join(SEARCH_COLUMNS)} FROM beatmaps
+        WHERE {where}
+        ORDER BY play_count DESC, beatmap_id
+        LIMIT %s
+    """, (*params, SEARCH_FETCH_ROWS))
+    return [dict(zip(SEARCH_COLUMNS, r)) for r in cur.fetchall()]
+
+def search_beatmaps(cur, query, limit=10):
+    """Up to `limit` beatmaps (dicts of SEARCH_COLUMNS) matching the query, most played first. A number matches the beatmap id."""
+    query = normalize_query(query)
+    if not query:
+        return []
+    if query.isdigit() and len(query) <= 18:
+        cur.execute(f"SELECT {', '.join(SEARCH_COLUMNS)} FROM beatmaps WHERE beatmap_id = %s", (int(query),))
+        return [dict(zip(SEARCH_COLUMNS, r)) for r in cur.fetchall()]
+
+    mode = 'words' if len(query) >= MIN_TRIGRAM_QUERY and trigram_search_available(cur) else 'prefix'
+    rows = _cached(mode, query)
+    if rows is None:
+        rows = _fetch(cur, mode, query)
+        _search_cache.put((mode, query), (time.time(), rows))
+    return rows[:limit]
@@ -0,0 +1,115 @@
+# beatmaps.py
+
+# Beatmap metadata cache. One row per beatmap_id in the `beatmaps` table, with an
+# in-process LRU in front of it. score_history only keeps the beatmap_id and joins
+# here for the title, length and max combo. play_count and search_text back the
+# goal-form autocomplete (beatmap_search.py).
+from psycopg2.extras import execute_values
+from cache import LRUCache
+from osu_api import lookup_beatmaps
+
+BEATMAP_FIELDS = ('beatmap_id', 'beatmapset_id', 'title', 'artist', 'version',
+                  'max_combo', 'total_length', 'difficulty_rating', 'bpm', 'ar', 'od', 'cs', 'hp')
+
+_beatmap_cache = LRUCache(maxsize=20000)
+
+def create_beatmaps_table(cur):
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS beatmaps (
+            beatmap_id BIGINT PRIMARY KEY,
+            beatmapset_id BIGINT,
+            title TEXT,
+            artist TEXT,
+            version TEXT,
+            max_combo INT,
+            total_length INT,
+            difficulty_rating FLOAT,
+            bpm FLOAT,
+            ar FLOAT,
+            od FLOAT,
+            cs FLOAT,
+            hp FLOAT,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            play_count INT DEFAULT 0,
+            search_text TEXT GENERATED ALWAYS AS (
+                lower(COALESCE(artist, '') || ' ' || COALESCE(title, '') || ' ' || COALESCE(version, ''))
+            ) STORED
+        );
+    """)
+
+def beatmap_from_api(beatmap, beatmapset=None):
+    """Builds a beatmaps row from an API beatmap object (and its beatmapset, if separate)."""
+    beatmapset = beatmapset or beatmap.get('beatmapset') or {}
+    return {
+        'beatmap_id': beatmap.get('id'),
+        'beatmapset_id': beatmap.get('beatmapset_id') or beatmapset.get('id'),
+        'title': beatmapset.get('title'),
+        'artist': beatmapset.get('artist'),
+        'version': beatmap.get('version'),
+        'max_combo': beatmap.get('max_combo') or None,
+        'total_length': beatmap.get('total_length'),
+        'difficulty_rating': beatmap.get('difficulty_rating'),
+        'bpm': beatmap.get('bpm'),
+        'ar': beatmap.get('ar'),
+        'od': beatmap.get('accuracy'),
+        'cs': beatmap.get('cs'),
+        'hp': beatmap.get('drain'),
+    }
+
+def upsert_beatmaps(cur, rows):
+    """
+    Inserts or refreshes beatmap rows. Fields missing from a payload (NULL) never
+    overwrite values we already have, since recent-score payloads are often partial.
+    """
+    rows = [r for r in rows if r.get('beatmap_id')]
+    if not rows: return
+
+    # One row per id, otherwise ON CONFLICT would touch the same row twice
+    unique_rows = {r['beatmap_id']: r for r in rows}
+    values = [tuple(r.get(f) for f in BEATMAP_FIELDS) for r in unique_rows.values()]
+    update_cols = ', '.join(f"{f} = COALESCE(EXCLUDED.{f}, beatmaps.{f})" for f in BEATMAP_FIELDS[1:])
+    execute_values(cur, f"""
+        INSERT INTO beatmaps ({', '.join(BEATMAP_FIELDS)})
+        VALUES %s
+        ON CONFLICT (beatmap_id) DO UPDATE SET {update_cols}, updated_at = CURRENT_TIMESTAMP
+    """, values)
+
+    for beatmap_id in unique_rows:
+        _beatmap_cache.invalidate(beatmap_id)
+
+def get_beatmaps(cur, beatmap_ids):
+    """Returns {beatmap_id: row} for the ids we know about, LRU first, then the table."""
+    found = {}
+    missing = []
+    for beatmap_id in set(beatmap_ids):
+        row = _beatmap_cache.get(beatmap_id)
+        if row is not None:
+            found[beatmap_id] = row
+        else:
+            missing.append(beatmap_id)
+
+    if missing:
+        cur.execute(f"SELECT {', '.join(BEATMAP_FIELDS)} FROM beatmaps WHERE beatmap_id = ANY(%s)", (missing,))
+        for r in cur.fetchall():
+            row = dict(zip(BEATMAP_FIELDS, r))
+            _beatmap_cache.put(row['beatmap_id'], row)
+            found[row['beatmap_id']] = row
+
+    return found
+
+def ensure_beatmaps(cur, beatmap_ids, token, refetch_incomplete=True):
+    """
+    Makes sure every id is in the beatmaps table, fetching unknown maps (and, by default,
+    maps still missing max_combo) from the osu! lookup API in batches.
+    Returns {beatmap_id: row} like get_beatmaps.
+    """
+    known = get_beatmaps(cur, beatmap_ids)
+    to_fetch = [
+        b for b in set(beatmap_ids)
+        if b not in known or (refetch_incomplete and not known[b].get('max_combo'))
+    ]
+    if to_fetch and token:
+        fetched = [beatmap_from_api(b) for b in lookup_beatmaps(to_fetch, token)]
+        upsert_beatmaps(cur, fetched)
+        known.update(get_beatmaps(cur, to_fetch))
+    return known
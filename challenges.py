@@ -0,0 +1,278 @@
+# challenges.py
+
+# Group challenges: a goal shared by everyone who joined it ("the group FCs 100 maps
+# at 6★+"), with a group total and per-member contributions. Criteria are the same
+# as custom goals (goal_progress.evaluate_criteria); a challenge counts successful plays.
+#
+# Ingest never updates a shared row. Each member's batch appends one delta row per
+# challenge it advanced (challenge_deltas), so any number of members can sync at once
+# without waiting on each other. compact_challenge() periodically folds the deltas
+# into challenge_members.contributed and challenges.progress in one transaction
+# (one compactor at a time, via an advisory lock), so readers see the compacted totals
+# plus the few deltas still pending. Standings are cached per worker for
+# STANDINGS_TTL_SECONDS.
+import time
+import secrets
+import threading
+from psycopg2.extras import execute_values
+from cache import LRUCache
+from goal_progress import evaluate_criteria
+
+STANDINGS_TTL_SECONDS = 10
+# How often a worker checks for pending deltas (see compact_in_background_if_due)
+COMPACT_INTERVAL_SECONDS = 60
+# Advisory lock key so only one compaction runs at a time across workers/hosts
+COMPACT_LOCK_KEY = 7_300_003
+JOIN_CODE_BYTES = 5
+MAX_CHALLENGE_MEMBERS = 100
+
+_standings_cache = LRUCache(maxsize=2048)
+_compact_state = {"running": False, "checked_at": 0}
+_compact_state_lock = threading.Lock()
+
+def create_challenge_tables(cur):
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS challenges (
+            id SERIAL PRIMARY KEY,
+            title TEXT,
+            criteria JSONB,
+            target INT,
+            progress INT DEFAULT 0,
+            join_code TEXT UNIQUE,
+            created_by BIGINT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            is_completed BOOLEAN DEFAULT FALSE,
+            completed_at TIMESTAMP
+        );
+    """)
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS challenge_members (
+            challenge_id INT REFERENCES challenges(id) ON DELETE CASCADE,
+            user_id BIGINT,
+            contributed INT DEFAULT 0,
+            joined_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            left_at TIMESTAMP,
+            PRIMARY KEY (challenge_id, user_id)
+        );
+    """)
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_challenge_members_user ON challenge_members (user_id) WHERE left_at IS NULL;")
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS challenge_deltas (
+            id BIGSERIAL PRIMARY KEY,
+            challenge_id INT,
+            user_id BIGINT,
+            delta INT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        );
+    """)
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_challenge_deltas_challenge ON challenge_deltas (challenge_id);")
+
+# --- MEMBERSHIP ---
+
+def create_challenge(cur, user_id, title, target, criteria):
+    """Creates a challenge with the creator as its first member. Returns (id, join_code)."""
+    join_code = secrets.token_hex(JOIN_CODE_BYTES)
+    cur.execute("""
+        INSERT INTO challenges (title, criteria, target, join_code, created_by)
+        VALUES (%s, %s::jsonb, %s, %s, %s)
+        RETURNING id
+    """, (title, criteria, target, join_code, user_id))
+    challenge_id = cur.fetchone()[0]
+    cur.execute("INSERT INTO challenge_members (challenge_id, user_id) VALUES (%s, %s)", (challenge_id, user_id))
+    return challenge_id, join_code
+
+def join_challenge(cur, user_id, join_code):
+    """
+    Joins (or rejoins) the challenge with this code. Returns its id, or None if the code is
+    unknown, the challenge is finished or full. Plays count from the next sync on.
+    """
+    cur.execute("SELECT id FROM challenges WHERE join_code = %s AND is_completed = FALSE", ((join_code or '').strip().lower(),))
+    row = cur.fetchone()
+    if not row:
+        return None
+    challenge_id = row[0]
+    cur.execute("SELECT COUNT(*) FROM challenge_members WHERE challenge_id = %s AND left_at IS NULL", (challenge_id,))
+    if cur.fetchone()[0] >= MAX_CHALLENGE_MEMBERS:
+        return None
+    cur.execute("""
+        INSERT INTO challenge_members (challenge_id, user_id) VALUES (%s, %s)
+        ON CONFLICT (challenge_id, user_id) DO UPDATE SET left_at = NULL
+    """, (challenge_id, user_id))
+    _standings_cache.invalidate(challenge_id)
+    return challenge_id
+
+def leave_challenge(cur, user_id, challenge_id):
+    """Stops counting a member's plays; what they contributed stays in the total."""
+    cur.execute("""
+        UPDATE challenge_members SET left_at = CURRENT_TIMESTAMP
+        WHERE challenge_id = %s AND user_id = %s AND left_at IS NULL
+    """, (challenge_id, user_id))
+    _standings_cache.invalidate(challenge_id)
+    return cur.rowcount > 0
+
+# --- INGEST ---
+
+class ChallengeBatch:
+    """One ingest batch of a member's plays against their open challenges (cf. goal_progress.GoalBatch)."""
+
+    def __init__(self, cur, user_id):
+        self.cur = cur
+        self.user_id = user_id
+        cur.execute("""
+            SELECT c.id, c.criteria FROM challenge_members m
+            JOIN challenges c ON c.id = m.challenge_id
+            WHERE m.user_id = %s AND m.left_at IS NULL AND c.is_completed = FALSE
+        """, (user_id,))
+        self.challenges = [{'id': r[0], 'criteria': r[1] or {}, 'delta': 0} for r in cur.fetchall()]
+
+    def apply(self, facts):
+        for challenge in self.challenges:
+            _, success = evaluate_criteria(challenge['criteria'], facts)
+            if success:
+                challenge['delta'] += 1
+
+    def flush(self):
+        """Appends one delta row per challenge this batch advanced. Returns the challenge ids."""
+        rows = [(c['id'], self.user_id, c['delta']) for c in self.challenges if c['delta']]
+        if rows:
+            execute_values(self.cur, "INSERT INTO challenge_deltas (challenge_id, user_id, delta) VALUES %s", rows)
+        return [r[0] for r in rows]
+
+# --- COMPACTION ---
+
+def compact_challenge(cur, challenge_id):
+    """
+    Folds a challenge's pending deltas into the member and challenge totals and marks it
+    completed once it reaches the target. Returns the number of delta rows folded.
+    Deltas inserted while this runs aren't seen by the DELETE and wait for the next run.
+    """
+    cur.execute("""
+        WITH moved AS (
+            DELETE FROM challenge_deltas WHERE challenge_id = %s RETURNING user_id, delta
+        ), per_member AS (
+            SELECT user_id, SUM(delta) AS total, COUNT(*) AS deltas FROM moved GROUP BY user_id
+        ), members AS (
+            UPDATE challenge_members m SET contributed = m.contributed + p.total
+            FROM per_member p
+            WHERE m.challenge_id = %s AND m.user_id = p.user_id
+        )
+        SELECT COALESCE(SUM(total), 0), COALESCE(SUM(deltas), 0) FROM per_member
+    """, (challenge_id, challenge_id))
+    total, deltas = cur.fetchone()
+    if deltas:
+        cur.execute("""
+            UPDATE challenges SET progress = progress + %s,
+                is_completed = progress + %s >= target,
+                completed_at = CASE WHEN progress + %s >= target THEN COALESCE(completed_at, CURRENT_TIMESTAMP) END
+            WHERE id = %s
+        """, (total, total, total, challenge_id))
+        _standings_cache.invalidate(challenge_id)
+    return deltas
+
+def compact_challenges(cur):
+    """
+    Compacts every challenge with pending deltas. Returns the number of delta rows folded,
+    or None if another compaction holds the lock (commit to release it).
+    """
+    cur.execute("SELECT pg_try_advisory_xact_lock(%s)", (COMPACT_LOCK_KEY,))
+    if not cur.fetchone()[0]:
+        return None
+    cur.execute("SELECT DISTINCT challenge_id FROM challenge_deltas")
+    return sum(compact_challenge(cur, challenge_id) for (challenge_id,) in cur.fetchall())
+
+def compact_in_background_if_due(connect):
+    """Runs compact_challenges() on a daemon thread at most every COMPACT_INTERVAL_SECONDS per worker."""
+    with _compact_state_lock:
+        now = time.time()
+        if _compact_state["running"] or now - _compact_state["checked_at"] < COMPACT_INTERVAL_SECONDS:
+            return
+        _compact_state["checked_at"] = now
+        _compact_state["running"] = True
+
+    def run():
+        try:
+            conn = connect()
+            cur = conn.cursor()
+            compact_challenges(cur)
+            conn.commit()
+            cur.close()
+            conn.close()
+        except Exception as e:
+            print(f"Challenge compaction failed: {e}")
+        finally:
+            with _compact_state_lock:
+                _compact_state["running"] = False
+
+    threading.Thread(target=run, daemon=True).start()
+
+# --- READS ---
+
+def get_standings(cur, challenge_id):
+    """
+    {'id', 'title', 'target', 'total', 'is_completed', 'members': [{user_id, username, contributed, active}]}
+    from the compacted totals plus pending deltas, cached for STANDINGS_TTL_SECONDS. None if unknown.
+    """
+    now = time.time()
+    entry = _standings_cache.get(challenge_id)
+    if entry and now - entry[0] < STANDINGS_TTL_SECONDS:
+        return entry[1]
+
+    cur.execute("SELECT title, target, progress, is_completed FROM challenges WHERE id = %s", (challenge_id,))
+    row = cur.fetchone()
+    if not row:
+        return None
+    title, target, progress, is_completed = row
+    cur.execute("""
+        SELECT m.user_id, u.username, m.contributed + COALESCE(d.pending, 0), m.left_at IS NULL
+        FROM challenge_members m
+        LEFT JOIN osu_users u ON u.user_id = m.user_id
+        LEFT JOIN (
+            SELECT user_id, SUM(delta) AS pending FROM challenge_deltas WHERE challenge_id = %s GROUP BY user_id
+        ) d ON d.user_id = m.user_id
+        WHERE m.challenge_id = %s
+        ORDER BY 3 DESC, m.joined_at
+    """, (challenge_id, challenge_id))
+    members = [
+        {'user_id': r[0], 'username': r[1], 'contributed': int(r[2]), 'active': r[3]}
+        for r in cur.fetchall()
+    ]
+    # Pending deltas of members who left still count
+    total = sum(m['contributed'] for m in members)
+    standings = {
+        'id': challenge_id,
+        'title': title,
+        'target': target,
+        'total': max(total, progress),
+        'is_completed': is_completed or total >= target,
+        'members': members
+    }
+    _standings_cache.put(challenge_id, (now, standings))
+    return standings
+
+def get_user_challenges(cur, user_id):
+    """The challenges a user is (or was) in, with the group total and their own contribution."""
+    cur.execute("""
+        SELECT c.id, c.join_code, m.left_at IS NULL FROM challenge_members m
+        JOIN challenges c ON c.id = m.challenge_id
+        WHERE m.user_id = %s
+        ORDER BY c.is_completed, c.created_at DESC
+    """, (user_id,))
+    challenges = []
+    for challenge_id, join_code, active in cur.fetchall():
+        standings = get_standings(cur, challenge_id)
+        if not standings:
+            continue
+        mine = next((m['contributed'] for m in standings['members'] if m['user_id'] == user_id), 0)
+        challenges.append({**standings, 'join_code': join_code, 'active': active, 'my_contribution': mine,
+                           'members': len(standings['members'])})
+    return challenges
+
+def delete_challenge_memberships(cur, user_id):
+    """Removes a deleted account from every challenge (their contributions leave the totals)."""
+    cur.execute("DELETE FROM challenge_deltas WHERE user_id = %s", (user_id,))
+    cur.execute("""
+        UPDATE challenges c SET progress = c.progress - m.contributed
+        FROM challenge_members m
+        WHERE m.challenge_id = c.id AND m.user_id = %s
+    """, (user_id,))
+    cur.execute("DELETE FROM challenge_members WHERE user_id = %s", (user_id,))
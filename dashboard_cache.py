@@ -0,0 +1,159 @@
+# dashboard_cache.py
+
+# Per-user cache of the dashboard state (goals, mastery, FC histogram, recent
+# feed, achievements) that /bootstrap and /check_scores return. Every entry is
+# tagged with osu_users.state_version; ingest and all goal/achievement mutations
+# bump that version in the same transaction as their writes, so an entry is valid
+# exactly while its version matches - no TTLs and no cross-worker invalidation.
+#
+# The default backend is a per-worker LRU bounded by the serialized size of its
+# entries. Set DASHBOARD_CACHE_URL=redis://localhost:6379/0 (and pip install redis)
+# to share one cache between all workers on a host.
+import os
+import json
+import threading
+from collections import OrderedDict
+
+DEFAULT_MAX_BYTES = 32 * 1024 * 1024
+# Shared-cache entries of inactive users expire eventually; versions keep them correct until then
+REDIS_TTL_SECONDS = 24 * 3600
+
+def get_state_version(cur, user_id):
+    cur.execute("SELECT state_version FROM osu_users WHERE user_id = %s", (user_id,))
+    row = cur.fetchone()
+    return row[0] if row else None
+
+def bump_state_version(cur, user_id):
+    """Marks the user's cached dashboard state stale. Call inside the transaction that changes it."""
+    cur.execute("UPDATE osu_users SET state_version = state_version + 1 WHERE user_id = %s", (user_id,))
+
+class MemoryBackend:
+    """Thread-safe LRU of byte strings, evicting least recently used entries beyond max_bytes."""
+
+    def __init__(self, max_bytes=DEFAULT_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.bytes_used = 0
+        self.evictions = 0
+
+    def get(self, key):
+        with self._lock:
+            value = self._data.get(key)
+            if value is not None:
+                self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        size = len(key) + len(value)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            old = self._data.pop(key, None)
+            if old is not None:
+                self.bytes_used -= len(key) + len(old)
+            self._data[key] = value
+            self.bytes_used += size
+            while self.bytes_used > self.max_bytes:
+                old_key, old_value = self._data.popitem(last=False)
+                self.bytes_used -= len(old_key) + len(old_value)
+                self.evictions += 1
+
+    def delete(self, key):
+        with self._lock:
+            old = self._data.pop(key, None)
+            if old is not None:
+                self.bytes_used -= len(key) + len(old)
+
+    def stats(self):
+        return {'backend': 'memory', 'entries': len(self._data), 'bytes': self.bytes_used,
+                'max_bytes': self.max_bytes, 'evictions': self.evictions}
+
+class RedisBackend:
+    """Shared backend; memory limits and eviction are left to the Redis maxmemory policy."""
+
+    def __init__(self, url, ttl=REDIS_TTL_SECONDS):
+        import redis
+        self.client = redis.Redis.from_url(url)
+        self.ttl = ttl
+
+    def get(self, key):
+        return self.client.get(key)
+
+    def set(self, key, value):
+        self.client.set(key, value, ex=self.ttl)
+
+    def delete(self, key):
+        self.client.delete(key)
+
+    def stats(self):
+        info = self.client.info('memory')
+        return {'backend': 'redis', 'bytes': info.get('used_memory'), 'max_bytes': info.get('maxmemory')}
+
+class DashboardCache:
+    """
+    Versioned get-or-load on top of a backend. Values are stored serialized as
+    b"<version>\\n<payload>"; `dumps`/`loads` should match what the response encoder does
+    so cached and freshly loaded values render identically.
+    """
+
+    def __init__(self, backend, dumps=json.dumps, loads=json.loads):
+        self.backend = backend
+        self.dumps = dumps
+        self.loads = loads
+        self.hits = 0
+        self.misses = 0
+        self.errors = 0
+
+    def get_or_load(self, section, user_id, version, loader):
+        key = f"dashboard:{section}:{user_id}"
+        try:
+            raw = self.backend.get(key)
+        except Exception as e:
+            # A broken shared cache must not take the dashboard down
+            self.errors += 1
+            print(f"Dashboard cache read failed: {e}")
+            raw = None
+
+        if raw is not None:
+            cached_version, _, payload = raw.partition(b'\n')
+            if cached_version == str(version).encode():
+                self.hits += 1
+                return self.loads(payload)
+
+        self.misses += 1
+        payload = self.dumps(loader()).encode()
+        try:
+            self.backend.set(key, f"{version}\n".encode() + payload)
+        except Exception as e:
+            self.errors += 1
+            print(f"Dashboard cache write failed: {e}")
+        # Same shape on a miss as on a hit (e.g. JSON object keys are always strings)
+        return self.loads(payload)
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'errors': self.errors,
+            'hit_rate': round(self.hits / lookups, 4) if lookups else None,
+            **self.backend.stats(),
+        }
+
+def create_dashboard_cache(dumps=json.dumps, loads=json.loads):
+    """
+    Redis-backed when DASHBOARD_CACHE_URL is set and the redis package is installed, else
+    in-process (DASHBOARD_CACHE_MAX_BYTES per worker). Read at call time so .env files apply.
+    """
+    url = os.environ.get("DASHBOARD_CACHE_URL")
+    if url:
+        try:
+            backend = RedisBackend(url)
+            print(">>> Dashboard cache: shared (redis)")
+            return DashboardCache(backend, dumps, loads)
+        except ImportError:
+            print(">>> DASHBOARD_CACHE_URL is set but the redis package isn't installed; using the in-process cache.")
+    max_bytes = int(os.environ.get("DASHBOARD_CACHE_MAX_BYTES", DEFAULT_MAX_BYTES))
+    print(f">>> Dashboard cache: in-process, {max_bytes // (1024 * 1024)} MB per worker")
+    return DashboardCache(MemoryBackend(max_bytes), dumps, loads)
@@ -0,0 +1,91 @@
+# db.py
+
+# Routing of read-only work to an optional streaming read replica (DATABASE_READ_URL).
+# Writes, locks and anything that must see them stay on the primary (DATABASE_URL).
+#
+# Read-your-writes comes from osu_users.state_version, which every write a user reads
+# back bumps in the same transaction (dashboard_cache.py):
+#   - on_replica() is for requests that already hold a primary connection: it reads the
+#     user's version there and only uses the replica once the replica has replayed it.
+#   - Routes that open no primary connection use run_read(pinned=...); app.py pins
+#     a session to the primary for PRIMARY_PIN_SECONDS after that session's own writes.
+# A replica that refuses connections or fails mid-read is skipped for REPLICA_RETRY_SECONDS
+# and the reads go to the primary.
+#
+# Local replica for testing (primary on the default port):
+#   pg_basebackup -h localhost -D /tmp/replica -R -X stream
+#   pg_ctl -D /tmp/replica -o "-p 5433" start
+#   DATABASE_READ_URL=postgresql://localhost:5433/<database> python app.py
+# SELECT pg_wal_replay_pause() on the replica simulates lag.
+import os
+import time
+import psycopg2
+from dashboard_cache import get_state_version
+
+# Should comfortably exceed normal replication lag
+PRIMARY_PIN_SECONDS = 10
+REPLICA_RETRY_SECONDS = 30
+REPLICA_CONNECT_TIMEOUT = 2
+
+_replica_down_until = 0.0
+
+def replica_configured():
+    return bool(os.environ.get("DATABASE_READ_URL"))
+
+def _mark_replica_down(e):
+    global _replica_down_until
+    _replica_down_until = time.time() + REPLICA_RETRY_SECONDS
+    print(f"Read replica unavailable, using the primary for {REPLICA_RETRY_SECONDS}s: {e}")
+
+def connect_replica():
+    """New replica connection, or None when there's no replica or it is marked down."""
+    if not replica_configured() or time.time() < _replica_down_until:
+        return None
+    try:
+        conn = psycopg2.connect(os.environ["DATABASE_READ_URL"], connect_timeout=REPLICA_CONNECT_TIMEOUT)
+        conn.set_session(readonly=True)
+        return conn
+    except psycopg2.OperationalError as e:
+        _mark_replica_down(e)
+        return None
+
+def run_read(read, connect_primary, pinned=False):
+    """
+    Returns read(cur) for a read-only route: run on the replica when healthy and not pinned,
+    else on a new primary connection. If the replica fails mid-read it is marked down and
+    read(cur) runs again on the primary, so `read` must only read.
+    """
+    conn = None if pinned else connect_replica()
+    if conn is not None:
+        try:
+            return read(conn.cursor())
+        except psycopg2.OperationalError as e:
+            _mark_replica_down(e)
+        finally:
+            conn.close()
+    conn = connect_primary()
+    try:
+        return read(conn.cursor())
+    finally:
+        conn.close()
+
+def on_replica(read, primary_cur, user_id, version=None):
+    """
+    Returns read(cur) run on the replica if it has caught up with the user's state_version on
+    the primary (pass `version` if it's already known), otherwise read(primary_cur).
+    """
+    if version is None:
+        version = get_state_version(primary_cur, user_id)
+    conn = connect_replica() if version is not None else None
+    if conn is None:
+        return read(primary_cur)
+    try:
+        cur = conn.cursor()
+        replica_version = get_state_version(cur, user_id)
+        if replica_version is not None and replica_version >= version:
+            return read(cur)
+    except psycopg2.OperationalError as e:
+        _mark_replica_down(e)
+    finally:
+        conn.close()
+    return read(primary_cur)
@@ -0,0 +1,89 @@
+# difficulty.py
+
+# Mod-adjusted difficulty attributes. Star ratings depend on the mods (DT/HR/EZ/HT/FL),
+# so they are cached per (beatmap_id, difficulty mod bitmask) in `beatmap_attributes`
+# with an in-process LRU in front. Misses for one ingest batch are fetched concurrently.
+from concurrent.futures import ThreadPoolExecutor
+from psycopg2.extras import execute_values
+from cache import LRUCache
+from osu_api import get_beatmap_attributes
+
+ATTRIBUTE_FETCH_WORKERS = 8
+
+_attribute_cache = LRUCache(maxsize=50000)
+
+def create_attributes_table(cur):
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS beatmap_attributes (
+            beatmap_id BIGINT,
+            mods INT,
+            star_rating FLOAT,
+            max_combo INT,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (beatmap_id, mods)
+        );
+    """)
+
+def get_difficulty_attributes(cur, keys, token):
+    """
+    Returns {(beatmap_id, mods): {'star_rating', 'max_combo'}} for the requested keys,
+    where mods is a difficulty_mod_bitmask. Checks the LRU, then the table, then fetches
+    whatever is left from the osu! API in parallel and stores it. Keys the API couldn't
+    answer are left out, so callers should fall back to the nomod rating.
+    """
+    keys = set(keys)
+    found = {}
+    missing = []
+    for key in keys:
+        attrs = _attribute_cache.get(key)
+        if attrs is not None:
+            found[key] = attrs
+        else:
+            missing.append(key)
+
+    if missing:
+        cur.execute("""
+            SELECT ba.beatmap_id, ba.mods, ba.star_rating, ba.max_combo
+            FROM beatmap_attributes ba
+            JOIN UNNEST(%s::bigint[], %s::int[]) AS k(beatmap_id, mods)
+              ON ba.beatmap_id = k.beatmap_id AND ba.mods = k.mods
+        """, ([k[0] for k in missing], [k[1] for k in missing]))
+        for beatmap_id, mods, star_rating, max_combo in cur.fetchall():
+            attrs = {'star_rating': star_rating, 'max_combo': max_combo}
+            _attribute_cache.put((beatmap_id, mods), attrs)
+            found[(beatmap_id, mods)] = attrs
+        missing = [k for k in missing if k not in found]
+
+    if missing and token:
+        fetched = fetch_attributes_concurrently(missing, token)
+        store_attributes(cur, fetched)
+        found.update(fetched)
+
+    return found
+
+def fetch_attributes_concurrently(keys, token):
+    """Calls the attributes endpoint for every key in parallel. Returns the keys that succeeded."""
+    def fetch(key):
+        try:
+            return key, get_beatmap_attributes(key[0], key[1], token)
+        except Exception as e:
+            print(f"Attribute fetch error for {key}: {e}")
+            return key, None
+
+    results = {}
+    with ThreadPoolExecutor(max_workers=min(ATTRIBUTE_FETCH_WORKERS, len(keys))) as pool:
+        for key, attrs in pool.map(fetch, keys):
+            if attrs and attrs.get('star_rating') is not None:
+                results[key] = {'star_rating': attrs['star_rating'], 'max_combo': attrs.get('max_combo')}
+    return results
+
+def store_attributes(cur, attributes):
+    if not attributes: return
+    execute_values(cur, """
+        INSERT INTO beatmap_attributes (beatmap_id, mods, star_rating, max_combo)
+        VALUES %s
+        ON CONFLICT (beatmap_id, mods) DO UPDATE
+        SET star_rating = EXCLUDED.star_rating, max_combo = EXCLUDED.max_combo, updated_at = CURRENT_TIMESTAMP
+    """, [(k[0], k[1], a['star_rating'], a['max_combo']) for k, a in attributes.items()])
+    for key, attrs in attributes.items():
+        _attribute_cache.put(key, attrs)
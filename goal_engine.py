@@ -0,0 +1,264 @@
+# goal_engine.py
+
+# Rule engine for the achievements in goals_definitions.PREDETERMINED_GOALS.
+# Each goal's `rule` is compiled once into an evaluator, registered under its
+# logic_key in RULES. Evaluators keep a tiny JSON state per user (a counter, a
+# streak, a running sum), so each new score updates every assigned achievement
+# in O(1) without looking at score_history again.
+import json
+from psycopg2.extras import execute_values
+from goals_definitions import PREDETERMINED_GOALS, GOALS_BY_ID
+from scoring import matching_mod_bitmask
+
+# --- FILTERS ---
+
+def compile_filters(filters):
+    """
+    Turns a filters dict into a predicate over score facts (see score_facts()).
+    Supported keys: fc, pfc, pass, ss, min_stars, min_acc (percent), min_combo,
+    min_length (seconds), mods_include (all listed mods present), mods_exact.
+    """
+    checks = []
+    if filters.get('fc'):
+        checks.append(lambda f: f['is_fc'])
+    if filters.get('pfc'):
+        checks.append(lambda f: f['is_pfc'])
+    if filters.get('pass'):
+        checks.append(lambda f: f['rank'] != 'F')
+    if filters.get('ss'):
+        checks.append(lambda f: f['rank'] in ('X', 'XH'))
+    if 'min_stars' in filters:
+        min_stars = float(filters['min_stars'])
+        checks.append(lambda f: f['stars'] >= min_stars)
+    if 'min_acc' in filters:
+        min_acc = float(filters['min_acc'])
+        checks.append(lambda f: f['acc'] * 100 >= min_acc)
+    if 'min_combo' in filters:
+        min_combo = int(filters['min_combo'])
+        checks.append(lambda f: f['max_combo'] >= min_combo)
+    if 'min_length' in filters:
+        min_length = int(filters['min_length'])
+        checks.append(lambda f: f['map_length'] >= min_length)
+    if 'mods_include' in filters:
+        required = matching_mod_bitmask(filters['mods_include'])
+        checks.append(lambda f: f['mod_bits'] & required == required)
+    if 'mods_exact' in filters:
+        exact = matching_mod_bitmask(filters['mods_exact'])
+        checks.append(lambda f: f['mod_bits'] == exact)
+
+    return lambda facts: all(check(facts) for check in checks)
+
+def score_facts(score_id, stars, acc, is_fc, is_pfc, rank, mods, max_combo, map_length):
+    """The per-score values rules are evaluated against."""
+    return {
+        'score_id': score_id,
+        'stars': stars or 0,
+        'acc': acc or 0,
+        'is_fc': bool(is_fc),
+        'is_pfc': bool(is_pfc),
+        'rank': rank or '',
+        'mod_bits': matching_mod_bitmask(mods),
+        'max_combo': max_combo or 0,
+        'map_length': map_length or 0,
+    }
+
+# --- EVALUATORS ---
+
+class CountEvaluator:
+    """Completes after `target` matching plays."""
+
+    def __init__(self, target, predicate):
+        self.target = target
+        self.predicate = predicate
+
+    def initial_state(self):
+        return {'count': 0}
+
+    def update(self, state, facts):
+        if self.predicate(facts):
+            state['count'] += 1
+        return state
+
+    def progress(self, state):
+        return state['count']
+
+class StreakEvaluator:
+    """Completes after `target` matching plays in a row; any other play resets the run."""
+
+    def __init__(self, target, predicate):
+        self.target = target
+        self.predicate = predicate
+
+    def initial_state(self):
+        return {'current': 0, 'best': 0}
+
+    def update(self, state, facts):
+        state['current'] = state['current'] + 1 if self.predicate(facts) else 0
+        state['best'] = max(state['best'], state['current'])
+        return state
+
+    def progress(self, state):
+        return state['best']
+
+class SingleEvaluator:
+    """Completes on the first matching play."""
+
+    def __init__(self, target, predicate):
+        self.target = 1
+        self.predicate = predicate
+
+    def initial_state(self):
+        return {'done': False}
+
+    def update(self, state, facts):
+        if self.predicate(facts):
+            state['done'] = True
+        return state
+
+    def progress(self, state):
+        return 1 if state['done'] else 0
+
+class SumEvaluator:
+    """Completes once a numeric fact (e.g. map_length) summed over matching plays reaches `target`."""
+
+    def __init__(self, target, predicate, field='map_length'):
+        self.target = target
+        self.predicate = predicate
+        self.field = field
+
+    def initial_state(self):
+        return {'total': 0}
+
+    def update(self, state, facts):
+        if self.predicate(facts):
+            state['total'] += facts[self.field]
+        return state
+
+    def progress(self, state):
+        return int(state['total'])
+
+EVALUATOR_KINDS = {
+    'count': CountEvaluator,
+    'streak': StreakEvaluator,
+    'single': SingleEvaluator,
+    'sum': SumEvaluator,
+}
+
+def compile_rule(rule):
+    evaluator_cls = EVALUATOR_KINDS[rule['kind']]
+    params = {k: v for k, v in rule.items() if k not in ('kind', 'target', 'filters')}
+    return evaluator_cls(rule.get('target', 1), compile_filters(rule.get('filters', {})), **params)
+
+# logic_key -> compiled evaluator
+RULES = {goal['logic_key']: compile_rule(goal['rule']) for goal in PREDETERMINED_GOALS}
+
+# --- PERSISTENCE ---
+
+def create_achievements_table(cur):
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS user_achievements (
+            user_id BIGINT,
+            goal_id INT,
+            state JSONB,
+            progress INT DEFAULT 0,
+            target INT,
+            is_completed BOOLEAN DEFAULT FALSE,
+            assigned_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            completed_at TIMESTAMP,
+            PRIMARY KEY (user_id, goal_id)
+        );
+    """)
+
+def assign_achievement(cur, user_id, goal_id):
+    """Starts tracking a predetermined goal for a user. Returns False for unknown goals."""
+    goal = GOALS_BY_ID.get(goal_id)
+    if not goal:
+        return False
+    evaluator = RULES[goal['logic_key']]
+    cur.execute("""
+        INSERT INTO user_achievements (user_id, goal_id, state, progress, target)
+        VALUES (%s, %s, %s, 0, %s)
+        ON CONFLICT (user_id, goal_id) DO NOTHING
+    """, (user_id, goal_id, json.dumps(evaluator.initial_state()), evaluator.target))
+    return True
+
+def apply_scores(cur, user_id, facts_list):
+    """
+    Feeds a batch of new scores (in play order) through every assigned, unfinished
+    achievement and writes each changed state back once. Returns the goal ids completed.
+    """
+    if not facts_list: return []
+
+    cur.execute("""
+        SELECT goal_id, state FROM user_achievements
+        WHERE user_id = %s AND is_completed = FALSE
+    """, (user_id,))
+    rows = cur.fetchall()
+
+    updates = []
+    completed = []
+    for goal_id, state in rows:
+        goal = GOALS_BY_ID.get(goal_id)
+        if not goal: continue
+        evaluator = RULES[goal['logic_key']]
+        old_state = json.dumps(state, sort_keys=True)
+
+        for facts in facts_list:
+            state = evaluator.update(state, facts)
+            if evaluator.progress(state) >= evaluator.target:
+                break
+
+        progress = evaluator.progress(state)
+        is_completed = progress >= evaluator.target
+        if is_completed:
+            completed.append(goal_id)
+        if json.dumps(state, sort_keys=True) != old_state:
+            updates.append((user_id, goal_id, json.dumps(state), min(progress, evaluator.target), is_completed))
+
+    if updates:
+        execute_values(cur, """
+            UPDATE user_achievements AS ua
+            SET state = v.state::jsonb, progress = v.progress, is_completed = v.is_completed,
+                completed_at = CASE WHEN v.is_completed THEN CURRENT_TIMESTAMP ELSE NULL END
+            FROM (VALUES %s) AS v(user_id, goal_id, state, progress, is_completed)
+            WHERE ua.user_id = v.user_id AND ua.goal_id = v.goal_id
+        """, updates)
+
+    return completed
+
+def reset_achievements(cur, user_id):
+    """Puts every assigned achievement back to its initial state (used by Reset History)."""
+    cur.execute("SELECT goal_id FROM user_achievements WHERE user_id = %s", (user_id,))
+    for (goal_id,) in cur.fetchall():
+        goal = GOALS_BY_ID.get(goal_id)
+        if not goal: continue
+        evaluator = RULES[goal['logic_key']]
+        cur.execute("""
+            UPDATE user_achievements
+            SET state = %s, progress = 0, is_completed = FALSE, completed_at = NULL
+            WHERE user_id = %s AND goal_id = %s
+        """, (json.dumps(evaluator.initial_state()), user_id, goal_id))
+
+def get_achievements(cur, user_id):
+    """Every predetermined goal, merged with the user's progress if they've assigned it."""
+    cur.execute("""
+        SELECT goal_id, progress, target, is_completed, completed_at
+        FROM user_achievements WHERE user_id = %s
+    """, (user_id,))
+    assigned = {r[0]: r for r in cur.fetchall()}
+
+    achievements = []
+    for goal in PREDETERMINED_GOALS:
+        row = assigned.get(goal['id'])
+        achievements.append({
+            'id': goal['id'],
+            'title': goal['title'],
+            'description': goal['description'],
+            'icon': goal['icon'],
+            'assigned': row is not None,
+            'progress': row[1] if row else 0,
+            'target': row[2] if row else RULES[goal['logic_key']].target,
+            'is_completed': row[3] if row else False,
+            'completed_at': row[4] if row else None
+        })
+    return achievements
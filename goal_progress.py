@@ -0,0 +1,196 @@
+# goal_progress.py
+
+# Progress tracking for the custom goals in user_active_goals. Ingest loads the
+# user's open goals once, feeds every new score through them in play order and
+# writes each changed goal back with a single statement at the end of the batch.
+#
+# Streak goals (criteria "streak": true) keep their state on the goal row:
+# streak_current (the running count), streak_best and streak_last_score_id (the
+# last score_history id evaluated, so a score is never counted twice).
+# Windowed goals (criteria "window", see windows.GOAL_WINDOWS) count plays in a
+# ring buffer kept in window_state instead of a lifetime counter.
+# Mod rules compare bitmasks (scoring.MOD_BITS): criteria "mod_match" decides
+# whether the play needs exactly the goal's mods or just has to include them.
+import json
+from psycopg2.extras import execute_values
+from windows import GOAL_WINDOWS, RingCounter
+from scoring import get_mod_group, bitmask_to_mods, matching_bits, matching_mod_bitmask, parse_mod_combination
+
+# Which plays break a streak is set per goal by criteria["streak_break"].
+# Paused goals don't see plays at all, so pausing neither extends nor breaks a streak.
+STREAK_BREAK_RULES = {
+    # Strictly consecutive: every play that doesn't meet the goal ends the run
+    'any_play': "Any play that doesn't meet the goal",
+    # Plays outside the goal's map filters (stars, mods, beatmap, length) are skipped;
+    # only a matching map played without meeting the goal (type, accuracy, combo) ends the run
+    'matching_play': "A matching map played without meeting the goal",
+}
+DEFAULT_STREAK_BREAK = 'any_play'
+
+MOD_MATCH_RULES = {
+    'exact': "Exactly these mods",
+    # e.g. HD matches HD, HDHR, HDDT...
+    'contains': "Any combination including these mods",
+}
+DEFAULT_MOD_MATCH = 'exact'
+
+def criteria_mod_bits(criteria):
+    """Matching bitmask for a goal's mod_combination (stored on newer goals, derived for older ones)."""
+    if criteria.get('mod_bits') is not None:
+        return criteria['mod_bits']
+    return matching_mod_bitmask(parse_mod_combination(criteria.get('mod_combination')))
+
+def goal_facts(score_id, stars, acc, is_fc, rank, mod_bits, beatmap_id, max_combo, map_length, played_at):
+    """The per-score values goal criteria are checked against (mod_bits as stored in score_history)."""
+    return {
+        'score_id': score_id,
+        'stars': stars or 0,
+        'acc': acc or 0,
+        'is_fc': bool(is_fc),
+        'rank': rank or '',
+        'mod_bits': matching_bits(mod_bits),
+        'mod_group': get_mod_group(bitmask_to_mods(mod_bits)),
+        'beatmap_id': beatmap_id,
+        'max_combo': max_combo or 0,
+        'map_length': map_length or 0,
+        'played_at': played_at,
+    }
+
+def evaluate_criteria(criteria, facts):
+    """
+    Checks one score against a goal's criteria. Returns (eligible, success):
+    eligible - the play is on a map the goal is about (stars, mods, beatmap, length)
+    success  - eligible and the play meets the goal (type, accuracy, combo)
+    """
+    # Star Check (min_stars defaults to 0, so any star rating passes if not set)
+    min_stars_req = criteria.get('min_stars', 0)
+    if min_stars_req > 0 and facts['stars'] < min_stars_req:
+        return False, False
+
+    # Mod Check - mod_combination takes priority over the older single mod field
+    req_mod_combination = criteria.get('mod_combination', None)
+    req_mod = criteria.get('mod', 'Any')
+    if req_mod_combination and req_mod_combination != 'Any':
+        required = criteria_mod_bits(criteria)
+        if criteria.get('mod_match') == 'contains':
+            if facts['mod_bits'] & required != required:
+                return False, False
+        elif facts['mod_bits'] != required:
+            return False, False
+    elif req_mod and req_mod != 'Any':
+        if facts['mod_group'] != req_mod:
+            return False, False
+
+    # Map-specific goal check
+    req_beatmap_id = criteria.get('beatmap_id', None)
+    if req_beatmap_id is not None and facts['beatmap_id'] != int(req_beatmap_id):
+        return False, False
+
+    # Map length check
+    if criteria.get('use_length', False) and facts['map_length'] < int(criteria.get('map_length', 0)):
+        return False, False
+
+    # Combo check
+    if criteria.get('use_combo', False) and facts['max_combo'] < int(criteria.get('min_combo', 0)):
+        return True, False
+
+    # Accuracy check
+    if criteria.get('use_acc', False) and facts['acc'] * 100 < float(criteria.get('acc_needed', 0)):
+        return True, False
+
+    req_type = criteria.get('type', 'count')
+    if req_type == 'pass':
+        return True, facts['rank'] != 'F'
+    if req_type == 'fc':
+        return True, facts['is_fc']
+    if req_type == 'ss':
+        return True, facts['rank'] in ('X', 'XH')
+    return True, True
+
+def advance_streak(current, best, eligible, success, break_on=DEFAULT_STREAK_BREAK):
+    """Applies one play to a streak (see STREAK_BREAK_RULES). Returns (current, best)."""
+    if success:
+        current += 1
+    elif eligible or break_on == 'any_play':
+        current = 0
+    return current, max(best, current)
+
+class GoalBatch:
+    """One ingest batch worth of goal progress for a user, written back by flush()."""
+
+    def __init__(self, cur, user_id):
+        self.cur = cur
+        self.user_id = user_id
+        cur.execute("""
+            SELECT id, current_progress, target_progress, criteria, is_paused,
+                   streak_current, streak_best, streak_last_score_id, window_state
+            FROM user_active_goals
+            WHERE user_id = %s AND is_completed = FALSE
+        """, (user_id,))
+        self.goals = [
+            {
+                'id': r[0], 'progress': r[1] or 0, 'target': r[2], 'criteria': r[3] or {},
+                'is_paused': r[4], 'streak_current': r[5] or 0, 'streak_best': r[6] or 0,
+                'streak_last_score_id': r[7], 'changed': False,
+                'window': RingCounter.for_window(r[3]['window'], r[8]) if (r[3] or {}).get('window') in GOAL_WINDOWS else None
+            }
+            for r in cur.fetchall()
+        ]
+        self.contributions = []
+
+    def apply(self, facts):
+        """Feeds one new score (in play order) through every open goal."""
+        for goal in self.goals:
+            if goal['is_paused'] or goal['progress'] >= goal['target']:
+                continue
+            criteria = goal['criteria']
+            eligible, success = evaluate_criteria(criteria, facts)
+
+            if goal['window']:
+                if success:
+                    goal['window'].add(facts['played_at'])
+                    goal['progress'] = goal['window'].total(facts['played_at'])
+                    goal['changed'] = True
+            elif criteria.get('streak', False):
+                last_id = goal['streak_last_score_id']
+                if last_id is not None and facts['score_id'] <= last_id:
+                    continue
+                goal['streak_current'], goal['streak_best'] = advance_streak(
+                    goal['streak_current'], goal['streak_best'], eligible, success,
+                    criteria.get('streak_break', DEFAULT_STREAK_BREAK))
+                goal['streak_last_score_id'] = facts['score_id']
+                goal['progress'] = goal['streak_current']
+                goal['changed'] = True
+            elif success:
+                goal['progress'] += 1
+                goal['changed'] = True
+
+            if success:
+                self.contributions.append((goal['id'], facts['score_id'], self.user_id))
+
+    def flush(self):
+        """Writes every changed goal and the batch's contributions. Returns the ids completed."""
+        updates = [
+            (g['id'], g['progress'], g['progress'] >= g['target'],
+             g['streak_current'], g['streak_best'], g['streak_last_score_id'],
+             json.dumps(g['window'].to_state()) if g['window'] else None)
+            for g in self.goals if g['changed']
+        ]
+        if updates:
+            execute_values(self.cur, """
+                UPDATE user_active_goals AS g
+                SET current_progress = v.progress, is_completed = v.is_completed,
+                    completed_at = CASE WHEN v.is_completed THEN COALESCE(g.completed_at, CURRENT_TIMESTAMP) ELSE g.completed_at END,
+                    streak_current = v.streak_current, streak_best = v.streak_best,
+                    streak_last_score_id = v.streak_last_score_id,
+                    window_state = COALESCE(v.window_state, g.window_state)
+                FROM (VALUES %s) AS v(id, progress, is_completed, streak_current, streak_best, streak_last_score_id, window_state)
+                WHERE g.id = v.id
+            """, updates, template="(%s, %s, %s, %s, %s, %s::bigint, %s::jsonb)")
+
+        if self.contributions:
+            execute_values(self.cur, """
+                INSERT INTO goal_contributions (goal_id, score_history_id, user_id) VALUES %s
+            """, self.contributions)
+
+        return [u[0] for u in updates if u[2]]
@@ -0,0 +1,99 @@
+# goal_reconcile.py
+
+# Nightly repair of custom goal progress (python maintenance.py reconcile-goals).
+# Ingest keeps user_active_goals.current_progress as a running counter (GoalBatch),
+# which can drift from the goal_contributions rows behind it after races, deleted
+# scores or an FC reclassification. reconcile_users() recomputes progress and
+# completion for a batch of users in one grouped statement, rewrites only the goals
+# that differ and logs every change in goal_reconciliation_log.
+#
+# A contribution counts if its score_history row still exists, and for FC goals if
+# the row is still an FC. Streak and windowed goals are skipped: their progress is
+# a run or a time window, not a count of contributions. Completed goals are left
+# alone unless asked for, and a goal without any contributions is never rewritten:
+# its progress predates goal_contributions (v6), so a lower recount is only reported.
+# Users whose sync is running (sync_lock.py) are skipped and picked up on the next run.
+from sync_lock import SYNC_LOCK_NAMESPACE
+from dashboard_cache import bump_state_version
+
+RECONCILE_BATCH_USERS = 500
+# Log rows older than this are pruned at the start of each run
+RECONCILE_LOG_DAYS = 90
+
+def create_reconcile_tables(cur):
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS goal_reconciliation_log (
+            id BIGSERIAL PRIMARY KEY,
+            run_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            goal_id INT,
+            user_id BIGINT,
+            old_progress INT,
+            new_progress INT,
+            old_completed BOOLEAN,
+            new_completed BOOLEAN
+        );
+    """)
+    # The grouped recount reads contributions per goal
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_goal_contributions_goal ON goal_contributions (goal_id);")
+
+def reconcile_users(cur, user_ids, dry_run=False, include_completed=False):
+    """
+    Recomputes the count goals of `user_ids` from goal_contributions and fixes the ones that differ.
+    Must run inside a transaction (the caller commits; that also releases the sync locks taken here).
+    Returns (goals_checked, users_skipped, changes, untracked). changes are
+    (goal_id, user_id, old_progress, new_progress, old_completed, new_completed) tuples;
+    untracked are goals without contributions whose recount is lower, in the same shape, not applied.
+    """
+    cur.execute("""
+        WITH locked AS MATERIALIZED (
+            SELECT u AS user_id FROM unnest(%(users)s::bigint[]) u
+            WHERE pg_try_advisory_xact_lock(%(namespace)s, u::int)
+        ), expected AS (
+            SELECT g.id, g.user_id,
+                   COALESCE(g.current_progress, 0) AS old_progress, COALESCE(g.is_completed, FALSE) AS old_completed,
+                   LEAST(COUNT(DISTINCT sh.id), g.target_progress) AS new_progress,
+                   COUNT(DISTINCT sh.id) >= g.target_progress AS new_completed,
+                   COUNT(gc.id) > 0 AS tracked
+            FROM user_active_goals g
+            JOIN locked l ON l.user_id = g.user_id
+            LEFT JOIN goal_contributions gc ON gc.goal_id = g.id
+            LEFT JOIN score_history sh ON sh.user_id = gc.user_id AND sh.id = gc.score_history_id
+                AND (g.criteria->>'type' IS DISTINCT FROM 'fc' OR sh.is_fc)
+            WHERE COALESCE((g.criteria->>'streak')::boolean, FALSE) = FALSE
+              AND COALESCE(g.criteria->>'window', '') = ''
+              AND (%(include_completed)s OR NOT COALESCE(g.is_completed, FALSE))
+            GROUP BY g.id
+        ), differing AS (
+            SELECT * FROM expected WHERE new_progress <> old_progress OR new_completed <> old_completed
+        ), changed AS (
+            SELECT * FROM differing WHERE tracked
+        ), updated AS (
+            UPDATE user_active_goals g
+            SET current_progress = c.new_progress, is_completed = c.new_completed,
+                completed_at = CASE WHEN c.new_completed THEN COALESCE(g.completed_at, CURRENT_TIMESTAMP) END
+            FROM changed c
+            WHERE g.id = c.id AND NOT %(dry_run)s
+        ), logged AS (
+            INSERT INTO goal_reconciliation_log (goal_id, user_id, old_progress, new_progress, old_completed, new_completed)
+            SELECT id, user_id, old_progress, new_progress, old_completed, new_completed FROM changed
+            WHERE NOT %(dry_run)s
+        )
+        SELECT (SELECT COUNT(*) FROM expected), (SELECT COUNT(*) FROM locked),
+               COALESCE((SELECT array_agg(ARRAY[id, user_id, old_progress, new_progress, old_completed::int, new_completed::int]) FROM changed), '{}'),
+               COALESCE((SELECT array_agg(ARRAY[id, user_id, old_progress, new_progress, old_completed::int, new_completed::int])
+                         FROM differing WHERE NOT tracked AND new_progress < old_progress), '{}')
+    """, {'users': list(user_ids), 'namespace': SYNC_LOCK_NAMESPACE, 'dry_run': dry_run,
+          'include_completed': include_completed})
+    checked, locked, rows, untracked_rows = cur.fetchone()
+    changes = [(r[0], r[1], r[2], r[3], bool(r[4]), bool(r[5])) for r in rows]
+    untracked = [(r[0], r[1], r[2], r[3], bool(r[4]), bool(r[5])) for r in untracked_rows]
+
+    if not dry_run:
+        # The dashboard shows goal progress, so its cached state is stale for these users
+        for user_id in sorted({c[1] for c in changes}):
+            bump_state_version(cur, user_id)
+    return checked, len(user_ids) - locked, changes, untracked
+
+def prune_reconcile_log(cur, days=RECONCILE_LOG_DAYS):
+    cur.execute("DELETE FROM goal_reconciliation_log WHERE run_at < CURRENT_TIMESTAMP - make_interval(days => %s)", (days,))
+    return cur.rowcount
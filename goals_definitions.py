@@ -1,40 +1,49 @@
 # goals_definitions.py
 
 # A library of all available goals.
-# logic_key: used later for the math engine to check if goal is met
+# logic_key: name of the compiled evaluator in goal_engine.RULES
+# rule: data the evaluator is compiled from. `kind` picks the evaluator
+#   (count / streak / single / sum, see goal_engine.EVALUATOR_KINDS) and `filters`
+#   decides which plays count. Adding an achievement only needs a new entry here.
 PREDETERMINED_GOALS = [
     {
         "id": 101,
         "title": "Consistency Rookie",
         "description": "FC 5 maps in a row (Any Difficulty)",
         "logic_key": "fc_streak_5",
-        "icon": "🛡️"
+        "icon": "🛡️",
+        "rule": {"kind": "streak", "target": 5, "filters": {"fc": True}}
     },
     {
         "id": 102,
         "title": "5-Star Conqueror",
         "description": "Accumulate 10 FCs on maps > 5.0 stars",
         "logic_key": "accumulate_5star_10",
-        "icon": "⭐"
+        "icon": "⭐",
+        "rule": {"kind": "count", "target": 10, "filters": {"fc": True, "min_stars": 5.0}}
     },
     {
         "id": 103,
         "title": "Accuracy Master",
         "description": "Submit a play with > 99% Accuracy (min. 4 stars)",
         "logic_key": "single_acc_99",
-        "icon": "🎯"
+        "icon": "🎯",
+        "rule": {"kind": "single", "filters": {"min_acc": 99.0, "min_stars": 4.0}}
     },
     {
         "id": 104,
         "title": "Speed Demon",
         "description": "Pass a DT map > 6.0 stars",
         "logic_key": "pass_dt_6star",
-        "icon": "⚡"
+        "icon": "⚡",
+        "rule": {"kind": "single", "filters": {"pass": True, "mods_include": ["DT"], "min_stars": 6.0}}
     }
 ]
 
+GOALS_BY_ID = {goal["id"]: goal for goal in PREDETERMINED_GOALS}
+
 def get_goal_by_id(goal_id):
-    for goal in PREDETERMINED_GOALS:
-        if goal["id"] == int(goal_id):
-            return goal
-    return None
\ No newline at end of file
+    try:
+        return GOALS_BY_ID.get(int(goal_id))
+    except (ValueError, TypeError):
+        return None
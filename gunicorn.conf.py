@@ -0,0 +1,28 @@
+# gunicorn.conf.py
+
+# Serving config for the Procfile (gunicorn -c gunicorn.conf.py app:app).
+# Most request time is spent waiting on the osu! API and Postgres, so workers default
+# to gevent: each process serves up to GEVENT_WORKER_CONNECTIONS requests at once and
+# switches greenlets whenever one blocks on a socket. gevent's monkey patching covers
+# requests/urllib3 and threading; psycopg2 talks to libpq directly, so it is made
+# cooperative with psycogreen after the fork.
+#
+# GUNICORN_WORKER_CLASS=sync goes back to one request per process (also the fallback
+# when gevent isn't installed). The worker count comes from WEB_CONCURRENCY as usual.
+# Every in-flight request holds its own Postgres connection, so workers x connections
+# should stay below the database's connection limit.
+import os
+import importlib.util
+
+def _gevent_installed():
+    # find_spec doesn't import gevent into the master process
+    return all(importlib.util.find_spec(name) for name in ('gevent', 'psycogreen'))
+
+worker_class = os.environ.get("GUNICORN_WORKER_CLASS") or ("gevent" if _gevent_installed() else "sync")
+worker_connections = int(os.environ.get("GEVENT_WORKER_CONNECTIONS", 50))
+
+def post_fork(server, worker):
+    if worker_class == "gevent":
+        from psycogreen.gevent import patch_psycopg
+        patch_psycopg()
+        server.log.info("psycopg2 patched for gevent (worker %s)", worker.pid)
@@ -0,0 +1,183 @@
+# leaderboards.py
+
+# Cross-user leaderboards served from a ranking snapshot. A refresh ranks every
+# board with one window-function query per board family and swaps the result into
+# `leaderboard_snapshots` in a single transaction, so readers always see a complete
+# snapshot. Reads are index lookups by (board, position) or (board, user_id) and
+# don't depend on the number of users. Stale snapshots keep being served while a
+# background refresh runs (at most one at a time across all workers).
+import time
+import threading
+
+MASTERY_BOARDS = {
+    'mastery_nm': 'nm_rating',
+    'mastery_hd': 'hd_rating',
+    'mastery_hr': 'hr_rating',
+    'mastery_dt': 'dt_rating',
+    'mastery_fl': 'fl_rating',
+}
+FC_STAR_BUCKETS = range(1, 11)
+
+BOARDS = {
+    **{board: f"{col[:2].upper()} Mastery" for board, col in MASTERY_BOARDS.items()},
+    'goals_completed': "Goals Completed",
+    **{f'fc_{n}star': f"{n}★ FCs" for n in FC_STAR_BUCKETS},
+}
+
+LEADERBOARD_TTL_SECONDS = 300
+# Advisory lock key so only one worker/host refreshes at a time
+REFRESH_LOCK_KEY = 7_300_001
+
+_refresh_state = {"running": False, "checked_at": 0}
+_refresh_state_lock = threading.Lock()
+
+def create_leaderboard_tables(cur):
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS leaderboard_snapshots (
+            board TEXT,
+            position INT,
+            user_id BIGINT,
+            value FLOAT,
+            PRIMARY KEY (board, position)
+        );
+    """)
+    cur.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_leaderboard_user ON leaderboard_snapshots (board, user_id);")
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS leaderboard_meta (
+            board TEXT PRIMARY KEY,
+            refreshed_at TIMESTAMP,
+            user_count INT
+        );
+    """)
+
+    # Indexes backing the refresh queries
+    for col in MASTERY_BOARDS.values():
+        cur.execute(f"CREATE INDEX IF NOT EXISTS idx_user_mastery_{col} ON user_mastery ({col} DESC);")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_goals_completed_user ON user_active_goals (user_id) WHERE is_completed = TRUE;")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_score_history_fc_stars ON score_history (user_id, stars) WHERE is_fc = TRUE;")
+
+def refresh_leaderboards(cur):
+    """
+    Rebuilds every board snapshot. Must run inside a transaction; returns False without
+    doing anything if another refresh currently holds the lock.
+    """
+    cur.execute("SELECT pg_try_advisory_xact_lock(%s)", (REFRESH_LOCK_KEY,))
+    if not cur.fetchone()[0]:
+        return False
+
+    cur.execute("DELETE FROM leaderboard_snapshots")
+
+    for board, col in MASTERY_BOARDS.items():
+        cur.execute(f"""
+            INSERT INTO leaderboard_snapshots (board, position, user_id, value)
+            SELECT %s, ROW_NUMBER() OVER (ORDER BY m.{col} DESC, m.user_id), m.user_id, m.{col}
+            FROM user_mastery m
+            JOIN osu_users u ON u.user_id = m.user_id
+            WHERE m.{col} > 0
+        """, (board,))
+
+    cur.execute("""
+        INSERT INTO leaderboard_snapshots (board, position, user_id, value)
+        SELECT 'goals_completed', ROW_NUMBER() OVER (ORDER BY COUNT(*) DESC, g.user_id), g.user_id, COUNT(*)
+        FROM user_active_goals g
+        JOIN osu_users u ON u.user_id = g.user_id
+        WHERE g.is_completed = TRUE
+        GROUP BY g.user_id
+    """)
+
+    # All FC star buckets in one pass over the FC index
+    cur.execute("""
+        INSERT INTO leaderboard_snapshots (board, position, user_id, value)
+        SELECT 'fc_' || star_int || 'star',
+               ROW_NUMBER() OVER (PARTITION BY star_int ORDER BY fc_count DESC, user_id),
+               user_id, fc_count
+        FROM (
+            SELECT c.user_id, c.star_int, SUM(c.fc_count) AS fc_count
+            FROM (
+                SELECT sh.user_id, FLOOR(sh.stars)::int AS star_int, COUNT(*) AS fc_count
+                FROM score_history sh
+                WHERE sh.is_fc = TRUE AND sh.stars >= %s AND sh.stars < %s
+                GROUP BY sh.user_id, FLOOR(sh.stars)::int
+                UNION ALL
+                -- FCs whose detail rows were archived
+                SELECT user_id, star_int, fc_count FROM score_archive_fc_counts
+                WHERE star_int BETWEEN %s AND %s
+            ) c
+            JOIN osu_users u ON u.user_id = c.user_id
+            GROUP BY c.user_id, c.star_int
+        ) counts
+    """, (min(FC_STAR_BUCKETS), max(FC_STAR_BUCKETS) + 1, min(FC_STAR_BUCKETS), max(FC_STAR_BUCKETS)))
+
+    cur.execute("""
+        INSERT INTO leaderboard_meta (board, refreshed_at, user_count)
+        SELECT b.board, CURRENT_TIMESTAMP, COALESCE(s.user_count, 0)
+        FROM UNNEST(%s::text[]) AS b(board)
+        LEFT JOIN (SELECT board, COUNT(*) AS user_count FROM leaderboard_snapshots GROUP BY board) s ON s.board = b.board
+        ON CONFLICT (board) DO UPDATE SET refreshed_at = EXCLUDED.refreshed_at, user_count = EXCLUDED.user_count
+    """, (list(BOARDS),))
+    return True
+
+def refresh_in_background_if_stale(connect):
+    """
+    Stale-while-refresh: if the snapshot is older than the TTL, start a refresh on a
+    daemon thread with its own connection and return immediately.
+    `connect` is a zero-argument function returning a new DB connection.
+    """
+    with _refresh_state_lock:
+        now = time.time()
+        # Only check the age once in a while per worker
+        if _refresh_state["running"] or now - _refresh_state["checked_at"] < 30:
+            return
+        _refresh_state["checked_at"] = now
+        _refresh_state["running"] = True
+
+    def run():
+        try:
+            conn = connect()
+            cur = conn.cursor()
+            cur.execute("SELECT EXTRACT(EPOCH FROM (CURRENT_TIMESTAMP - MIN(refreshed_at))) FROM leaderboard_meta")
+            row = cur.fetchone()
+            age = row[0] if row else None
+            if age is None or age > LEADERBOARD_TTL_SECONDS:
+                refresh_leaderboards(cur)
+            conn.commit()
+            cur.close()
+            conn.close()
+        except Exception as e:
+            print(f"Leaderboard refresh failed: {e}")
+        finally:
+            with _refresh_state_lock:
+                _refresh_state["running"] = False
+
+    threading.Thread(target=run, daemon=True).start()
+
+def get_top(cur, board, limit=50, offset=0):
+    cur.execute("""
+        SELECT ls.position, ls.user_id, u.username, ls.value
+        FROM leaderboard_snapshots ls
+        LEFT JOIN osu_users u ON u.user_id = ls.user_id
+        WHERE ls.board = %s AND ls.position > %s AND ls.position <= %s
+        ORDER BY ls.position
+    """, (board, offset, offset + limit))
+    return [
+        {'position': r[0], 'user_id': r[1], 'username': r[2] or str(r[1]), 'value': r[3]}
+        for r in cur.fetchall()
+    ]
+
+def get_position(cur, board, user_id):
+    """Returns {'position', 'value', 'total'} for a user on a board, or None if unranked."""
+    cur.execute("""
+        SELECT ls.position, ls.value, m.user_count
+        FROM leaderboard_snapshots ls
+        LEFT JOIN leaderboard_meta m ON m.board = ls.board
+        WHERE ls.board = %s AND ls.user_id = %s
+    """, (board, user_id))
+    row = cur.fetchone()
+    if not row:
+        return None
+    return {'position': row[0], 'value': row[1], 'total': row[2]}
+
+def get_refreshed_at(cur, board):
+    cur.execute("SELECT refreshed_at, user_count FROM leaderboard_meta WHERE board = %s", (board,))
+    row = cur.fetchone()
+    return (row[0], row[1]) if row else (None, 0)
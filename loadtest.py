@@ -0,0 +1,166 @@
+# loadtest.py
+
+# End-to-end load test against a running app that talks to osu_emulator.py.
+# Each simulated user logs in through /callback (the emulator accepts the user id as
+# the OAuth code), then opens a number of tabs. Every tab polls /check_scores like a
+# running session (waiting the server's next_poll_ms, or a fixed --poll-seconds with
+# --fixed-poll) and now and then reloads the dashboard (/ + /bootstrap).
+#
+#   python osu_emulator.py --port 5055 --latency-ms 80 &
+#   OSU_BASE_URL=http://localhost:5055 gunicorn -c gunicorn.conf.py -w 4 app:app &
+#   python loadtest.py --app http://localhost:8000 --emulator http://localhost:5055 --users 50 --tabs 2 --duration 120
+#
+# Reports throughput, latency percentiles per endpoint, errors, peak/average DB
+# connections (from pg_stat_activity, when DATABASE_URL is set) and osu! API calls
+# per user-minute (from the emulator's /_emulator/stats).
+#
+# To compare serving modes, run one worker (-w 1) with GUNICORN_WORKER_CLASS=sync and
+# then gevent against an emulator with realistic --latency-ms.
+import os
+import time
+import random
+import argparse
+import threading
+import requests
+import psycopg2
+from dotenv import load_dotenv
+
+load_dotenv()
+
+class Results:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latencies = {}   # endpoint -> [seconds]
+        self.errors = {}      # endpoint -> count
+
+    def record(self, endpoint, seconds, ok):
+        with self.lock:
+            self.latencies.setdefault(endpoint, []).append(seconds)
+            if not ok:
+                self.errors[endpoint] = self.errors.get(endpoint, 0) + 1
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(pct / 100 * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+def timed(results, session, method, url, endpoint, **kwargs):
+    started = time.perf_counter()
+    try:
+        response = session.request(method, url, timeout=30, **kwargs)
+        ok = response.status_code < 400 and not (endpoint == '/check_scores' and response.json().get('status') == 'error')
+    except (requests.RequestException, ValueError):
+        response, ok = None, False
+    results.record(endpoint, time.perf_counter() - started, ok)
+    return response
+
+def login(app_url, user_id):
+    session = requests.Session()
+    response = session.get(f"{app_url}/callback", params={'code': user_id}, allow_redirects=False, timeout=30)
+    if response.status_code not in (200, 302):
+        raise RuntimeError(f"Login failed for user {user_id}: {response.status_code}")
+    return session
+
+def run_tab(app_url, cookies, results, stop_at, poll_seconds, reload_chance, follow_hint):
+    session = requests.Session()
+    session.cookies.update(cookies)
+    # Tabs don't start in lockstep
+    time.sleep(random.uniform(0, poll_seconds))
+    started = time.time()
+    timed(results, session, 'GET', f"{app_url}/", '/')
+    timed(results, session, 'GET', f"{app_url}/bootstrap", '/bootstrap')
+    while time.time() < stop_at:
+        response = timed(results, session, 'POST', f"{app_url}/check_scores", '/check_scores',
+                         json={'session_age': round(time.time() - started)})
+        if random.random() < reload_chance:
+            timed(results, session, 'GET', f"{app_url}/", '/')
+            timed(results, session, 'GET', f"{app_url}/bootstrap", '/bootstrap')
+        delay = poll_seconds
+        if follow_hint and response is not None:
+            # Like the dashboard: next_poll_ms / Retry-After, +-20% jitter
+            try:
+                delay = response.json().get('next_poll_ms', delay * 1000) / 1000
+            except ValueError:
+                pass
+            delay = max(delay, float(response.headers.get('Retry-After') or 0)) * random.uniform(0.8, 1.2)
+        else:
+            delay = random.gauss(poll_seconds, poll_seconds * 0.1)
+        time.sleep(max(0.0, min(delay, stop_at - time.time())))
+
+def sample_db_connections(database_url, stop_event, samples, interval=1.0):
+    conn = psycopg2.connect(database_url)
+    conn.autocommit = True
+    cur = conn.cursor()
+    while not stop_event.is_set():
+        cur.execute("SELECT COUNT(*) FROM pg_stat_activity WHERE datname = current_database() AND pid <> pg_backend_pid()")
+        samples.append(cur.fetchone()[0])
+        stop_event.wait(interval)
+    cur.close()
+    conn.close()
+
+def emulator_api_calls(emulator_url):
+    stats = requests.get(f"{emulator_url}/_emulator/stats", timeout=10).json()
+    return sum(stats['endpoints'].values()), stats
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test the tracker against osu_emulator.py")
+    parser.add_argument('--app', default='http://localhost:5000', help="Base URL of the running app")
+    parser.add_argument('--emulator', default='http://localhost:5055', help="Base URL of osu_emulator.py")
+    parser.add_argument('--users', type=int, default=20)
+    parser.add_argument('--tabs', type=int, default=1, help="Open tabs per user")
+    parser.add_argument('--duration', type=float, default=60, help="Seconds to run")
+    parser.add_argument('--poll-seconds', type=float, default=15, help="Fixed poll interval per tab (with --fixed-poll), also the spread of tab start times")
+    parser.add_argument('--fixed-poll', action='store_true', help="Poll every --poll-seconds instead of following next_poll_ms like the dashboard")
+    parser.add_argument('--reload-chance', type=float, default=0.05, help="Chance a tab reloads the dashboard after each poll")
+    parser.add_argument('--first-user-id', type=int, default=9_000_000)
+    args = parser.parse_args()
+
+    results = Results()
+    print(f"🔑 Logging in {args.users} users...")
+    sessions = [login(args.app, args.first_user_id + i).cookies for i in range(args.users)]
+
+    calls_before, _ = emulator_api_calls(args.emulator)
+    db_samples = []
+    stop_event = threading.Event()
+    database_url = os.environ.get("DATABASE_URL")
+    if database_url:
+        threading.Thread(target=sample_db_connections, args=(database_url, stop_event, db_samples), daemon=True).start()
+
+    print(f"🚀 Running {args.users} users x {args.tabs} tabs for {args.duration:.0f}s...")
+    started = time.time()
+    stop_at = started + args.duration
+    threads = [
+        threading.Thread(target=run_tab, args=(args.app, cookies, results, stop_at, args.poll_seconds, args.reload_chance, not args.fixed_poll), daemon=True)
+        for cookies in sessions for _ in range(args.tabs)
+    ]
+    for t in threads: t.start()
+    for t in threads: t.join()
+    elapsed = time.time() - started
+    stop_event.set()
+
+    calls_after, emulator_stats = emulator_api_calls(args.emulator)
+
+    total_requests = sum(len(v) for v in results.latencies.values())
+    print("\n" + "=" * 72)
+    print(f"Requests: {total_requests} in {elapsed:.1f}s  ->  {total_requests / elapsed:.1f} req/s")
+    print(f"{'endpoint':<16}{'count':>8}{'errors':>8}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'max ms':>10}")
+    for endpoint, values in sorted(results.latencies.items()):
+        values = sorted(values)
+        print(f"{endpoint:<16}{len(values):>8}{results.errors.get(endpoint, 0):>8}"
+              f"{percentile(values, 50) * 1000:>10.0f}{percentile(values, 95) * 1000:>10.0f}"
+              f"{percentile(values, 99) * 1000:>10.0f}{values[-1] * 1000:>10.0f}")
+
+    if db_samples:
+        print(f"DB connections: peak {max(db_samples)}, avg {sum(db_samples) / len(db_samples):.1f}")
+    else:
+        print("DB connections: not sampled (set DATABASE_URL)")
+
+    user_minutes = args.users * elapsed / 60
+    api_calls = calls_after - calls_before
+    print(f"osu! API calls: {api_calls} ({api_calls / user_minutes:.2f} per user-minute); "
+          f"injected errors {emulator_stats['errors_injected']}, 429s {emulator_stats['rate_limited']}")
+    print("=" * 72)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,500 @@
+import os
+import argparse
+import csv
+import random
+import time
+import numpy as np
+import psycopg2
+from psycopg2.extras import execute_values
+from dotenv import load_dotenv
+from scoring import MASTERY_GROUPS, classify_fc_batch, effective_stars_batch, bitmask_to_mods, difficulty_mod_bitmask
+from beatmaps import beatmap_from_api, upsert_beatmaps
+from osu_api import get_client_token, lookup_beatmaps, BEATMAP_LOOKUP_BATCH
+from difficulty import get_difficulty_attributes
+from analytics import rebuild_rollups
+from performance import rebuild_performance
+from quantiles import rebuild_sketches
+from leaderboards import refresh_leaderboards
+from challenges import compact_challenges
+from token_store import check_token_key, refresh_expiring_tokens, PROACTIVE_REFRESH_SECONDS
+from goal_reconcile import RECONCILE_BATCH_USERS, reconcile_users, prune_reconcile_log
+from whatif import FORMULAS, FORMULA_NP_FUNCTIONS, LIVE_FORMULA, DEFAULT_WEIGHTS, parse_formula, load_history, load_stored_ratings, replay, compare, stored_drift, format_table
+from archive import ARCHIVE_AFTER_DAYS, archive_cutoff, archive_user, reclassify_archive, adjust_archived_stars, rebuild_archive_fc_counts
+from dashboard_cache import bump_state_version
+from beatmap_search import create_search_indexes, refresh_play_counts
+
+# Offline maintenance jobs. Run with: python maintenance.py <command> --help
+load_dotenv()
+DATABASE_URL = os.environ.get("DATABASE_URL")
+
+DEFAULT_CHUNK_SIZE = 5000
+
+def get_user_ids(cur, user_id=None):
+    """Returns [user_id] for a single user or every known user id."""
+    if user_id is not None:
+        return [user_id]
+    cur.execute("SELECT user_id FROM osu_users ORDER BY user_id")
+    return [r[0] for r in cur.fetchall()]
+
+def rebuild_aggregates(cur, user_id):
+    """
+    Recomputes everything derived from is_fc, stars and effective_stars: analytics rollups,
+    performance aggregates, quantile sketches and archived FC counts (the caller commits).
+    """
+    rebuild_rollups(cur, user_id)
+    rebuild_performance(cur, user_id)
+    rebuild_sketches(cur, user_id)
+    rebuild_archive_fc_counts(cur, user_id)
+    # Cached goal recommendations are computed from the aggregates
+    bump_state_version(cur, user_id)
+
+def reclassify_user(conn, user_id, chunk_size=DEFAULT_CHUNK_SIZE, dry_run=False):
+    """
+    Re-runs the FC/PFC rules over a user's score_history in id-ordered chunks.
+    Only rows whose is_fc/is_pfc actually change are written back.
+    Rows from before v9 without miss_count are skipped, since they can't be classified.
+    Archived rows (archive.py) are reclassified afterwards, month by month, and the user's
+    aggregates are rebuilt if anything changed.
+    Returns (rows_checked, rows_changed).
+    """
+    cur = conn.cursor()
+    last_id = 0
+    checked = 0
+    changed = 0
+
+    while True:
+        cur.execute("""
+            SELECT sh.id, sh.score_rank, sh.miss_count, sh.max_combo, COALESCE(b.max_combo, sh.map_max_combo), sh.is_fc, sh.is_pfc
+            FROM score_history sh
+            LEFT JOIN beatmaps b ON b.beatmap_id = sh.beatmap_id
+            WHERE sh.user_id = %s AND sh.id > %s AND sh.miss_count IS NOT NULL
+            ORDER BY sh.id
+            LIMIT %s
+        """, (user_id, last_id, chunk_size))
+        rows = cur.fetchall()
+        if not rows: break
+
+        ids, ranks, misses, combos, map_combos, old_fc, old_pfc = zip(*rows)
+        new_fc, new_pfc = classify_fc_batch(ranks, misses, combos, map_combos)
+
+        changed_mask = (new_fc != np.array(old_fc, dtype=bool)) | (new_pfc != np.array(old_pfc, dtype=bool))
+        diff = [(ids[i], bool(new_fc[i]), bool(new_pfc[i])) for i in np.flatnonzero(changed_mask)]
+
+        if diff and not dry_run:
+            execute_values(cur, f"""
+                UPDATE score_history AS sh
+                SET is_fc = v.is_fc, is_pfc = v.is_pfc
+                FROM (VALUES %s) AS v(id, is_fc, is_pfc)
+                WHERE sh.user_id = {int(user_id)} AND sh.id = v.id
+            """, diff)
+            bump_state_version(cur, user_id)
+            conn.commit()
+
+        checked += len(rows)
+        changed += len(diff)
+        last_id = ids[-1]
+
+    archive_checked, archive_changed = reclassify_archive(cur, user_id, dry_run)
+    if (changed or archive_changed) and not dry_run:
+        rebuild_aggregates(cur, user_id)
+    conn.commit()
+    cur.close()
+    return checked + archive_checked, changed + archive_changed
+
+def cmd_reclassify(args):
+    conn = psycopg2.connect(DATABASE_URL)
+    cur = conn.cursor()
+    user_ids = get_user_ids(cur, args.user)
+    cur.close()
+
+    print(f"🔧 Reclassifying scores for {len(user_ids)} user(s){' (dry run)' if args.dry_run else ''}...")
+    total_checked = 0
+    total_changed = 0
+    for user_id in user_ids:
+        checked, changed = reclassify_user(conn, user_id, args.chunk_size, args.dry_run)
+        total_checked += checked
+        total_changed += changed
+        if changed:
+            print(f"  ✓ user {user_id}: {changed} / {checked} rows changed")
+
+    conn.close()
+    print(f"✅ Reclassification complete: {total_changed} of {total_checked} rows changed.")
+
+def cmd_backfill_beatmaps(args):
+    """Fills the beatmaps table for every played beatmap that is unknown or missing max_combo."""
+    conn = psycopg2.connect(DATABASE_URL)
+    cur = conn.cursor()
+    cur.execute("""
+        SELECT DISTINCT sh.beatmap_id
+        FROM score_history sh
+        LEFT JOIN beatmaps b ON b.beatmap_id = sh.beatmap_id
+        WHERE sh.beatmap_id IS NOT NULL AND sh.beatmap_id > 0
+          AND (b.beatmap_id IS NULL OR b.max_combo IS NULL OR b.version IS NULL)
+    """)
+    beatmap_ids = [r[0] for r in cur.fetchall()]
+    print(f"🔧 Backfilling {len(beatmap_ids)} beatmap(s) from the osu! API...")
+
+    token = get_client_token()
+    filled = 0
+    for i in range(0, len(beatmap_ids), BEATMAP_LOOKUP_BATCH):
+        batch = beatmap_ids[i:i + BEATMAP_LOOKUP_BATCH]
+        rows = [beatmap_from_api(b) for b in lookup_beatmaps(batch, token)]
+        upsert_beatmaps(cur, rows)
+        conn.commit()
+        filled += len(rows)
+
+    cur.close()
+    conn.close()
+    print(f"✅ Beatmap backfill complete: {filled} of {len(beatmap_ids)} found.")
+
+def backfill_star_ratings_user(conn, user_id, token, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Replaces nomod star ratings with mod-adjusted ones for a user's rows that predate
+    stars_adjusted (hot and archived), recomputing effective_stars to match, then rebuilds
+    the user's aggregates if anything changed. Returns (rows_checked, rows_updated).
+    """
+    cur = conn.cursor()
+    last_id = 0
+    checked = 0
+    updated = 0
+
+    while True:
+        cur.execute("""
+            SELECT sh.id, sh.beatmap_id, sh.mod_bits, sh.stars, sh.accuracy, sh.max_combo,
+                   COALESCE(b.max_combo, sh.map_max_combo)
+            FROM score_history sh
+            LEFT JOIN beatmaps b ON b.beatmap_id = sh.beatmap_id
+            WHERE sh.user_id = %s AND sh.id > %s AND sh.stars_adjusted IS NOT TRUE
+            ORDER BY sh.id
+            LIMIT %s
+        """, (user_id, last_id, chunk_size))
+        rows = cur.fetchall()
+        if not rows: break
+
+        ids, beatmap_ids, mod_bits, stars, accs, max_combos, map_max_combos = zip(*rows)
+        diff_mods = [difficulty_mod_bitmask(bitmask_to_mods(b)) for b in mod_bits]
+        keys = {(b, m) for b, m in zip(beatmap_ids, diff_mods) if b and m}
+        attributes = get_difficulty_attributes(cur, keys, token)
+
+        new_stars = np.array(stars, dtype=np.float64)
+        resolved = np.zeros(len(rows), dtype=bool)
+        for i, key in enumerate(zip(beatmap_ids, diff_mods)):
+            if key[1] == 0:
+                resolved[i] = True
+            elif key in attributes:
+                new_stars[i] = attributes[key]['star_rating']
+                resolved[i] = True
+
+        new_eff = effective_stars_batch(new_stars, accs, max_combos, map_max_combos)
+        values = [(ids[i], float(new_stars[i]), float(new_eff[i])) for i in np.flatnonzero(resolved)]
+        if values:
+            execute_values(cur, f"""
+                UPDATE score_history AS sh
+                SET stars = v.stars, effective_stars = v.effective_stars, stars_adjusted = TRUE
+                FROM (VALUES %s) AS v(id, stars, effective_stars)
+                WHERE sh.user_id = {int(user_id)} AND sh.id = v.id
+            """, values)
+            bump_state_version(cur, user_id)
+        conn.commit()
+
+        checked += len(rows)
+        updated += len(values)
+        last_id = ids[-1]
+
+    archive_checked, archive_updated = adjust_archived_stars(cur, user_id, lambda keys: get_difficulty_attributes(cur, keys, token))
+    checked += archive_checked
+    updated += archive_updated
+    if updated:
+        rebuild_aggregates(cur, user_id)
+    conn.commit()
+    cur.close()
+    return checked, updated
+
+def cmd_backfill_star_ratings(args):
+    conn = psycopg2.connect(DATABASE_URL)
+    cur = conn.cursor()
+    user_ids = get_user_ids(cur, args.user)
+    cur.close()
+
+    print(f"🔧 Backfilling mod-adjusted star ratings for {len(user_ids)} user(s)...")
+    token = get_client_token()
+    total_checked = 0
+    total_updated = 0
+    for user_id in user_ids:
+        checked, updated = backfill_star_ratings_user(conn, user_id, token, args.chunk_size)
+        total_checked += checked
+        total_updated += updated
+        if checked:
+            print(f"  ✓ user {user_id}: {updated} / {checked} rows adjusted")
+
+    conn.close()
+    print(f"✅ Star rating backfill complete: {total_updated} of {total_checked} rows adjusted.")
+    if total_updated < total_checked:
+        print("ℹ️  Some lookups failed; re-run the command to retry them.")
+
+def cmd_rebuild_rollups(args):
+    conn = psycopg2.connect(DATABASE_URL)
+    cur = conn.cursor()
+    user_ids = get_user_ids(cur, args.user)
+
+    print(f"🔧 Rebuilding analytics rollups, performance aggregates, quantile sketches and archived FC counts for {len(user_ids)} user(s)...")
+    for user_id in user_ids:
+        rebuild_aggregates(cur, user_id)
+        conn.commit()
+
+    cur.close()
+    conn.close()
+    print("✅ Rollups rebuilt.")
+
+def cmd_archive_scores(args):
+    conn = psycopg2.connect(DATABASE_URL)
+    cur = conn.cursor()
+    user_ids = get_user_ids(cur, args.user)
+    before = archive_cutoff(args.older_than_days)
+
+    print(f"🔧 Archiving scores played before {before} for {len(user_ids)} user(s)...")
+    total = 0
+    for user_id in user_ids:
+        archived = archive_user(cur, user_id, before, dry_run=args.dry_run)
+        if archived and not args.dry_run:
+            # Archived rows can drop out of the cached dashboard feed
+            bump_state_version(cur, user_id)
+        conn.commit()
+        total += archived
+        if archived:
+            print(f"  ✓ user {user_id}: {archived} rows {'would be ' if args.dry_run else ''}archived")
+
+    cur.close()
+    conn.close()
+    print(f"✅ Archival complete: {total} rows {'would be ' if args.dry_run else ''}archived.")
+
+def cmd_refresh_leaderboards(args):
+    conn = psycopg2.connect(DATABASE_URL)
+    cur = conn.cursor()
+    print("🔧 Refreshing leaderboard snapshots...")
+    if refresh_leaderboards(cur):
+        conn.commit()
+        print("✅ Leaderboards refreshed.")
+    else:
+        conn.rollback()
+        print("⚠️  Another refresh is already running, skipped.")
+    cur.close()
+    conn.close()
+
+def cmd_refresh_beatmap_search(args):
+    conn = psycopg2.connect(DATABASE_URL)
+    cur = conn.cursor()
+    print("🔧 Refreshing beatmap search (indexes + play counts)...")
+    trigram = create_search_indexes(cur)
+    changed = refresh_play_counts(cur)
+    conn.commit()
+    cur.close()
+    conn.close()
+    print(f"✅ Beatmap search refreshed: {changed} play count(s) updated, {'trigram' if trigram else 'title prefix'} matching.")
+
+def cmd_compact_challenges(args):
+    conn = psycopg2.connect(DATABASE_URL)
+    cur = conn.cursor()
+    print("🔧 Compacting group challenge deltas...")
+    folded = compact_challenges(cur)
+    if folded is None:
+        conn.rollback()
+        print("⚠️  Another compaction is already running, skipped.")
+    else:
+        conn.commit()
+        print(f"✅ Challenges compacted: {folded} delta row(s) folded.")
+    cur.close()
+    conn.close()
+
+def cmd_refresh_tokens(args):
+    try:
+        check_token_key()
+    except RuntimeError as e:
+        print(f"❌ ERROR: {e}")
+        return
+    print(f"🔧 Refreshing osu! tokens expiring within {args.within_minutes} minutes...")
+    refreshed, failed = refresh_expiring_tokens(lambda: psycopg2.connect(DATABASE_URL), args.within_minutes * 60, limit=None)
+    print(f"✅ Tokens refreshed: {refreshed}, failed: {failed}.")
+    if failed:
+        print("ℹ️  See oauth_tokens.last_error; revoked tokens need the user to log in again.")
+
+def cmd_reconcile_goals(args):
+    conn = psycopg2.connect(DATABASE_URL)
+    cur = conn.cursor()
+    user_ids = get_user_ids(cur, args.user)
+
+    print(f"🔧 Reconciling goal progress for {len(user_ids)} user(s){' (dry run)' if args.dry_run else ''}...")
+    if not args.dry_run:
+        pruned = prune_reconcile_log(cur)
+        conn.commit()
+        if pruned:
+            print(f"  ✓ pruned {pruned} old log row(s)")
+
+    total_checked = 0
+    total_skipped = 0
+    total_changed = 0
+    total_untracked = 0
+    for start in range(0, len(user_ids), args.batch_size):
+        checked, skipped, changes, untracked = reconcile_users(
+            cur, user_ids[start:start + args.batch_size], args.dry_run, args.include_completed
+        )
+        if args.dry_run:
+            conn.rollback()
+        else:
+            conn.commit()
+        total_checked += checked
+        total_skipped += skipped
+        total_changed += len(changes)
+        total_untracked += len(untracked)
+        for goal_id, user_id, old_progress, new_progress, old_completed, new_completed in changes:
+            completion = f", completed {old_completed} -> {new_completed}" if old_completed != new_completed else ""
+            print(f"  ✓ user {user_id} goal {goal_id}: {old_progress} -> {new_progress}{completion}")
+        for goal_id, user_id, old_progress, new_progress, _, _ in untracked:
+            print(f"  ⚠️  user {user_id} goal {goal_id}: has no contributions, recount {new_progress} < {old_progress} (left as is)")
+
+    cur.close()
+    conn.close()
+    print(f"✅ Reconciliation complete: {total_changed} of {total_checked} goals {'would be ' if args.dry_run else ''}fixed.")
+    if total_untracked:
+        print(f"ℹ️  {total_untracked} goal(s) have progress from before goal_contributions existed and were not lowered.")
+    if total_skipped:
+        print(f"ℹ️  {total_skipped} user(s) were syncing and were skipped; the next run picks them up.")
+
+WHATIF_COLUMNS = ['group', 'formula', 'weight', 'users', 'mean', 'p50', 'p90', 'max', 'spearman', 'rank_shift', 'top10_kept']
+
+def cmd_what_if(args):
+    try:
+        formulas = [parse_formula(spec) for spec in (args.formula or FORMULAS)]
+    except (ValueError, SyntaxError) as e:
+        print(f"❌ {e}")
+        return
+    # The live formula and weight come first: they are the baseline every candidate is compared to
+    if LIVE_FORMULA not in [name for name, _ in formulas]:
+        formulas.insert(0, parse_formula(LIVE_FORMULA))
+    weights = list(dict.fromkeys(args.weight or DEFAULT_WEIGHTS))
+    baseline = ([name for name, _ in formulas].index(LIVE_FORMULA), weights.index(args.weight[0] if args.weight else DEFAULT_WEIGHTS[0]))
+
+    conn = psycopg2.connect(DATABASE_URL)
+    cur = conn.cursor()
+    user_ids = None
+    if args.user is not None:
+        user_ids = [args.user]
+    elif args.sample:
+        user_ids = get_user_ids(cur)
+        user_ids = random.Random(args.seed).sample(user_ids, min(args.sample, len(user_ids)))
+
+    started = time.time()
+    print(f"🔧 Loading history for {'all users' if user_ids is None else f'{len(user_ids)} user(s)'}...")
+    history = load_history(conn, user_ids)
+    loaded = time.time()
+    result = replay(history, formulas, weights)
+    replayed = time.time()
+    print(f"✓ {len(history)} plays of {len(result.users)} user(s) loaded in {loaded - started:.1f}s, "
+          f"{len(formulas)} formula(s) × {len(weights)} weight(s) replayed in {replayed - loaded:.2f}s")
+
+    mean_drift, max_drift = stored_drift(result, load_stored_ratings(cur, result.users), baseline)
+    print(f"✓ Live replay vs user_mastery: mean |Δ| {mean_drift:.4f}, max |Δ| {max_drift:.4f} "
+          "(plays missing from history, e.g. deleted or pre-history, show up here)")
+    cur.close()
+    conn.close()
+
+    rows = compare(result, baseline)
+    if args.group:
+        rows = [r for r in rows if r['group'] == args.group]
+    if args.user is not None:
+        # One user: their ratings per candidate instead of distributions
+        print(format_table([{**r, 'plays': int(result.plays[0, MASTERY_GROUPS.index(r['group'])]), 'rating': r['mean']} for r in rows],
+                           ['group', 'formula', 'weight', 'plays', 'rating']))
+    else:
+        print(format_table(rows, WHATIF_COLUMNS))
+    if args.csv:
+        with open(args.csv, 'w', newline='') as f:
+            writer = csv.DictWriter(f, fieldnames=WHATIF_COLUMNS)
+            writer.writeheader()
+            writer.writerows({c: r[c] for c in WHATIF_COLUMNS} for r in rows)
+        print(f"✓ Wrote {len(rows)} row(s) to {args.csv}")
+    print("✅ What-if replay complete (nothing was written to the database).")
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="osu! tracker maintenance jobs")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("reclassify", help="Re-apply the FC/PFC rules to stored scores")
+    target = p.add_mutually_exclusive_group(required=True)
+    target.add_argument("--user", type=int, help="Only reclassify this osu! user id")
+    target.add_argument("--all", action="store_true", help="Reclassify every user")
+    p.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE)
+    p.add_argument("--dry-run", action="store_true", help="Count changes without writing them")
+    p.set_defaults(func=cmd_reclassify)
+
+    p = sub.add_parser("backfill-star-ratings", help="Replace nomod star ratings on old rows with mod-adjusted ones")
+    target = p.add_mutually_exclusive_group(required=True)
+    target.add_argument("--user", type=int, help="Only backfill this osu! user id")
+    target.add_argument("--all", action="store_true", help="Backfill every user")
+    p.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE)
+    p.set_defaults(func=cmd_backfill_star_ratings)
+
+    p = sub.add_parser("rebuild-rollups", help="Recompute analytics rollups, recommendation aggregates, quantile sketches and archived FC counts")
+    target = p.add_mutually_exclusive_group(required=True)
+    target.add_argument("--user", type=int, help="Only rebuild this osu! user id")
+    target.add_argument("--all", action="store_true", help="Rebuild every user")
+    p.set_defaults(func=cmd_rebuild_rollups)
+
+    p = sub.add_parser("archive-scores", help="Move old score_history rows into the compressed score_archive")
+    target = p.add_mutually_exclusive_group(required=True)
+    target.add_argument("--user", type=int, help="Only archive this osu! user id")
+    target.add_argument("--all", action="store_true", help="Archive every user")
+    p.add_argument("--older-than-days", type=int, default=ARCHIVE_AFTER_DAYS, help="Archive whole months older than this")
+    p.add_argument("--dry-run", action="store_true", help="Count rows without moving them")
+    p.set_defaults(func=cmd_archive_scores)
+
+    p = sub.add_parser("refresh-leaderboards", help="Rebuild the leaderboard ranking snapshot (e.g. from cron)")
+    p.set_defaults(func=cmd_refresh_leaderboards)
+
+    p = sub.add_parser("refresh-beatmap-search", help="Recount beatmap plays for search ranking (e.g. daily from cron)")
+    p.set_defaults(func=cmd_refresh_beatmap_search)
+
+    p = sub.add_parser("compact-challenges", help="Fold pending group challenge deltas into the totals (e.g. from cron)")
+    p.set_defaults(func=cmd_compact_challenges)
+
+    p = sub.add_parser("refresh-tokens", help="Refresh users' osu! tokens before they expire (e.g. every 15 minutes from cron)")
+    p.add_argument("--within-minutes", type=int, default=PROACTIVE_REFRESH_SECONDS // 60, help="Refresh tokens expiring within this")
+    p.set_defaults(func=cmd_refresh_tokens)
+
+    p = sub.add_parser("reconcile-goals", help="Recompute custom goal progress from goal_contributions and fix drifted goals (e.g. nightly from cron)")
+    target = p.add_mutually_exclusive_group(required=True)
+    target.add_argument("--user", type=int, help="Only reconcile this osu! user id")
+    target.add_argument("--all", action="store_true", help="Reconcile every user")
+    p.add_argument("--batch-size", type=int, default=RECONCILE_BATCH_USERS, help="Users per grouped query and transaction")
+    p.add_argument("--dry-run", action="store_true", help="List the changes without writing them")
+    p.add_argument("--include-completed", action="store_true", help="Also recount completed goals (may un-complete them)")
+    p.set_defaults(func=cmd_reconcile_goals)
+
+    p = sub.add_parser("what-if", help="Replay stored plays under candidate effective-star formulas and mastery EMA weights (read-only)")
+    target = p.add_mutually_exclusive_group(required=True)
+    target.add_argument("--user", type=int, help="Only replay this osu! user id")
+    target.add_argument("--sample", type=int, help="Replay a random sample of this many users")
+    target.add_argument("--all", action="store_true", help="Replay every user")
+    p.add_argument("--seed", type=int, default=0, help="Seed for --sample")
+    p.add_argument("--formula", action="append",
+                   help=f"Repeatable. One of {', '.join(FORMULAS)}, or name=expression over "
+                        "stars, acc, combo_ratio, max_combo, map_max_combo, misses, length, is_fc and np.<function> "
+                        f"({', '.join(FORMULA_NP_FUNCTIONS)}) "
+                        "(default: all built-ins; 'live' is always the baseline)")
+    p.add_argument("--weight", type=float, action="append",
+                   help=f"Repeatable. EMA weight of a new play (default: {', '.join(map(str, DEFAULT_WEIGHTS))}; the first one is the baseline)")
+    p.add_argument("--group", choices=MASTERY_GROUPS, help="Only show this mod group")
+    p.add_argument("--csv", help="Also write the comparison table to this CSV file")
+    p.set_defaults(func=cmd_what_if)
+
+    p = sub.add_parser("backfill-beatmaps", help="Fetch metadata for played beatmaps missing from the beatmaps table")
+    p.set_defaults(func=cmd_backfill_beatmaps)
+
+    return parser
+
+if __name__ == "__main__":
+    if not DATABASE_URL:
+        print("❌ ERROR: DATABASE_URL not found in environment variables. Please check your .env file.")
+    else:
+        args = build_parser().parse_args()
+        args.func(args)
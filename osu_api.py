@@ -0,0 +1,125 @@
+# osu_api.py
+
+# Thin helpers around the osu! API v2 endpoints the app uses.
+import os
+import time
+import threading
+import requests
+
+# Point OSU_BASE_URL at osu_emulator.py (e.g. http://localhost:5055) for local load tests
+OSU_BASE_URL = os.environ.get("OSU_BASE_URL", "https://osu.ppy.sh").rstrip('/')
+OSU_API_URL = f"{OSU_BASE_URL}/api/v2"
+OSU_TOKEN_URL = f"{OSU_BASE_URL}/oauth/token"
+OSU_AUTHORIZE_URL = f"{OSU_BASE_URL}/oauth/authorize"
+
+# GET /beatmaps accepts at most 50 ids per request
+BEATMAP_LOOKUP_BATCH = 50
+
+_client_token = {"access_token": None, "expires_at": 0}
+_client_token_lock = threading.Lock()
+
+# Rate-limit state from the latest osu! responses this process saw (poll_schedule.py)
+RATE_LIMIT_STALE_SECONDS = 60
+_rate_limit = {"limit": None, "remaining": None, "seen_at": 0.0, "retry_until": 0.0}
+
+def track_rate_limit(response):
+    """Remembers X-RateLimit-* headers and a 429's Retry-After. Returns the response."""
+    headers = getattr(response, 'headers', None) or {}
+    try:
+        if headers.get('X-RateLimit-Limit') is not None and headers.get('X-RateLimit-Remaining') is not None:
+            _rate_limit["limit"] = int(headers['X-RateLimit-Limit'])
+            _rate_limit["remaining"] = int(headers['X-RateLimit-Remaining'])
+            _rate_limit["seen_at"] = time.time()
+        if response.status_code == 429:
+            _rate_limit["retry_until"] = time.time() + int(headers.get('Retry-After') or 60)
+    except (TypeError, ValueError):
+        pass
+    return response
+
+def rate_limit_headroom():
+    """Share of the osu! rate limit left (0..1), 0 while a 429's Retry-After runs, None if unknown."""
+    now = time.time()
+    if now < _rate_limit["retry_until"]:
+        return 0.0
+    if not _rate_limit["limit"] or now - _rate_limit["seen_at"] > RATE_LIMIT_STALE_SECONDS:
+        return None
+    return max(_rate_limit["remaining"], 0) / _rate_limit["limit"]
+
+def rate_limit_retry_after():
+    """Seconds left of the last 429's Retry-After (0 if none)."""
+    return max(0, int(_rate_limit["retry_until"] - time.time() + 0.999))
+
+def get_client_token():
+    """
+    Returns an app-level (client credentials) token for public endpoints.
+    Used by offline jobs that have no user session. Cached until shortly before expiry.
+    """
+    with _client_token_lock:
+        if _client_token["access_token"] and time.time() < _client_token["expires_at"] - 60:
+            return _client_token["access_token"]
+
+        data = {
+            'client_id': os.environ.get("OSU_CLIENT_ID"),
+            'client_secret': os.environ.get("OSU_CLIENT_SECRET"),
+            'grant_type': 'client_credentials',
+            'scope': 'public'
+        }
+        response = requests.post(OSU_TOKEN_URL, data=data, timeout=10)
+        response.raise_for_status()
+        tokens = response.json()
+        _client_token["access_token"] = tokens['access_token']
+        _client_token["expires_at"] = time.time() + tokens.get('expires_in', 3600)
+        return _client_token["access_token"]
+
+def get_me(token):
+    """GET /me/osu for the token's user. Returns the raw response (callers check status_code)."""
+    headers = {'Authorization': f'Bearer {token}'}
+    return track_rate_limit(requests.get(f'{OSU_API_URL}/me/osu', headers=headers, timeout=10))
+
+def get_recent_scores(user_id, token, limit=20):
+    """GET /users/{id}/scores/recent (passes only, newest first). Returns the raw response."""
+    headers = {'Authorization': f'Bearer {token}'}
+    return track_rate_limit(requests.get(f'{OSU_API_URL}/users/{user_id}/scores/recent',
+                                         params={'include_fails': 0, 'limit': limit}, headers=headers, timeout=10))
+
+def exchange_code(code, client_id, client_secret, redirect_uri):
+    """Trades an OAuth authorization code for the user's tokens (the JSON body)."""
+    data = {'client_id': client_id, 'client_secret': client_secret, 'code': code,
+            'grant_type': 'authorization_code', 'redirect_uri': redirect_uri}
+    return requests.post(OSU_TOKEN_URL, data=data, timeout=10).json()
+
+def refresh_access_token(refresh_token):
+    """Trades a refresh token for new user tokens. Returns the raw response (osu! rotates the refresh token)."""
+    data = {'client_id': os.environ.get("OSU_CLIENT_ID"), 'client_secret': os.environ.get("OSU_CLIENT_SECRET"),
+            'grant_type': 'refresh_token', 'refresh_token': refresh_token}
+    return requests.post(OSU_TOKEN_URL, data=data, timeout=10)
+
+def lookup_beatmaps(beatmap_ids, token):
+    """
+    Fetches full beatmap objects (including beatmapset and max_combo) for the given ids,
+    BEATMAP_LOOKUP_BATCH ids per request. Missing/deleted maps are simply absent.
+    """
+    headers = {'Authorization': f'Bearer {token}'}
+    ids = list(beatmap_ids)
+    results = []
+    for i in range(0, len(ids), BEATMAP_LOOKUP_BATCH):
+        batch = ids[i:i + BEATMAP_LOOKUP_BATCH]
+        response = track_rate_limit(requests.get(f'{OSU_API_URL}/beatmaps', params={'ids[]': batch}, headers=headers, timeout=10))
+        if response.status_code != 200:
+            print(f"Beatmap lookup failed ({response.status_code}) for {len(batch)} ids")
+            continue
+        results.extend(response.json().get('beatmaps', []))
+    return results
+
+def get_beatmap_attributes(beatmap_id, mods, token):
+    """
+    Returns the difficulty attributes (star_rating, max_combo, ...) of a beatmap under
+    a mod bitmask, or None if the lookup failed.
+    """
+    headers = {'Authorization': f'Bearer {token}'}
+    response = track_rate_limit(requests.post(f'{OSU_API_URL}/beatmaps/{beatmap_id}/attributes',
+                                              json={'mods': mods, 'ruleset': 'osu'}, headers=headers, timeout=10))
+    if response.status_code != 200:
+        print(f"Attribute lookup failed ({response.status_code}) for beatmap {beatmap_id} mods {mods}")
+        return None
+    return response.json().get('attributes')
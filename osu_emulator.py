@@ -0,0 +1,380 @@
+# osu_emulator.py
+
+# Local stand-in for the osu! API endpoints the app uses, for development and load
+# tests without touching osu.ppy.sh. Every user gets a deterministic player profile
+# (skill, accuracy, favourite mods) and plays maps from a generated beatmap pool at a
+# configurable rate, so /scores/recent behaves like a real, growing score stream.
+#
+#   python osu_emulator.py --port 5055 --latency-ms 80 --error-rate 0.01 --rate-limit-rate 0.02
+#   OSU_BASE_URL=http://localhost:5055 python app.py
+#
+# Log in through the emulator by visiting /callback?code=<user id> on the app (or use
+# the normal /login flow, which picks a random user). GET /_emulator/stats returns
+# per-endpoint and per-user call counts, which loadtest.py uses.
+import time
+import random
+import hashlib
+import argparse
+import threading
+from datetime import datetime, timezone
+from flask import Flask, request, jsonify, redirect
+
+app = Flask(__name__)
+
+CONFIG = {
+    'latency_ms': 0,           # added to every response
+    'jitter_ms': 0,            # uniform extra latency
+    'error_rate': 0.0,         # fraction of requests answered with a 5xx
+    'rate_limit_rate': 0.0,    # fraction of requests answered with a 429
+    'retry_after': 5,          # Retry-After seconds sent with 429s
+    'rate_limit_per_minute': 1200,  # X-RateLimit-Limit; X-RateLimit-Remaining counts down per minute
+    'plays_per_minute': 2.0,   # average play rate per user
+    'token_ttl_seconds': 86400,  # user access tokens are rejected with 401 after this
+    'beatmap_count': 2000,
+    'seed': 727,
+}
+
+# Legacy mod bitmask values (same as scoring.MOD_BITS) for the attributes endpoint
+MOD_BITS = {'EZ': 2, 'HD': 8, 'HR': 16, 'DT': 64, 'HT': 256, 'NC': 512, 'FL': 1024}
+# Mod combinations players pick from, with weights
+MOD_CHOICES = [([], 45), (['HD'], 22), (['HD', 'HR'], 8), (['HR'], 5), (['DT'], 8), (['HD', 'DT'], 7), (['HD', 'NC'], 2), (['FL', 'HD'], 1), (['EZ'], 1), (['HT'], 1)]
+_lock = threading.Lock()
+_stats = {'started_at': time.time(), 'endpoints': {}, 'users': {}, 'errors': 0, 'rate_limited': 0}
+_minute_calls = {'minute': 0, 'calls': 0}
+_players = {}
+_beatmaps = []
+_next_score_id = [1_000_000_000]
+
+# --- GENERATED DATA ---
+
+def build_beatmap_pool(count, seed):
+    rng = random.Random(seed)
+    pool = []
+    for i in range(count):
+        beatmap_id = 100_000 + i
+        stars = round(min(max(rng.lognormvariate(1.55, 0.3), 1.0), 11.0), 2)
+        length = int(min(max(rng.gauss(150, 60), 30), 600))
+        bpm = round(rng.uniform(120, 240))
+        pool.append({
+            'id': beatmap_id,
+            'beatmapset_id': 50_000 + i // 4,
+            'difficulty_rating': stars,
+            'total_length': length,
+            'max_combo': int(length * bpm / 60 * rng.uniform(0.8, 1.6)),
+            'version': rng.choice(['Normal', 'Hard', 'Insane', 'Extra', 'Expert']),
+            'bpm': bpm,
+            'ar': round(min(4 + stars * 0.9, 10), 1),
+            'accuracy': round(min(4 + stars * 0.8, 10), 1),
+            'cs': round(rng.uniform(3, 5), 1),
+            'drain': round(rng.uniform(3, 7), 1),
+            'mode': 'osu',
+            'title': f"Song {50_000 + i // 4}",
+            'artist': f"Artist {(i // 4) % 300}",
+        })
+    return pool
+
+def beatmap_payload(beatmap):
+    fields = {k: v for k, v in beatmap.items() if k not in ('title', 'artist')}
+    beatmapset = {'id': beatmap['beatmapset_id'], 'title': beatmap['title'], 'artist': beatmap['artist'], 'creator': 'emulator'}
+    return fields, beatmapset
+
+def get_player(user_id):
+    """Deterministic per-user profile; its score stream starts the first time the user is seen."""
+    with _lock:
+        player = _players.get(user_id)
+        if player:
+            return player
+        rng = random.Random(int(hashlib.sha256(str(user_id).encode()).hexdigest()[:8], 16))
+        player = {
+            'user_id': user_id,
+            'username': f"player{user_id}",
+            'global_rank': rng.randint(1, 2_000_000),
+            'skill': rng.uniform(2.5, 7.5),
+            'acc': rng.uniform(0.9, 0.99),
+            'rng': rng,
+            'lock': threading.Lock(),
+            'scores': [],
+            'last_play_at': time.time() - 3600,
+        }
+        _players[user_id] = player
+        return player
+
+def _mod_multiplier(mods):
+    multiplier = 1.0
+    if 'DT' in mods or 'NC' in mods: multiplier *= 1.4
+    if 'HT' in mods: multiplier *= 0.75
+    if 'HR' in mods: multiplier *= 1.08
+    if 'EZ' in mods: multiplier *= 0.8
+    if 'FL' in mods: multiplier *= 1.05
+    return multiplier
+
+def generate_play(player, played_at):
+    rng = player['rng']
+    mods = rng.choices([m for m, _ in MOD_CHOICES], weights=[w for _, w in MOD_CHOICES])[0]
+    # Pick a map around the player's skill once mods are applied
+    target = rng.gauss(player['skill'], 0.8) / _mod_multiplier(mods)
+    candidates = rng.sample(_beatmaps, 40)
+    beatmap = min(candidates, key=lambda b: abs(b['difficulty_rating'] - target))
+    stars = beatmap['difficulty_rating'] * _mod_multiplier(mods)
+
+    pressure = max(stars - player['skill'], -2)
+    misses = max(0, int(rng.expovariate(1 / max(0.3, 2 + pressure * 3))) - 1)
+    acc = min(1.0, max(0.6, rng.gauss(player['acc'] - pressure * 0.02 - misses * 0.002, 0.015)))
+    max_combo = beatmap['max_combo'] if misses == 0 and rng.random() < 0.85 else int(beatmap['max_combo'] * rng.uniform(0.1, 0.9))
+
+    if acc == 1.0 and misses == 0:
+        rank = 'XH' if 'HD' in mods or 'FL' in mods else 'X'
+    elif acc > 0.95 and misses == 0:
+        rank = 'SH' if 'HD' in mods or 'FL' in mods else 'S'
+    elif acc > 0.9:
+        rank = 'A'
+    elif acc > 0.8:
+        rank = 'B'
+    else:
+        rank = 'C'
+
+    objects = beatmap['max_combo'] // 2
+    count_100 = int(objects * (1 - acc) * 2)
+    with _lock:
+        _next_score_id[0] += 1
+        score_id = _next_score_id[0]
+
+    beatmap_fields, beatmapset = beatmap_payload(beatmap)
+    return {
+        'id': score_id,
+        'user_id': player['user_id'],
+        'accuracy': round(acc, 4),
+        'mods': mods,
+        'rank': rank,
+        'max_combo': max_combo,
+        'passed': True,
+        'created_at': datetime.fromtimestamp(played_at, timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ'),
+        'statistics': {'count_300': max(objects - count_100 - misses, 0), 'count_100': count_100, 'count_50': 0, 'miss_count': misses},
+        'beatmap': beatmap_fields,
+        'beatmapset': beatmapset,
+    }
+
+def advance_player(player, now):
+    """Generates the plays this user 'made' since the last request (Poisson arrivals)."""
+    rate = CONFIG['plays_per_minute'] / 60
+    if rate <= 0:
+        return
+    with player['lock']:
+        t = player['last_play_at']
+        while True:
+            t += player['rng'].expovariate(rate)
+            if t > now:
+                break
+            player['scores'].append(generate_play(player, t))
+            player['last_play_at'] = t
+        del player['scores'][:-100]  # osu! only keeps recent plays around
+
+# --- FAILURE INJECTION & STATS ---
+
+@app.before_request
+def simulate_network():
+    if not _beatmaps:
+        init_beatmaps()
+    endpoint = request.url_rule.rule if request.url_rule else request.path
+    if endpoint.startswith('/_emulator'):
+        return None
+    user_id = user_from_token()
+    with _lock:
+        _stats['endpoints'][endpoint] = _stats['endpoints'].get(endpoint, 0) + 1
+        if user_id is not None:
+            _stats['users'][user_id] = _stats['users'].get(user_id, 0) + 1
+
+    delay = CONFIG['latency_ms'] + random.uniform(0, CONFIG['jitter_ms'])
+    if delay:
+        time.sleep(delay / 1000)
+
+    roll = random.random()
+    if roll < CONFIG['rate_limit_rate']:
+        with _lock:
+            _stats['rate_limited'] += 1
+        response = jsonify({'error': 'Too Many Attempts.'})
+        response.status_code = 429
+        response.headers['Retry-After'] = str(CONFIG['retry_after'])
+        return response
+    if roll < CONFIG['rate_limit_rate'] + CONFIG['error_rate']:
+        with _lock:
+            _stats['errors'] += 1
+        return jsonify({'error': 'Internal Server Error'}), random.choice([500, 502, 503])
+    if token_expired():
+        return jsonify({'authentication': 'basic'}), 401
+    return None
+
+@app.after_request
+def rate_limit_headers(response):
+    if request.path.startswith('/api/'):
+        minute = int(time.time() // 60)
+        with _lock:
+            if _minute_calls['minute'] != minute:
+                _minute_calls.update(minute=minute, calls=0)
+            _minute_calls['calls'] += 1
+            remaining = max(CONFIG['rate_limit_per_minute'] - _minute_calls['calls'], 0)
+        response.headers['X-RateLimit-Limit'] = str(CONFIG['rate_limit_per_minute'])
+        response.headers['X-RateLimit-Remaining'] = str(remaining)
+    return response
+
+def user_from_token():
+    header = request.headers.get('Authorization', '')
+    token = header.split(' ', 1)[1] if ' ' in header else ''
+    if token.startswith('emu-user-'):
+        try:
+            return int(token.split('-')[2])
+        except (IndexError, ValueError):
+            return None
+    return None
+
+def token_expired():
+    """True for a user access token older than token_ttl_seconds (tokens carry their issue time)."""
+    header = request.headers.get('Authorization', '')
+    token = header.split(' ', 1)[1] if ' ' in header else ''
+    if not token.startswith('emu-user-'):
+        return False
+    try:
+        return time.time() - int(token.rsplit('-', 1)[1]) > CONFIG['token_ttl_seconds']
+    except ValueError:
+        return False
+
+def issue_tokens(user_id):
+    subject = f"user-{user_id}" if user_id is not None else "client"
+    return {
+        'token_type': 'Bearer',
+        'access_token': f"emu-{subject}-{int(time.time())}",
+        'refresh_token': f"emu-refresh-{subject}",
+        'expires_in': CONFIG['token_ttl_seconds'],
+    }
+
+# --- ENDPOINTS ---
+
+@app.route('/oauth/authorize')
+def authorize():
+    # No login page: every authorization picks a user (or ?user_id=...) and redirects straight back
+    user_id = request.args.get('user_id') or random.randint(1, 10_000_000)
+    return redirect(f"{request.args.get('redirect_uri')}?code={user_id}")
+
+@app.route('/oauth/token', methods=['POST'])
+def token():
+    grant_type = request.form.get('grant_type')
+    if grant_type == 'authorization_code':
+        try:
+            return jsonify(issue_tokens(int(request.form.get('code'))))
+        except (TypeError, ValueError):
+            return jsonify({'error': 'invalid_grant'}), 400
+    if grant_type == 'refresh_token':
+        refresh = request.form.get('refresh_token', '')
+        if refresh.startswith('emu-refresh-user-'):
+            return jsonify(issue_tokens(int(refresh.rsplit('-', 1)[1])))
+        return jsonify({'error': 'invalid_grant'}), 400
+    if grant_type == 'client_credentials':
+        return jsonify(issue_tokens(None))
+    return jsonify({'error': 'unsupported_grant_type'}), 400
+
+@app.route('/api/v2/me/osu')
+@app.route('/api/v2/me/')
+@app.route('/api/v2/me')
+def me():
+    user_id = user_from_token()
+    if user_id is None:
+        return jsonify({'authentication': 'basic'}), 401
+    player = get_player(user_id)
+    return jsonify({
+        'id': user_id,
+        'username': player['username'],
+        'avatar_url': f"https://a.ppy.sh/{user_id}",
+        'statistics': {'global_rank': player['global_rank'], 'pp': round(player['skill'] * 900)},
+    })
+
+@app.route('/api/v2/users/<int:user_id>/scores/recent')
+def recent_scores(user_id):
+    if not request.headers.get('Authorization'):
+        return jsonify({'authentication': 'basic'}), 401
+    player = get_player(user_id)
+    advance_player(player, time.time())
+    limit = min(request.args.get('limit', 100, type=int), 100)
+    include_fails = request.args.get('include_fails', '0') == '1'
+    scores = [s for s in reversed(player['scores']) if include_fails or s['passed']]
+    return jsonify(scores[:limit])
+
+@app.route('/api/v2/beatmaps')
+def beatmaps():
+    ids = request.args.getlist('ids[]', type=int)[:50]
+    result = []
+    for beatmap_id in ids:
+        index = beatmap_id - 100_000
+        if 0 <= index < len(_beatmaps):
+            fields, beatmapset = beatmap_payload(_beatmaps[index])
+            result.append({**fields, 'beatmapset': beatmapset})
+    return jsonify({'beatmaps': result})
+
+@app.route('/api/v2/beatmaps/<int:beatmap_id>/attributes', methods=['POST'])
+def attributes(beatmap_id):
+    index = beatmap_id - 100_000
+    if not 0 <= index < len(_beatmaps):
+        return jsonify({'error': 'Specified beatmap couldn\'t be found.'}), 404
+    body = request.get_json(silent=True) or {}
+    mods = body.get('mods', 0)
+    if isinstance(mods, list):
+        mod_names = [m if isinstance(m, str) else m.get('acronym', '') for m in mods]
+    else:
+        mod_names = [name for name, bit in MOD_BITS.items() if int(mods) & bit]
+    beatmap = _beatmaps[index]
+    return jsonify({'attributes': {
+        'star_rating': round(beatmap['difficulty_rating'] * _mod_multiplier(mod_names), 2),
+        'max_combo': beatmap['max_combo'],
+    }})
+
+@app.route('/_emulator/stats')
+def stats():
+    with _lock:
+        return jsonify({
+            'uptime_seconds': round(time.time() - _stats['started_at'], 1),
+            'endpoints': dict(_stats['endpoints']),
+            'calls_by_user': {str(k): v for k, v in _stats['users'].items()},
+            'errors_injected': _stats['errors'],
+            'rate_limited': _stats['rate_limited'],
+            'players': len(_players),
+        })
+
+@app.route('/_emulator/config', methods=['GET', 'POST'])
+def config():
+    """Read or change failure injection at runtime (POST a JSON subset of CONFIG)."""
+    if request.method == 'POST':
+        for key, value in (request.get_json(silent=True) or {}).items():
+            if key in CONFIG and key not in ('beatmap_count', 'seed'):
+                CONFIG[key] = type(CONFIG[key])(value)
+    return jsonify(CONFIG)
+
+def init_beatmaps():
+    _beatmaps[:] = build_beatmap_pool(CONFIG['beatmap_count'], CONFIG['seed'])
+
+def main():
+    parser = argparse.ArgumentParser(description="Local osu! API emulator")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=5055)
+    parser.add_argument('--latency-ms', type=float, default=CONFIG['latency_ms'])
+    parser.add_argument('--jitter-ms', type=float, default=CONFIG['jitter_ms'])
+    parser.add_argument('--error-rate', type=float, default=CONFIG['error_rate'])
+    parser.add_argument('--rate-limit-rate', type=float, default=CONFIG['rate_limit_rate'])
+    parser.add_argument('--retry-after', type=int, default=CONFIG['retry_after'])
+    parser.add_argument('--rate-limit-per-minute', type=int, default=CONFIG['rate_limit_per_minute'])
+    parser.add_argument('--plays-per-minute', type=float, default=CONFIG['plays_per_minute'])
+    parser.add_argument('--token-ttl-seconds', type=int, default=CONFIG['token_ttl_seconds'])
+    parser.add_argument('--beatmaps', type=int, default=CONFIG['beatmap_count'])
+    parser.add_argument('--seed', type=int, default=CONFIG['seed'])
+    args = parser.parse_args()
+
+    CONFIG.update({
+        'latency_ms': args.latency_ms, 'jitter_ms': args.jitter_ms, 'error_rate': args.error_rate,
+        'rate_limit_rate': args.rate_limit_rate, 'retry_after': args.retry_after,
+        'rate_limit_per_minute': args.rate_limit_per_minute,
+        'plays_per_minute': args.plays_per_minute, 'token_ttl_seconds': args.token_ttl_seconds, 'beatmap_count': args.beatmaps, 'seed': args.seed,
+    })
+    init_beatmaps()
+    print(f"🎮 osu! emulator on http://{args.host}:{args.port} ({len(_beatmaps)} beatmaps)")
+    app.run(host=args.host, port=args.port, threaded=True)
+
+if __name__ == '__main__':
+    main()
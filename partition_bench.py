@@ -0,0 +1,164 @@
+# partition_bench.py
+
+# Compares score_history layouts on a synthetic but realistically skewed table: no
+# partitioning, HASH (user_id) partitions (what v18 ships) and monthly RANGE (timestamp)
+# partitions. Builds all three in a scratch schema, runs the app's hot queries against
+# each and prints median / p95 latencies, then drops the schema.
+#
+#   python partition_bench.py --rows 2000000 --users 5000 --samples 200
+#
+# Play counts follow a power law (a few users own most rows) over --months of history.
+# Queries: the dashboard feed, ingest's dedupe probe and insert, the per-user archive
+# scan, a per-user full-history read (rollup/performance rebuilds) and the leaderboard
+# FC aggregate over everyone. Range partitions cannot carry the (user_id, osu_score_id)
+# unique index (it would have to include timestamp), so that layout gets a plain index.
+import os
+import time
+import random
+import argparse
+import psycopg2
+from dotenv import load_dotenv
+from archive import SCORE_HISTORY_PARTITIONS
+
+load_dotenv()
+
+SCHEMA = 'partition_bench'
+COLUMNS = """
+    id BIGINT NOT NULL, user_id BIGINT NOT NULL, osu_score_id BIGINT, beatmap_id BIGINT, mod_bits INT NOT NULL DEFAULT 0,
+    stars REAL, effective_stars REAL, accuracy REAL, timestamp TIMESTAMP NOT NULL, is_fc BOOLEAN, is_pfc BOOLEAN,
+    map_length INT, max_combo INT, map_max_combo INT, miss_count INT, score_rank TEXT
+"""
+
+def percentile(sorted_values, pct):
+    index = min(len(sorted_values) - 1, int(round(pct / 100 * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+def build(cur, args):
+    cur.execute(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE; CREATE SCHEMA {SCHEMA};")
+    # Power-law play counts: user u gets weight 1 / (u + 10)
+    cur.execute(f"""
+        CREATE TABLE {SCHEMA}.source AS
+        WITH weights AS (
+            SELECT u::bigint AS user_id, 1.0 / (u + 10) AS w FROM generate_series(1, %(users)s) u
+        ), counts AS (
+            SELECT user_id, GREATEST(1, ROUND(w / SUM(w) OVER () * %(rows)s))::int AS plays FROM weights
+        )
+        SELECT ROW_NUMBER() OVER ()::bigint AS id, c.user_id,
+               c.user_id::bigint * 1000000 + g AS osu_score_id,
+               (random() * 200000)::bigint AS beatmap_id,
+               (ARRAY[0, 0, 0, 8, 64, 72, 16])[1 + floor(random() * 7)::int] AS mod_bits,
+               (2 + random() * 6)::real AS stars, (2 + random() * 6)::real AS effective_stars,
+               (0.85 + random() * 0.15)::real AS accuracy,
+               now()::timestamp - make_interval(secs => random() * %(months)s * 30 * 86400) AS timestamp,
+               random() < 0.3 AS is_fc, random() < 0.05 AS is_pfc,
+               (60 + random() * 240)::int AS map_length, (random() * 1500)::int AS max_combo,
+               1500 AS map_max_combo, (random() * 5)::int AS miss_count, 'A' AS score_rank
+        FROM counts c, generate_series(1, c.plays) g;
+    """, {'users': args.users, 'rows': args.rows, 'months': args.months})
+
+    layouts = {
+        'plain': f"CREATE TABLE {SCHEMA}.plain ({COLUMNS}, PRIMARY KEY (user_id, id));",
+        'hash': f"CREATE TABLE {SCHEMA}.hash ({COLUMNS}, PRIMARY KEY (user_id, id)) PARTITION BY HASH (user_id);",
+        'range': f"CREATE TABLE {SCHEMA}.range ({COLUMNS}, PRIMARY KEY (user_id, id, timestamp)) PARTITION BY RANGE (timestamp);",
+    }
+    for name, ddl in layouts.items():
+        cur.execute(ddl)
+    for i in range(SCORE_HISTORY_PARTITIONS):
+        cur.execute(f"""
+            CREATE TABLE {SCHEMA}.hash_p{i} PARTITION OF {SCHEMA}.hash
+            FOR VALUES WITH (MODULUS {SCORE_HISTORY_PARTITIONS}, REMAINDER {i});
+        """)
+    cur.execute(f"SELECT date_trunc('month', MIN(timestamp)), date_trunc('month', MAX(timestamp)) FROM {SCHEMA}.source;")
+    first, last = cur.fetchone()
+    cur.execute(f"""
+        SELECT to_char(m, 'YYYYMM'), m, m + interval '1 month'
+        FROM generate_series(%s::timestamp, %s::timestamp, interval '1 month') m
+    """, (first, last))
+    months = cur.fetchall()
+    for suffix, start, end in months:
+        cur.execute(f"CREATE TABLE {SCHEMA}.range_{suffix} PARTITION OF {SCHEMA}.range FOR VALUES FROM (%s) TO (%s);", (start, end))
+
+    for name in layouts:
+        started = time.perf_counter()
+        cur.execute(f"INSERT INTO {SCHEMA}.{name} SELECT * FROM {SCHEMA}.source;")
+        unique = '' if name == 'range' else 'UNIQUE'
+        cur.execute(f"CREATE {unique} INDEX ON {SCHEMA}.{name} (user_id, osu_score_id);")
+        cur.execute(f"CREATE INDEX ON {SCHEMA}.{name} (user_id, stars) WHERE is_fc = TRUE;")
+        cur.execute(f"ANALYZE {SCHEMA}.{name};")
+        print(f"  {name:<6} loaded and indexed in {time.perf_counter() - started:.1f}s")
+    return len(months)
+
+def queries(table):
+    return {
+        'dashboard feed': (f"""
+            SELECT beatmap_id, mod_bits, stars, is_fc, timestamp FROM {table}
+            WHERE user_id = %(user_id)s ORDER BY timestamp DESC LIMIT 100
+        """, False),
+        'dedupe probe': (f"SELECT 1 FROM {table} WHERE user_id = %(user_id)s AND osu_score_id = %(score_id)s", False),
+        'ingest insert': (f"""
+            INSERT INTO {table} (id, user_id, osu_score_id, stars, accuracy, timestamp, is_fc)
+            VALUES (%(new_id)s, %(user_id)s, %(new_score_id)s, 5.0, 0.97, now()::timestamp, TRUE)
+        """, False),
+        'archive scan': (f"SELECT COUNT(*) FROM {table} WHERE user_id = %(user_id)s AND timestamp < now()::timestamp - interval '1 year'", False),
+        'full history': (f"SELECT stars, accuracy, is_fc, timestamp FROM {table} WHERE user_id = %(user_id)s", False),
+        'leaderboard fc': (f"""
+            SELECT user_id, FLOOR(stars)::int, COUNT(*) FROM {table}
+            WHERE is_fc = TRUE AND stars >= 3 AND stars < 9 GROUP BY 1, 2
+        """, True),
+    }
+
+def run(cur, args):
+    cur.execute(f"SELECT user_id, MIN(osu_score_id) FROM {SCHEMA}.source GROUP BY user_id;")
+    users = cur.fetchall()
+    # Weight samples like traffic: heavy players sync far more often than light ones
+    samples = [random.choice(users[:len(users) // 20 or 1]) if random.random() < 0.5 else random.choice(users)
+               for _ in range(args.samples)]
+    results = {}
+    for layout in ('plain', 'hash', 'range'):
+        table = f"{SCHEMA}.{layout}"
+        for label, (sql, global_query) in queries(table).items():
+            timings = []
+            for n, (user_id, score_id) in enumerate(samples[:5] if global_query else samples):
+                params = {'user_id': user_id, 'score_id': score_id,
+                          'new_id': 10 ** 12 + n, 'new_score_id': 10 ** 12 + n}
+                started = time.perf_counter()
+                cur.execute(sql, params)
+                if cur.description:
+                    cur.fetchall()
+                timings.append(time.perf_counter() - started)
+            cur.connection.rollback()
+            results[(label, layout)] = sorted(timings)
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark score_history partitioning layouts")
+    parser.add_argument('--rows', type=int, default=2_000_000)
+    parser.add_argument('--users', type=int, default=5000)
+    parser.add_argument('--months', type=int, default=36)
+    parser.add_argument('--samples', type=int, default=200)
+    parser.add_argument('--keep', action='store_true', help="Keep the scratch schema afterwards")
+    args = parser.parse_args()
+
+    conn = psycopg2.connect(os.getenv('DATABASE_URL'))
+    cur = conn.cursor()
+    print(f"Building {args.rows} rows for {args.users} users over {args.months} months...")
+    month_count = build(cur, args)
+    conn.commit()
+    print(f"  hash: {SCORE_HISTORY_PARTITIONS} partitions, range: {month_count} monthly partitions\n")
+
+    results = run(cur, args)
+    print(f"{'query':<16}" + ''.join(f"{layout + ' p50/p95 ms':>24}" for layout in ('plain', 'hash', 'range')))
+    for label in queries('t'):
+        cells = []
+        for layout in ('plain', 'hash', 'range'):
+            timings = results[(label, layout)]
+            cells.append(f"{percentile(timings, 50) * 1000:>11.2f} / {percentile(timings, 95) * 1000:>8.2f}")
+        print(f"{label:<16}" + ''.join(f"{cell:>24}" for cell in cells))
+
+    if not args.keep:
+        cur.execute(f"DROP SCHEMA {SCHEMA} CASCADE;")
+        conn.commit()
+    conn.close()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,135 @@
+# performance.py
+
+# Per-user performance aggregates for goal recommendations (recommendations.py):
+# one user_performance row per stored mod bitmask and integer star bucket, holding
+# play/pass/FC counts, an accuracy histogram (ACC_BIN_EDGES) and the longest combo
+# and map length the user has FC'd there. Ingest adds each new score, so reading a
+# user's distributions is a few dozen rows whatever the size of their history.
+# rebuild_performance() recomputes them from score_history plus the archive.
+from bisect import bisect_right
+from psycopg2.extras import execute_values
+from archive import archived_scores
+
+# Accuracy histogram bin lower edges (percent). Bin 0 holds plays below the first edge,
+# bin i plays at or above ACC_BIN_EDGES[i - 1] - the same numbering as width_bucket().
+ACC_BIN_EDGES = (90.0, 93.0, 95.0, 96.0, 97.0, 98.0, 99.0, 99.5)
+ACC_BINS = len(ACC_BIN_EDGES) + 1
+
+def create_performance_table(cur):
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS user_performance (
+            user_id BIGINT,
+            mod_bits INT,
+            star_bucket INT,
+            plays INT DEFAULT 0,
+            passes INT DEFAULT 0,
+            fc_count INT DEFAULT 0,
+            acc_sum FLOAT DEFAULT 0,
+            acc_hist INT[],
+            best_fc_combo INT DEFAULT 0,
+            best_fc_length INT DEFAULT 0,
+            PRIMARY KEY (user_id, mod_bits, star_bucket)
+        );
+    """)
+
+def acc_bin(acc):
+    """Histogram bin of an accuracy given as a fraction (0.985 -> the 98% bin)."""
+    return bisect_right(ACC_BIN_EDGES, (acc or 0) * 100)
+
+def bin_floor(index):
+    """Lowest accuracy (percent) a histogram bin can hold."""
+    return ACC_BIN_EDGES[index - 1] if index > 0 else 0.0
+
+def _new_cell():
+    return {'plays': 0, 'passes': 0, 'fc_count': 0, 'acc_sum': 0.0, 'acc_hist': [0] * ACC_BINS,
+            'best_fc_combo': 0, 'best_fc_length': 0}
+
+def _add_score(cells, mod_bits, stars, acc, is_fc, passed, max_combo, map_length):
+    cell = cells.setdefault((mod_bits or 0, int(stars or 0)), _new_cell())
+    cell['plays'] += 1
+    cell['passes'] += 1 if passed else 0
+    cell['acc_sum'] += acc or 0
+    cell['acc_hist'][acc_bin(acc)] += 1
+    if is_fc:
+        cell['fc_count'] += 1
+        cell['best_fc_combo'] = max(cell['best_fc_combo'], max_combo or 0)
+        cell['best_fc_length'] = max(cell['best_fc_length'], map_length or 0)
+
+def record_performance(cur, user_id, scores):
+    """
+    Adds freshly ingested scores to the aggregates (one upsert per touched cell).
+    scores: iterable of (mod_bits, stars, accuracy, is_fc, passed, max_combo, map_length)
+    """
+    cells = {}
+    for score in scores:
+        _add_score(cells, *score)
+    _upsert_cells(cur, user_id, cells)
+
+def _upsert_cells(cur, user_id, cells):
+    if not cells: return
+    execute_values(cur, """
+        INSERT INTO user_performance (user_id, mod_bits, star_bucket, plays, passes, fc_count, acc_sum, acc_hist, best_fc_combo, best_fc_length)
+        VALUES %s
+        ON CONFLICT (user_id, mod_bits, star_bucket) DO UPDATE SET
+            plays = user_performance.plays + EXCLUDED.plays,
+            passes = user_performance.passes + EXCLUDED.passes,
+            fc_count = user_performance.fc_count + EXCLUDED.fc_count,
+            acc_sum = user_performance.acc_sum + EXCLUDED.acc_sum,
+            acc_hist = (
+                SELECT array_agg(a + b ORDER BY i)
+                FROM unnest(user_performance.acc_hist, EXCLUDED.acc_hist) WITH ORDINALITY AS h(a, b, i)
+            ),
+            best_fc_combo = GREATEST(user_performance.best_fc_combo, EXCLUDED.best_fc_combo),
+            best_fc_length = GREATEST(user_performance.best_fc_length, EXCLUDED.best_fc_length)
+    """, [
+        (user_id, mod_bits, star_bucket, c['plays'], c['passes'], c['fc_count'], c['acc_sum'], c['acc_hist'],
+         c['best_fc_combo'], c['best_fc_length'])
+        for (mod_bits, star_bucket), c in cells.items()
+    ])
+
+def rebuild_performance(cur, user_id):
+    """Recomputes a user's aggregates from score_history and score_archive (offline repair / after reclassification)."""
+    delete_performance(cur, user_id)
+
+    # Grouped per cell and accuracy bin in the database; bins are merged below
+    cur.execute("""
+        SELECT sh.mod_bits, FLOOR(COALESCE(sh.stars, 0))::int, width_bucket(COALESCE(sh.accuracy, 0) * 100, %s::float8[]),
+               COUNT(*), COUNT(*) FILTER (WHERE COALESCE(sh.score_rank, '') <> 'F'), COUNT(*) FILTER (WHERE sh.is_fc),
+               COALESCE(SUM(sh.accuracy), 0),
+               COALESCE(MAX(sh.max_combo) FILTER (WHERE sh.is_fc), 0),
+               COALESCE(MAX(COALESCE(b.total_length, sh.map_length)) FILTER (WHERE sh.is_fc), 0)
+        FROM score_history sh
+        LEFT JOIN beatmaps b ON b.beatmap_id = sh.beatmap_id
+        WHERE sh.user_id = %s
+        GROUP BY 1, 2, 3
+    """, (list(ACC_BIN_EDGES), user_id))
+    cells = {}
+    for mod_bits, star_bucket, acc_index, plays, passes, fc_count, acc_sum, best_combo, best_length in cur.fetchall():
+        cell = cells.setdefault((mod_bits or 0, star_bucket), _new_cell())
+        cell['plays'] += plays
+        cell['passes'] += passes
+        cell['fc_count'] += fc_count
+        cell['acc_sum'] += acc_sum
+        cell['acc_hist'][acc_index] += plays
+        cell['best_fc_combo'] = max(cell['best_fc_combo'], best_combo)
+        cell['best_fc_length'] = max(cell['best_fc_length'], best_length)
+
+    # The archive payload has no map length, so archived FCs don't count towards best_fc_length
+    for a in archived_scores(cur, user_id):
+        _add_score(cells, a['mod_bits'], a['stars'], a['accuracy'], a['is_fc'], a['score_rank'] != 'F',
+                   a['max_combo'], 0)
+
+    _upsert_cells(cur, user_id, cells)
+
+def delete_performance(cur, user_id):
+    cur.execute("DELETE FROM user_performance WHERE user_id = %s", (user_id,))
+
+def get_performance(cur, user_id):
+    """A user's aggregate rows as dicts (mod_bits, star_bucket, plays, passes, fc_count, acc_sum, acc_hist, best_fc_*)."""
+    cur.execute("""
+        SELECT mod_bits, star_bucket, plays, passes, fc_count, acc_sum, acc_hist, best_fc_combo, best_fc_length
+        FROM user_performance
+        WHERE user_id = %s AND plays > 0
+    """, (user_id,))
+    columns = ('mod_bits', 'star_bucket', 'plays', 'passes', 'fc_count', 'acc_sum', 'acc_hist', 'best_fc_combo', 'best_fc_length')
+    return [dict(zip(columns, r)) for r in cur.fetchall()]
@@ -0,0 +1,79 @@
+# poll_schedule.py
+
+# Server-directed poll interval for /check_scores. Every response carries
+# next_poll_ms, which the dashboard waits (with jitter) before polling again:
+#   - how recently the user played (osu_users.last_played_at, the newest ingested
+#     play) or started the session tab sets it: POLL_TIERS,
+#   - osu! rate-limit headroom seen on recent API responses (osu_api.py) stretches it,
+#   - and so does this worker's load, counted as syncs in flight. Past SHED_INFLIGHT
+#     the request is answered with 503 + Retry-After without touching osu! or the database.
+# A 429 from osu! is passed on as 429 + Retry-After.
+import threading
+from osu_api import rate_limit_headroom
+
+# (played or session started within seconds, poll every seconds)
+POLL_TIERS = [
+    (10 * 60, 20),        # mid-session: a map takes a few minutes
+    (30 * 60, 45),
+    (2 * 3600, 90),
+]
+DORMANT_POLL_SECONDS = 180
+MIN_POLL_SECONDS = 10
+MAX_POLL_SECONDS = 300
+
+# Remaining share of the osu! rate limit below which polls are stretched (x2, x4)
+LOW_HEADROOM = 0.25
+CRITICAL_HEADROOM = 0.1
+# Syncs in flight in this worker: stretch polls past BUSY_INFLIGHT, shed past SHED_INFLIGHT
+BUSY_INFLIGHT = 8
+SHED_INFLIGHT = 32
+SHED_RETRY_SECONDS = 30
+
+_inflight = 0
+_inflight_lock = threading.Lock()
+
+class SyncSlot:
+    """Counts a /check_scores request as in flight for this worker (with-statement)."""
+
+    def __enter__(self):
+        global _inflight
+        with _inflight_lock:
+            _inflight += 1
+        return self
+
+    def __exit__(self, *exc):
+        global _inflight
+        with _inflight_lock:
+            _inflight -= 1
+        return False
+
+def inflight_syncs():
+    return _inflight
+
+def overloaded():
+    """True when a new sync should be shed (this worker already runs SHED_INFLIGHT)."""
+    return _inflight >= SHED_INFLIGHT
+
+def next_poll_seconds(idle_seconds, headroom=None, inflight=None):
+    """
+    Seconds until the next poll for a user idle for `idle_seconds` (None = never played).
+    headroom/inflight default to the values this worker has observed.
+    """
+    base = DORMANT_POLL_SECONDS
+    if idle_seconds is not None:
+        for within, seconds in POLL_TIERS:
+            if idle_seconds < within:
+                base = seconds
+                break
+
+    headroom = rate_limit_headroom() if headroom is None else headroom
+    if headroom is not None and headroom < CRITICAL_HEADROOM:
+        base *= 4
+    elif headroom is not None and headroom < LOW_HEADROOM:
+        base *= 2
+
+    inflight = inflight_syncs() if inflight is None else inflight
+    if inflight > BUSY_INFLIGHT:
+        base *= 2
+
+    return min(max(base, MIN_POLL_SECONDS), MAX_POLL_SECONDS)
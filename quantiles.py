@@ -0,0 +1,256 @@
+# quantiles.py
+
+# Percentiles of accuracy, star rating and effective stars ("median accuracy on 6★
+# HDDT", "p90 effective stars this month") without sorting score_history.
+#
+# Ingest adds every score to a small mergeable sketch per user, month, mod combination
+# and integer star bucket (score_sketches). A query merges the sketches of the buckets
+# and months it covers and reads the quantile off the merged sketch.
+#
+# The sketch is a log-bucketed histogram (the DDSketch construction): value v is
+# counted in bin ceil(log_gamma(v)), so any two sketches merge exactly by adding bin
+# counts, and a quantile is within RELATIVE_ERROR of the true value of that rank
+# however many sketches were merged. Accuracy is sketched as the miss rate (1 - acc),
+# which puts the precision where it matters: 98% is exact to within ±0.01%.
+# Bins are stored as varints in a BYTEA; a month's sketch for one star bucket is a
+# few dozen bins, a couple of hundred bytes.
+import math
+from psycopg2.extras import execute_values
+from archive import archived_scores
+from scoring import bitmask_to_combination
+
+RELATIVE_ERROR = 0.005
+GAMMA = (1 + RELATIVE_ERROR) / (1 - RELATIVE_ERROR)
+LOG_GAMMA = math.log(GAMMA)
+# Values below this are counted as zero (an SS has a miss rate of 0)
+MIN_SKETCH_VALUE = 1e-5
+
+SKETCH_FORMAT = 1
+
+# metric -> (score_sketches column, value stored in the sketch, inverse)
+METRICS = {
+    'acc': ('acc_sketch', lambda acc: 1 - acc, lambda miss: 1 - miss),
+    'stars': ('stars_sketch', lambda stars: stars, lambda stars: stars),
+    'eff_stars': ('eff_stars_sketch', lambda eff: eff, lambda eff: eff),
+}
+
+# --- SKETCH ---
+
+def _write_varint(out, n):
+    while n >= 0x80:
+        out.append((n & 0x7F) | 0x80)
+        n >>= 7
+    out.append(n)
+
+def _read_varint(data, pos):
+    n = shift = 0
+    while True:
+        byte = data[pos]
+        pos += 1
+        n |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return n, pos
+        shift += 7
+
+class QuantileSketch:
+    """Mergeable quantile sketch with relative error RELATIVE_ERROR for non-negative values."""
+
+    __slots__ = ('bins', 'zero_count', 'count')
+
+    def __init__(self):
+        self.bins = {}
+        self.zero_count = 0
+        self.count = 0
+
+    def add(self, value, n=1):
+        if value is None:
+            return
+        if value < MIN_SKETCH_VALUE:
+            self.zero_count += n
+        else:
+            index = math.ceil(math.log(value) / LOG_GAMMA)
+            self.bins[index] = self.bins.get(index, 0) + n
+        self.count += n
+
+    def merge(self, other):
+        for index, n in other.bins.items():
+            self.bins[index] = self.bins.get(index, 0) + n
+        self.zero_count += other.zero_count
+        self.count += other.count
+        return self
+
+    def quantile(self, q):
+        """Value at quantile q (0..1), or None for an empty sketch."""
+        if not self.count:
+            return None
+        rank = q * (self.count - 1)
+        seen = self.zero_count
+        if rank < seen:
+            return 0.0
+        for index in sorted(self.bins):
+            seen += self.bins[index]
+            if rank < seen:
+                # Midpoint (in relative terms) of the bin's range (gamma^(i-1), gamma^i]
+                return 2 * GAMMA ** index / (GAMMA + 1)
+        return 2 * GAMMA ** max(self.bins) / (GAMMA + 1)
+
+    def to_bytes(self):
+        """format, zero count, bin count, then (zigzag index delta, count) varint pairs"""
+        out = bytearray([SKETCH_FORMAT])
+        _write_varint(out, self.zero_count)
+        _write_varint(out, len(self.bins))
+        previous = 0
+        for index in sorted(self.bins):
+            delta = index - previous
+            _write_varint(out, (delta << 1) ^ (delta >> 63))
+            _write_varint(out, self.bins[index])
+            previous = index
+        return bytes(out)
+
+    @classmethod
+    def from_bytes(cls, data):
+        sketch = cls()
+        if not data:
+            return sketch
+        data = bytes(data)
+        if data[0] != SKETCH_FORMAT:
+            raise ValueError(f"Unknown sketch format {data[0]}")
+        sketch.zero_count, pos = _read_varint(data, 1)
+        sketch.count = sketch.zero_count
+        size, pos = _read_varint(data, pos)
+        index = 0
+        for _ in range(size):
+            zigzag, pos = _read_varint(data, pos)
+            n, pos = _read_varint(data, pos)
+            index += (zigzag >> 1) ^ -(zigzag & 1)
+            sketch.bins[index] = n
+            sketch.count += n
+        return sketch
+
+# --- STORAGE ---
+
+def create_sketch_table(cur):
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS score_sketches (
+            user_id BIGINT,
+            month DATE,
+            mod_combination TEXT,
+            star_bucket INT,
+            plays INT DEFAULT 0,
+            acc_sketch BYTEA,
+            stars_sketch BYTEA,
+            eff_stars_sketch BYTEA,
+            PRIMARY KEY (user_id, month, mod_combination, star_bucket)
+        );
+    """)
+
+def month_start(ts):
+    day = ts.date() if hasattr(ts, 'date') else ts
+    return day.replace(day=1)
+
+def _add_to_cells(cells, ts, mod_combination, stars, acc, eff_stars):
+    key = (month_start(ts), mod_combination or 'NM', int(stars or 0))
+    cell = cells.get(key)
+    if cell is None:
+        cell = cells[key] = {metric: QuantileSketch() for metric in METRICS}
+    for metric, value in (('acc', acc), ('stars', stars), ('eff_stars', eff_stars)):
+        if value is not None:
+            cell[metric].add(METRICS[metric][1](value))
+
+def record_sketches(cur, user_id, scores):
+    """
+    Adds freshly ingested scores to their sketches.
+    scores: iterable of (timestamp, mod_combination, stars, accuracy, effective_stars)
+    Read-modify-write per touched sketch: callers hold the user's sync lock (sync_lock.py).
+    """
+    cells = {}
+    for score in scores:
+        _add_to_cells(cells, *score)
+    if not cells: return
+
+    cur.execute("""
+        SELECT month, mod_combination, star_bucket, acc_sketch, stars_sketch, eff_stars_sketch
+        FROM score_sketches
+        WHERE user_id = %s AND (month, mod_combination, star_bucket) IN (SELECT * FROM unnest(%s::date[], %s::text[], %s::int[]))
+    """, (user_id, *map(list, zip(*cells.keys()))))
+    for month, mod_combination, star_bucket, *stored in cur.fetchall():
+        cell = cells[(month, mod_combination, star_bucket)]
+        for metric, data in zip(METRICS, stored):
+            cell[metric].merge(QuantileSketch.from_bytes(data))
+    _write_cells(cur, user_id, cells)
+
+def _write_cells(cur, user_id, cells):
+    if not cells: return
+    execute_values(cur, """
+        INSERT INTO score_sketches (user_id, month, mod_combination, star_bucket, plays, acc_sketch, stars_sketch, eff_stars_sketch)
+        VALUES %s
+        ON CONFLICT (user_id, month, mod_combination, star_bucket) DO UPDATE SET
+            plays = EXCLUDED.plays,
+            acc_sketch = EXCLUDED.acc_sketch,
+            stars_sketch = EXCLUDED.stars_sketch,
+            eff_stars_sketch = EXCLUDED.eff_stars_sketch
+    """, [
+        (user_id, month, mod_combination, star_bucket, cell['stars'].count,
+         *(cell[metric].to_bytes() for metric in METRICS))
+        for (month, mod_combination, star_bucket), cell in cells.items()
+    ])
+
+def rebuild_sketches(cur, user_id):
+    """Recomputes a user's sketches from score_history and score_archive (offline repair)."""
+    delete_sketches(cur, user_id)
+    cells = {}
+    cur.execute("""
+        SELECT timestamp, mod_bits, stars, accuracy, effective_stars
+        FROM score_history
+        WHERE user_id = %s AND timestamp IS NOT NULL
+    """, (user_id,))
+    for ts, mod_bits, stars, acc, eff_stars in cur.fetchall():
+        _add_to_cells(cells, ts, bitmask_to_combination(mod_bits), stars, acc, eff_stars)
+    for a in archived_scores(cur, user_id):
+        if a['timestamp']:
+            _add_to_cells(cells, a['timestamp'], a['mod_combination'], a['stars'], a['accuracy'], a['effective_stars'])
+    _write_cells(cur, user_id, cells)
+
+def delete_sketches(cur, user_id):
+    cur.execute("DELETE FROM score_sketches WHERE user_id = %s", (user_id,))
+
+# --- QUERIES ---
+
+def get_quantiles(cur, user_id, metric, quantiles, mod_combination=None, min_stars=None, max_stars=None,
+                  since=None, until=None):
+    """
+    Merges the sketches matching the filters and returns
+    {'metric', 'plays', 'relative_error', 'quantiles': {q: value or None}}.
+    mod_combination matches exactly (None = all); min_stars/max_stars select whole star
+    buckets (max_stars=6 includes 6.99★); since/until select whole months (dates).
+    """
+    column, _, inverse = METRICS[metric]
+    where = ["user_id = %s"]
+    params = [user_id]
+    if mod_combination:
+        where.append("mod_combination = %s")
+        params.append(mod_combination)
+    if min_stars is not None:
+        where.append("star_bucket >= %s")
+        params.append(int(min_stars))
+    if max_stars is not None:
+        where.append("star_bucket <= %s")
+        params.append(int(max_stars))
+    if since is not None:
+        where.append("month >= %s")
+        params.append(month_start(since))
+    if until is not None:
+        where.append("month <= %s")
+        params.append(month_start(until))
+    cur.execute(f"SELECT {column} FROM score_sketches WHERE {' AND '.join(where)}", params)
+
+    merged = QuantileSketch()
+    for (data,) in cur.fetchall():
+        merged.merge(QuantileSketch.from_bytes(data))
+
+    values = {}
+    for q in quantiles:
+        # The accuracy sketch holds miss rates, so its high quantiles are low accuracies
+        value = merged.quantile(1 - q if metric == 'acc' else q)
+        values[q] = round(inverse(value), 6) if value is not None else None
+    return {'metric': metric, 'plays': merged.count, 'relative_error': RELATIVE_ERROR, 'quantiles': values}
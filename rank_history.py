@@ -0,0 +1,96 @@
+# rank_history.py
+
+# Global rank over time. A sample is only written when the rank differs from the
+# user's latest sample, so the table holds a step function: the rank at time t is
+# the last sample at or before t. Older samples are thinned to the last one per
+# hour, day and week (RANK_HISTORY_TIERS) whenever a new sample is written, so a
+# user's history is the last day's changes plus a few hundred rows (and ~52 a year).
+from datetime import timedelta
+
+# (older than, keep the last sample per date_trunc unit)
+RANK_HISTORY_TIERS = [
+    (timedelta(days=1), 'hour'),
+    (timedelta(days=14), 'day'),
+    (timedelta(days=90), 'week'),
+]
+
+def create_rank_history_table(cur):
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS rank_history (
+            user_id BIGINT,
+            sampled_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            global_rank INT,
+            PRIMARY KEY (user_id, sampled_at)
+        );
+    """)
+
+def record_rank(cur, user_id, rank):
+    """Stores a sample if the rank changed (0/None means unranked and is skipped). Returns True if stored."""
+    if not rank:
+        return False
+    cur.execute("""
+        INSERT INTO rank_history (user_id, sampled_at, global_rank)
+        SELECT %s, CURRENT_TIMESTAMP, %s
+        WHERE %s IS DISTINCT FROM (
+            SELECT global_rank FROM rank_history WHERE user_id = %s ORDER BY sampled_at DESC LIMIT 1
+        )
+        ON CONFLICT (user_id, sampled_at) DO UPDATE SET global_rank = EXCLUDED.global_rank
+        RETURNING 1
+    """, (user_id, rank, rank, user_id))
+    if cur.fetchone() is None:
+        return False
+    compact_rank_history(cur, user_id)
+    return True
+
+def compact_rank_history(cur, user_id):
+    """Downsamples a user's older samples to the last one per tier bucket."""
+    for age, unit in RANK_HISTORY_TIERS:
+        cur.execute(f"""
+            DELETE FROM rank_history rh
+            WHERE rh.user_id = %s AND rh.sampled_at < CURRENT_TIMESTAMP - %s
+              AND EXISTS (
+                  SELECT 1 FROM rank_history later
+                  WHERE later.user_id = rh.user_id
+                    AND later.sampled_at > rh.sampled_at
+                    AND date_trunc('{unit}', later.sampled_at) = date_trunc('{unit}', rh.sampled_at)
+              )
+        """, (user_id, age))
+
+def get_rank_series(cur, user_id, days=90, now=None):
+    """
+    Chart-ready rank history for the last `days`:
+    {'points': [[iso timestamp, rank], ...], 'current', 'best', 'change'}
+    The series starts with the rank the user had when the range began (if known) and
+    ends with the current rank, so it can be drawn as steps over the whole range.
+    """
+    if now is None:
+        # Samples are stored in the database's local time
+        cur.execute("SELECT LOCALTIMESTAMP")
+        now = cur.fetchone()[0]
+    since = now - timedelta(days=days)
+    cur.execute("""
+        (SELECT sampled_at, global_rank FROM rank_history
+         WHERE user_id = %s AND sampled_at < %s
+         ORDER BY sampled_at DESC LIMIT 1)
+        UNION ALL
+        (SELECT sampled_at, global_rank FROM rank_history
+         WHERE user_id = %s AND sampled_at >= %s
+         ORDER BY sampled_at)
+    """, (user_id, since, user_id, since))
+    rows = cur.fetchall()
+    if not rows:
+        return {'points': [], 'current': None, 'best': None, 'change': None}
+
+    points = [[max(ts, since).isoformat(), rank] for ts, rank in rows]
+    points.append([now.isoformat(), rows[-1][1]])
+    ranks = [rank for _, rank in rows]
+    return {
+        'points': points,
+        'current': ranks[-1],
+        'best': min(ranks),
+        # Positive = climbed (rank number went down) over the range
+        'change': ranks[0] - ranks[-1]
+    }
+
+def delete_rank_history(cur, user_id):
+    cur.execute("DELETE FROM rank_history WHERE user_id = %s", (user_id,))
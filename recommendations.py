@@ -0,0 +1,283 @@
+# recommendations.py
+
+# Goal suggestions from the user's own distributions. Everything is read from
+# precomputed aggregates - user_performance (FC/pass rates and accuracy histograms
+# per mod bitmask and star bucket, performance.py) and the weekly analytics rollups
+# for the recent trend - never from score_history. app.py caches the result per
+# state version, so it is only recomputed after new scores or goal changes.
+#
+# Every suggestion carries expected_plays: how many plays on eligible maps the goal
+# should take at the user's historical rate for them. Suggestions are either an
+# unassigned achievement (goals_definitions.PREDETERMINED_GOALS) or a payload for
+# /add_goal built from the same criteria fields the goal form sends.
+import math
+from datetime import date, timedelta
+from analytics import bucket_start
+from goals_definitions import PREDETERMINED_GOALS
+from performance import ACC_BINS, bin_floor, get_performance
+from scoring import bitmask_to_combination, matching_bits, matching_mod_bitmask
+
+# Mod combinations need this many plays before goals are suggested for them
+MIN_MOD_PLAYS = 20
+# ...and a star bucket this many plays before its rates are trusted
+MIN_BUCKET_PLAYS = 5
+# The user's comfort level is the highest star bucket they FC at least this often
+COMFORT_FC_RATE = 0.25
+# Accuracy goals target the accuracy reached in the best quarter of plays
+ACC_TARGET_SHARE = 0.25
+# Custom goal counts are sized to roughly this many eligible plays
+GOAL_PLAYS = 50
+MAX_GOAL_COUNT = 20
+# Achievements expected to take longer than this aren't suggested yet
+MAX_EXPECTED_PLAYS = 300
+RECOMMENDED_MODS = 3
+MAX_SUGGESTIONS = 8
+# Weekly rollups compared for the trend (recent weeks vs the weeks before)
+TREND_WEEKS = 4
+TREND_THRESHOLD = 0.1  # change in average effective stars
+
+# Filters achievements can be estimated for (see goal_engine.compile_filters)
+ESTIMABLE_FILTERS = {'fc', 'pass', 'min_stars', 'min_acc', 'mods_include', 'mods_exact'}
+
+# --- ESTIMATES ---
+
+def _matching_cells(cells, mod_bits=None, exact=True, min_stars=0):
+    """Cells for plays matching a mod requirement (None = any mods) on maps of at least min_stars."""
+    min_bucket = int(min_stars)
+    required = matching_bits(mod_bits) if mod_bits is not None else None
+    for cell in cells:
+        if cell['star_bucket'] < min_bucket:
+            continue
+        if required is not None:
+            bits = matching_bits(cell['mod_bits'])
+            if (bits != required) if exact else (bits & required != required):
+                continue
+        yield cell
+
+def _acc_share(cell, min_acc):
+    """Share of a cell's plays with at least min_acc (percent), counting only bins entirely above it."""
+    reached = sum(n for i, n in enumerate(cell['acc_hist'] or []) if bin_floor(i) >= min_acc)
+    return reached / cell['plays']
+
+def success_rate(cells, fc=False, passed=False, min_acc=None):
+    """(successes per play, plays) over cells; FC and accuracy are treated as independent within a cell."""
+    plays = sum(c['plays'] for c in cells)
+    if not plays:
+        return 0.0, 0
+    successes = 0.0
+    for c in cells:
+        count = c['fc_count'] if fc else c['passes'] if passed else c['plays']
+        if min_acc:
+            count *= _acc_share(c, min_acc)
+        successes += count
+    return successes / plays, plays
+
+def expected_plays(rate, target=1, kind='count'):
+    """Plays on eligible maps expected to reach a target at a per-play success rate (None if never)."""
+    if rate <= 0:
+        return None
+    if kind == 'streak':
+        # Expected trials until `target` successes in a row
+        if rate >= 1:
+            return target
+        return math.ceil((1 - rate ** target) / ((1 - rate) * rate ** target))
+    return math.ceil(target / rate)
+
+def acc_target(cells, share=ACC_TARGET_SHARE):
+    """Highest histogram bin floor that at least `share` of the cells' plays reach (None under 90%)."""
+    plays = sum(c['plays'] for c in cells)
+    if not plays:
+        return None
+    hist = [sum(c['acc_hist'][i] for c in cells if c['acc_hist']) for i in range(ACC_BINS)]
+    reached = 0
+    for i in range(len(hist) - 1, 0, -1):
+        reached += hist[i]
+        if reached >= share * plays:
+            return bin_floor(i)
+    return None
+
+# --- TREND ---
+
+def get_trend(cur, user_id, today=None):
+    """Average effective stars and FC rate over the last TREND_WEEKS weeks vs the weeks before, from the weekly rollups."""
+    this_week = bucket_start(today or date.today(), 'week')
+    recent_start = this_week - timedelta(weeks=TREND_WEEKS - 1)
+    previous_start = recent_start - timedelta(weeks=TREND_WEEKS)
+    cur.execute("""
+        SELECT bucket >= %s, SUM(plays), SUM(fc_count), SUM(eff_stars_sum)
+        FROM score_rollups_weekly
+        WHERE user_id = %s AND bucket >= %s
+        GROUP BY 1
+    """, (recent_start, user_id, previous_start))
+    periods = {True: [0, 0, 0.0], False: [0, 0, 0.0]}
+    for is_recent, plays, fc_count, eff_sum in cur.fetchall():
+        totals = periods[is_recent]
+        totals[0] += plays
+        totals[1] += fc_count
+        totals[2] += eff_sum
+
+    def summary(totals):
+        plays, fc_count, eff_sum = totals
+        if not plays:
+            return None
+        return {'plays': plays, 'fc_rate': round(fc_count / plays, 4), 'avg_eff_stars': round(eff_sum / plays, 3)}
+
+    recent, previous = summary(periods[True]), summary(periods[False])
+    direction = 'flat'
+    if recent and previous:
+        change = recent['avg_eff_stars'] - previous['avg_eff_stars']
+        if change > TREND_THRESHOLD:
+            direction = 'up'
+        elif change < -TREND_THRESHOLD:
+            direction = 'down'
+    return {'direction': direction, 'recent': recent, 'previous': previous}
+
+# --- SUGGESTIONS ---
+
+def _goal_count(rate):
+    return min(max(int(rate * GOAL_PLAYS), 1), MAX_GOAL_COUNT)
+
+def _custom(title, reason, rate, count, **criteria):
+    goal = {
+        'type': 'fc', 'count_needed': count, 'use_stars': False, 'target_stars': 0,
+        'use_accuracy': False, 'accuracy_needed': 0, 'use_mod_combo': True,
+        'mod_combination': 'NM', 'mod_match': 'exact', 'use_length': False, 'map_length': 0,
+        'use_combo': False, 'min_combo': 0, 'title': title
+    }
+    goal.update(criteria)
+    return {
+        'kind': 'custom',
+        'title': title,
+        'reason': reason,
+        'rate': round(rate, 4) if rate is not None else None,
+        'expected_plays': expected_plays(rate, count) if rate is not None else None,
+        'goal': goal
+    }
+
+def _mod_suggestions(cells, mod_bits, direction, detailed):
+    """Suggestions for one mod combination: an FC goal, an accuracy goal and (if detailed) combo/length goals."""
+    combination = bitmask_to_combination(mod_bits)
+    rated = {}
+    for c in cells:
+        if c['plays'] >= MIN_BUCKET_PLAYS:
+            rated[c['star_bucket']] = c['fc_count'] / c['plays']
+    comfortable = [b for b, rate in rated.items() if rate >= COMFORT_FC_RATE]
+    if not comfortable:
+        return []
+    comfort = max(comfortable)
+
+    suggestions = []
+    # FC goal one star above the comfort level if the user already FCs there now and then, or has played it while improving
+    level = comfort
+    if rated.get(comfort + 1, 0) >= COMFORT_FC_RATE / 2 or (direction == 'up' and (comfort + 1) in rated):
+        level = comfort + 1
+    level_rate, _ = success_rate([c for c in cells if c['star_bucket'] >= level], fc=True)
+    count = _goal_count(level_rate)
+    suggestions.append(_custom(
+        f"FC {count} map{'s' if count > 1 else ''} at {level}★+ ({combination})",
+        f"You FC {level_rate:.0%} of your {combination} plays at {level}★ and above",
+        level_rate, count, type='fc', use_stars=True, target_stars=level, mod_combination=combination))
+
+    # Accuracy goal at the comfort level
+    comfort_cells = [c for c in cells if c['star_bucket'] >= comfort]
+    acc = acc_target(comfort_cells)
+    if acc:
+        acc_rate, _ = success_rate(comfort_cells, passed=True, min_acc=acc)
+        if acc_rate > 0:
+            count = _goal_count(acc_rate)
+            suggestions.append(_custom(
+                f"Pass {count} map{'s' if count > 1 else ''} at {comfort}★+ with {acc:g}%+ ({combination})",
+                f"A quarter of your {combination} plays at {comfort}★+ reach {acc:g}%",
+                acc_rate, count, type='pass', use_stars=True, target_stars=comfort,
+                use_accuracy=True, accuracy_needed=acc, mod_combination=combination))
+
+    if detailed:
+        best_combo = max(c['best_fc_combo'] or 0 for c in comfort_cells)
+        if best_combo >= 100:
+            target = math.ceil(best_combo * 1.15 / 50) * 50
+            suggestions.append(_custom(
+                f"FC a {comfort}★+ map with {target}+ combo ({combination})",
+                f"Your longest {combination} FC combo at {comfort}★+ is {best_combo}",
+                None, 1, type='fc', use_stars=True, target_stars=comfort,
+                use_combo=True, min_combo=target, mod_combination=combination))
+        best_length = max(c['best_fc_length'] or 0 for c in comfort_cells)
+        if best_length >= 60:
+            target = math.ceil((best_length + 30) / 30) * 30
+            suggestions.append(_custom(
+                f"FC a {comfort}★+ map of {target // 60}:{target % 60:02d}+ ({combination})",
+                f"Your longest {combination} FC at {comfort}★+ is {best_length // 60}:{best_length % 60:02d}",
+                None, 1, type='fc', use_stars=True, target_stars=comfort,
+                use_length=True, map_length=target, mod_combination=combination))
+    return suggestions
+
+def _achievement_suggestion(cells, goal):
+    """Suggestion for an achievement, or None if its rule can't be estimated or is out of reach."""
+    rule = goal['rule']
+    filters = rule.get('filters', {})
+    if rule['kind'] not in ('count', 'single', 'streak') or not set(filters) <= ESTIMABLE_FILTERS:
+        return None
+    mod_bits, exact = None, True
+    if 'mods_exact' in filters:
+        mod_bits = matching_mod_bitmask(filters['mods_exact'])
+    elif 'mods_include' in filters:
+        mod_bits, exact = matching_mod_bitmask(filters['mods_include']), False
+    matching = list(_matching_cells(cells, mod_bits, exact, filters.get('min_stars', 0)))
+    rate, plays = success_rate(matching, fc=filters.get('fc', False), passed=filters.get('pass', False),
+                               min_acc=filters.get('min_acc'))
+    target = rule.get('target', 1) if rule['kind'] != 'single' else 1
+    expected = expected_plays(rate, target, rule['kind'])
+    if plays < MIN_BUCKET_PLAYS or expected is None or expected > MAX_EXPECTED_PLAYS:
+        return None
+    return {
+        'kind': 'achievement',
+        'achievement_id': goal['id'],
+        'title': goal['title'],
+        'description': goal['description'],
+        'icon': goal['icon'],
+        'reason': f"{rate:.0%} of your {plays} eligible plays would count",
+        'rate': round(rate, 4),
+        'expected_plays': expected
+    }
+
+def _is_active(goal, active):
+    return any(
+        c.get('type') == goal['type'] and float(c.get('min_stars') or 0) == float(goal['target_stars'] if goal['use_stars'] else 0)
+        and c.get('mod_combination') == goal['mod_combination'] and bool(c.get('use_acc')) == goal['use_accuracy']
+        and bool(c.get('use_combo')) == goal['use_combo'] and bool(c.get('use_length')) == goal['use_length']
+        and not c.get('beatmap_id')
+        for c in active
+    )
+
+def get_recommendations(cur, user_id, limit=MAX_SUGGESTIONS):
+    """
+    {'trend': get_trend(), 'suggestions': [...]} - unassigned achievements within reach first
+    (fewest expected plays first), then custom goals for the user's most played mod combinations.
+    Custom goals that match one of the user's active goals are left out.
+    """
+    cells = get_performance(cur, user_id)
+    trend = get_trend(cur, user_id)
+
+    cur.execute("SELECT goal_id FROM user_achievements WHERE user_id = %s", (user_id,))
+    assigned = {r[0] for r in cur.fetchall()}
+    cur.execute("SELECT criteria FROM user_active_goals WHERE user_id = %s AND is_completed = FALSE", (user_id,))
+    active = [r[0] for r in cur.fetchall() if isinstance(r[0], dict)]
+
+    achievements = [
+        s for s in (_achievement_suggestion(cells, g) for g in PREDETERMINED_GOALS if g['id'] not in assigned) if s
+    ]
+    achievements.sort(key=lambda s: s['expected_plays'])
+
+    by_mods = {}
+    for c in cells:
+        by_mods.setdefault(c['mod_bits'], []).append(c)
+    top_mods = sorted(
+        (bits for bits, group in by_mods.items() if sum(c['plays'] for c in group) >= MIN_MOD_PLAYS),
+        key=lambda bits: -sum(c['plays'] for c in by_mods[bits])
+    )[:RECOMMENDED_MODS]
+
+    custom = []
+    for i, bits in enumerate(top_mods):
+        custom += [s for s in _mod_suggestions(by_mods[bits], bits, trend['direction'], detailed=(i == 0))
+                   if not _is_active(s['goal'], active)]
+
+    return {'trend': trend, 'suggestions': (achievements + custom)[:limit]}
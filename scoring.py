@@ -0,0 +1,192 @@
+# scoring.py
+
+# Score classification shared by live ingest and the maintenance jobs.
+# The scalar helpers classify a single score from the osu! API payload; the
+# *_batch helpers take NumPy column arrays so whole chunks of score_history
+# can be reclassified at once when the thresholds below change.
+import numpy as np
+
+# FC threshold: a score that lost combo only to dropped slider ends still counts
+# as an FC if it is within 3% of the map max combo or 30 combo, whichever is smaller.
+FC_PERCENT_THRESHOLD = 0.03
+FC_ABSOLUTE_THRESHOLD = 30
+
+SS_RANKS = ('X', 'XH')
+
+# Mastery ratings (user_mastery.<group>_rating) are an EMA of effective stars per mod group:
+# every play moves its group's rating MASTERY_WEIGHT of the way towards the play.
+MASTERY_GROUPS = ('NM', 'HD', 'HR', 'DT', 'FL')
+MASTERY_WEIGHT = 0.05
+
+# Legacy osu! mod bitmask (same values the API uses for `mods` integers)
+MOD_BITS = {
+    'NF': 1, 'EZ': 2, 'TD': 4, 'HD': 8, 'HR': 16, 'SD': 32, 'DT': 64, 'RX': 128,
+    'HT': 256, 'NC': 512, 'FL': 1024, 'AT': 2048, 'SO': 4096, 'AP': 8192, 'PF': 16384,
+}
+
+# Mods that change star rating. NC is scored exactly like DT, so it maps onto the DT bit.
+DIFFICULTY_MODS = MOD_BITS['EZ'] | MOD_BITS['HR'] | MOD_BITS['DT'] | MOD_BITS['HT'] | MOD_BITS['FL']
+
+def normalize_mod_combination(raw_mods):
+    """Converts the API mods array into a sorted combination string (["HD", "DT"] -> "DTHD")."""
+    if isinstance(raw_mods, list):
+        mod_list = sorted([m for m in raw_mods if m])
+        mod_combination = ''.join(mod_list) if mod_list else 'NM'
+    else:
+        mod_combination = raw_mods if raw_mods else 'NM'
+    if not mod_combination or mod_combination == '[]': mod_combination = 'NM'
+    return mod_combination
+
+def get_mod_group(raw_mods):
+    """Picks the single mastery group a score counts towards (DT > HR > HD > FL > NM)."""
+    if "DT" in raw_mods or "NC" in raw_mods: return "DT"
+    if "HR" in raw_mods: return "HR"
+    if "HD" in raw_mods: return "HD"
+    if "FL" in raw_mods: return "FL"
+    return "NM"
+
+def parse_mod_combination(mod_combination):
+    """Splits a stored combination string back into mods ("DTHD" -> ["DT", "HD"], "NM" -> [])."""
+    if not mod_combination or mod_combination == 'NM':
+        return []
+    return [mod_combination[i:i + 2] for i in range(0, len(mod_combination), 2)]
+
+def mods_to_bitmask(mods):
+    """Converts a list of mod acronyms into the legacy bitmask. Unknown acronyms are ignored."""
+    bits = 0
+    for mod in mods:
+        bits |= MOD_BITS.get(mod, 0)
+    return bits
+
+def bitmask_to_mods(bits):
+    """Mod acronyms set in a bitmask, sorted like normalize_mod_combination (8 | 64 -> ["DT", "HD"])."""
+    return sorted(mod for mod, bit in MOD_BITS.items() if bits and bits & bit)
+
+def bitmask_to_combination(bits):
+    """Display string for a stored mod bitmask (8 | 64 -> "DTHD", 0 -> "NM")."""
+    return ''.join(bitmask_to_mods(bits)) or 'NM'
+
+def combination_to_bitmask(mod_combination):
+    return mods_to_bitmask(parse_mod_combination(mod_combination))
+
+def matching_mod_bitmask(mods):
+    """Bitmask used when matching goal rules: NC also counts as DT and PF as SD."""
+    return matching_bits(mods_to_bitmask(mods))
+
+def matching_bits(bits):
+    """matching_mod_bitmask() for an already stored bitmask."""
+    bits = bits or 0
+    if bits & MOD_BITS['NC']:
+        bits |= MOD_BITS['DT']
+    if bits & MOD_BITS['PF']:
+        bits |= MOD_BITS['SD']
+    return bits
+
+def difficulty_mod_bitmask(mods):
+    """Bitmask of only the mods that affect difficulty attributes (NC counts as DT)."""
+    bits = mods_to_bitmask(mods)
+    if bits & MOD_BITS['NC']:
+        bits |= MOD_BITS['DT']
+    return bits & DIFFICULTY_MODS
+
+def calculate_effective_stars(stars, acc, max_combo, map_max_combo):
+    if map_max_combo and map_max_combo > 0:
+        combo_ratio = max_combo / map_max_combo
+    else:
+        combo_ratio = 1.0
+    return stars * (acc ** 3) * combo_ratio
+
+def fc_threshold(map_max_combo):
+    return min(int(map_max_combo * FC_PERCENT_THRESHOLD), FC_ABSOLUTE_THRESHOLD)
+
+def classify_fc(score_rank, miss_count, max_combo, map_max_combo):
+    """
+    Returns (is_fc, is_pfc) for one score.
+
+    PFC = no misses and max_combo exactly matches map_max_combo (S or SS, 100s/50s allowed).
+
+    FC follows the community definition: no misses and no slider breaks, but dropped
+    slider ends are fine even though they cost combo.
+    1. F rank or has misses = NOT FC
+    2. SS rank (X/XH) with no misses = Always FC (even if map_max_combo unavailable)
+    3. If map_max_combo is available:
+       - combo matches map max exactly = FC
+       - combo within the threshold (e.g. 370/371, 1130/1159) = FC (dropped slider ends)
+       - combo significantly lower (e.g. 183/442) = NOT FC (slider break)
+    4. If map_max_combo is unavailable = only SS rank can be FC (conservative)
+
+    We never fall back to the score's own max_combo for map_max_combo, since that
+    would mark every no-miss score as an FC.
+    """
+    miss_count = miss_count or 0
+    map_max_combo = map_max_combo or 0
+    max_combo = max_combo or 0
+
+    is_pfc = (miss_count == 0 and
+              map_max_combo > 0 and
+              max_combo == map_max_combo)
+
+    if score_rank == 'F' or miss_count > 0:
+        is_fc = False
+    elif score_rank in SS_RANKS:
+        is_fc = True
+    elif map_max_combo > 0:
+        combo_diff = map_max_combo - max_combo
+        # combo_diff < 0 shouldn't happen, but never call it an FC
+        is_fc = 0 <= combo_diff <= fc_threshold(map_max_combo)
+    else:
+        is_fc = False
+
+    return is_fc, is_pfc
+
+# --- BATCH API ---
+
+def classify_fc_batch(ranks, miss_counts, max_combos, map_max_combos):
+    """
+    Vectorized classify_fc over column arrays of equal length.
+    NULLs (None) in the numeric columns are treated as 0, like the scalar version.
+    Returns (is_fc, is_pfc) as boolean arrays.
+    """
+    ranks = np.asarray(ranks, dtype=object)
+    miss_counts = _int_column(miss_counts)
+    max_combos = _int_column(max_combos)
+    map_max_combos = _int_column(map_max_combos)
+
+    no_miss = miss_counts == 0
+    has_map_combo = map_max_combos > 0
+    is_pfc = no_miss & has_map_combo & (max_combos == map_max_combos)
+
+    combo_diff = map_max_combos - max_combos
+    thresholds = np.minimum((map_max_combos * FC_PERCENT_THRESHOLD).astype(np.int64), FC_ABSOLUTE_THRESHOLD)
+    within_threshold = has_map_combo & (combo_diff >= 0) & (combo_diff <= thresholds)
+
+    is_ss = np.isin(ranks, SS_RANKS)
+    is_fail = ranks == 'F'
+    is_fc = no_miss & ~is_fail & (is_ss | within_threshold)
+
+    return is_fc, is_pfc
+
+def effective_stars_batch(stars, accs, max_combos, map_max_combos):
+    """Vectorized calculate_effective_stars."""
+    stars = np.asarray(stars, dtype=np.float64)
+    accs = np.asarray(accs, dtype=np.float64)
+    max_combos = _int_column(max_combos)
+    map_max_combos = _int_column(map_max_combos)
+
+    combo_ratio = np.ones_like(stars)
+    has_map_combo = map_max_combos > 0
+    combo_ratio[has_map_combo] = max_combos[has_map_combo] / map_max_combos[has_map_combo]
+    return stars * (accs ** 3) * combo_ratio
+
+def mod_group_batch(mod_bits):
+    """Vectorized get_mod_group over stored bitmasks: indexes into MASTERY_GROUPS."""
+    bits = _int_column(mod_bits)
+    return np.select(
+        [bits & (MOD_BITS['DT'] | MOD_BITS['NC']) != 0, bits & MOD_BITS['HR'] != 0,
+         bits & MOD_BITS['HD'] != 0, bits & MOD_BITS['FL'] != 0],
+        [MASTERY_GROUPS.index(g) for g in ('DT', 'HR', 'HD', 'FL')],
+        default=MASTERY_GROUPS.index('NM')
+    ).astype(np.int8)
+
+def _int_column(values):
+    return np.array([v if v is not None else 0 for v in values], dtype=np.int64)
@@ -0,0 +1,51 @@
+# sync_lock.py
+
+# Single-flight score ingest per user. process_session_logic fetches the recent plays
+# (and beatmap / difficulty lookups) from osu! without an open transaction, then takes a
+# transaction-level Postgres advisory lock on (SYNC_LOCK_NAMESPACE, user_id) for the
+# short write transaction, so two tabs / gunicorn workers / hosts can't ingest the same
+# plays at once and no connection sits idle in a transaction while osu! responds.
+# Two polls at the same moment can both call osu!; the one that waited for the lock
+# serves what the other stored. The lock is released automatically on commit, rollback
+# or a dropped connection.
+
+# First key of the two-key advisory lock, so sync locks can't collide with other advisory locks
+SYNC_LOCK_NAMESPACE = 7_300_002
+# How long a second request waits for the running sync before giving up
+SYNC_WAIT_SECONDS = 5
+# Syncs finishing closer together than this are served from the database instead of calling osu! again
+MIN_SYNC_INTERVAL_SECONDS = 5
+
+SYNC_ACQUIRED = 'acquired'   # we are the only sync running; go ahead
+SYNC_WAITED = 'waited'       # another sync finished while we waited; reuse its result
+SYNC_BUSY = 'busy'           # another sync is still running; serve current state
+
+def acquire_sync_lock(cur, user_id, wait_seconds=SYNC_WAIT_SECONDS):
+    """Takes the user's sync lock for the current transaction. Returns one of the SYNC_* values."""
+    cur.execute("SELECT pg_try_advisory_xact_lock(%s, %s)", (SYNC_LOCK_NAMESPACE, user_id))
+    if cur.fetchone()[0]:
+        return SYNC_ACQUIRED
+
+    cur.execute("SAVEPOINT sync_lock_wait")
+    cur.execute("SELECT set_config('lock_timeout', %s, true)", (f"{int(wait_seconds * 1000)}ms",))
+    try:
+        cur.execute("SELECT pg_advisory_xact_lock(%s, %s)", (SYNC_LOCK_NAMESPACE, user_id))
+    except Exception as e:
+        if getattr(e, 'pgcode', None) != '55P03':  # lock_not_available
+            raise
+        cur.execute("ROLLBACK TO SAVEPOINT sync_lock_wait")
+        return SYNC_BUSY
+    cur.execute("RELEASE SAVEPOINT sync_lock_wait")
+    cur.execute("SELECT set_config('lock_timeout', '0', true)")
+    return SYNC_WAITED
+
+def synced_recently(cur, user_id, interval=MIN_SYNC_INTERVAL_SECONDS):
+    cur.execute("""
+        SELECT last_synced_at > CURRENT_TIMESTAMP - make_interval(secs => %s)
+        FROM osu_users WHERE user_id = %s
+    """, (interval, user_id))
+    row = cur.fetchone()
+    return bool(row and row[0])
+
+def mark_synced(cur, user_id):
+    cur.execute("UPDATE osu_users SET last_synced_at = CURRENT_TIMESTAMP WHERE user_id = %s", (user_id,))
@@ -0,0 +1,23 @@
+# The app modules live at the repository root
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+
+@pytest.fixture
+def db_cursor():
+    """A cursor in a scratch schema on TEST_DATABASE_URL, rolled back afterwards. Skips without it."""
+    url = os.getenv('TEST_DATABASE_URL')
+    if not url:
+        pytest.skip("TEST_DATABASE_URL is not set")
+    import psycopg2
+    conn = psycopg2.connect(url)
+    cur = conn.cursor()
+    cur.execute("CREATE SCHEMA test_scratch; SET LOCAL search_path TO test_scratch; SET LOCAL TimeZone TO 'UTC';")
+    try:
+        yield cur
+    finally:
+        conn.rollback()
+        conn.close()
@@ -0,0 +1,81 @@
+# Tests for the beatmap search result cache (beatmap_search._cached): complete result
+# sets answer longer queries in memory, truncated or expired ones go to the database.
+import pytest
+import beatmap_search
+from beatmap_search import SEARCH_COLUMNS, SEARCH_FETCH_ROWS, search_beatmaps
+
+class FakeCursor:
+    """Returns the same beatmap rows for every query and records what was executed."""
+
+    def __init__(self, rows):
+        self.rows = rows
+        self.queries = []
+
+    def execute(self, sql, params=None):
+        self.queries.append(params)
+
+    def fetchall(self):
+        return self.rows
+
+def beatmap(beatmap_id, title, artist='xi', version='Insane'):
+    return (beatmap_id, title, artist, version, 5.0, 10)
+
+@pytest.fixture(autouse=True)
+def fresh_cache(monkeypatch):
+    beatmap_search._search_cache.clear()
+    monkeypatch.setattr(beatmap_search, '_trigram_index', True)
+
+def titles(rows):
+    return [r['title'] for r in rows]
+
+def test_longer_query_narrows_a_complete_result_set():
+    cur = FakeCursor([beatmap(1, 'Blue Zenith'), beatmap(2, 'Blue Bird', artist='Ikimono'), beatmap(3, 'Bluest Sky')])
+    assert len(search_beatmaps(cur, 'blue')) == 3
+    assert titles(search_beatmaps(cur, 'Blue  ZEN')) == ['Blue Zenith']
+    # Words match anywhere in "artist title version", in any order
+    assert titles(search_beatmaps(cur, 'blue ikimono')) == ['Blue Bird']
+    assert titles(search_beatmaps(cur, 'bluest')) == ['Bluest Sky']
+    assert len(cur.queries) == 1
+    # The narrowed set is cached under its own key
+    assert ('words', 'blue zen') in beatmap_search._search_cache
+
+def test_prefix_mode_narrows_on_titles(monkeypatch):
+    monkeypatch.setattr(beatmap_search, '_trigram_index', False)
+    cur = FakeCursor([beatmap(1, 'Blue Zenith'), beatmap(2, 'Zenith Blue')])
+    search_beatmaps(cur, 'b')
+    assert titles(search_beatmaps(cur, 'blue z')) == ['Blue Zenith']
+    assert len(cur.queries) == 1
+
+def test_truncated_result_set_is_not_narrowed():
+    cur = FakeCursor([beatmap(i, f'Blue {i}') for i in range(SEARCH_FETCH_ROWS)])
+    search_beatmaps(cur, 'blue')
+    search_beatmaps(cur, 'blue 7')
+    # A full page may be missing matches for the longer query
+    assert len(cur.queries) == 2
+
+def test_expired_prefix_is_not_used(monkeypatch):
+    cur = FakeCursor([beatmap(1, 'Blue Zenith')])
+    now = 1_000_000.0
+    monkeypatch.setattr(beatmap_search.time, 'time', lambda: now)
+    search_beatmaps(cur, 'blue')
+    now += beatmap_search.SEARCH_CACHE_TTL_SECONDS + 1
+    search_beatmaps(cur, 'blue zen')
+    assert len(cur.queries) == 2
+
+def test_narrowed_entry_keeps_the_original_age(monkeypatch):
+    cur = FakeCursor([beatmap(1, 'Blue Zenith')])
+    now = 1_000_000.0
+    monkeypatch.setattr(beatmap_search.time, 'time', lambda: now)
+    search_beatmaps(cur, 'blue')
+    now += beatmap_search.SEARCH_CACHE_TTL_SECONDS - 1
+    search_beatmaps(cur, 'blue zen')
+    now += 2
+    # Narrowing must not extend the life of data fetched for the shorter query
+    search_beatmaps(cur, 'blue zen')
+    assert len(cur.queries) == 2
+
+def test_beatmap_id_lookup_bypasses_cache():
+    cur = FakeCursor([beatmap(129891, 'FREEDOM DiVE')])
+    assert search_beatmaps(cur, ' 129891 ')[0] == dict(zip(SEARCH_COLUMNS, beatmap(129891, 'FREEDOM DiVE')))
+    assert cur.queries == [(129891,)]
+    assert len(beatmap_search._search_cache) == 0
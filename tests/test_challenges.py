@@ -0,0 +1,96 @@
+# Tests for group challenges (challenges.py): a member's ingest batch, and the
+# compaction of challenge_deltas into the member and group totals. The compaction
+# tests run against a real database: set TEST_DATABASE_URL to a scratch Postgres.
+import pytest
+import challenges
+from challenges import ChallengeBatch, compact_challenge, compact_challenges, create_challenge_tables, get_standings
+from goal_progress import goal_facts
+
+def facts(stars=5.0, is_fc=False, rank='S'):
+    return goal_facts(1, stars, 0.97, is_fc, rank, 0, 100, 500, 120, 0)
+
+class FakeCursor:
+    """Just enough of a cursor for ChallengeBatch.__init__."""
+
+    def __init__(self, rows):
+        self.rows = rows
+
+    def execute(self, sql, params=None):
+        pass
+
+    def fetchall(self):
+        return self.rows
+
+@pytest.fixture(autouse=True)
+def fresh_standings():
+    challenges._standings_cache.clear()
+
+def test_batch_counts_successful_plays_per_challenge(monkeypatch):
+    inserted = []
+    monkeypatch.setattr(challenges, 'execute_values', lambda cur, sql, rows: inserted.extend(rows))
+    # id, criteria
+    batch = ChallengeBatch(FakeCursor([(1, {'type': 'fc', 'min_stars': 6}), (2, {'type': 'pass'}), (3, None)]), 7)
+    for play in (facts(6.5, is_fc=True), facts(6.5), facts(4.0, is_fc=True), facts(rank='F')):
+        batch.apply(play)
+    # No criteria: every play counts, failed ones included
+    assert [c['delta'] for c in batch.challenges] == [1, 3, 4]
+    assert batch.flush() == [1, 2, 3]
+    assert inserted == [(1, 7, 1), (2, 7, 3), (3, 7, 4)]
+
+def test_batch_without_progress_writes_nothing(monkeypatch):
+    monkeypatch.setattr(challenges, 'execute_values', lambda *args: pytest.fail("nothing to insert"))
+    batch = ChallengeBatch(FakeCursor([(1, {'type': 'fc'})]), 7)
+    batch.apply(facts())
+    assert batch.flush() == []
+
+@pytest.fixture
+def challenge(db_cursor):
+    cur = db_cursor
+    cur.execute("CREATE TABLE osu_users (user_id BIGINT PRIMARY KEY, username TEXT)")
+    cur.execute("INSERT INTO osu_users VALUES (1, 'a'), (2, 'b'), (3, 'c')")
+    create_challenge_tables(cur)
+    cur.execute("INSERT INTO challenges (title, criteria, target, join_code, created_by) VALUES ('c', '{}', 10, 'code', 1) RETURNING id")
+    challenge_id = cur.fetchone()[0]
+    cur.executemany("INSERT INTO challenge_members (challenge_id, user_id) VALUES (%s, %s)", [(challenge_id, u) for u in (1, 2, 3)])
+    return cur, challenge_id
+
+def _add_deltas(cur, challenge_id, deltas):
+    cur.executemany("INSERT INTO challenge_deltas (challenge_id, user_id, delta) VALUES (%s, %s, %s)",
+                    [(challenge_id, user_id, delta) for user_id, delta in deltas])
+
+def _totals(cur, challenge_id):
+    cur.execute("SELECT user_id, contributed FROM challenge_members WHERE challenge_id = %s ORDER BY user_id", (challenge_id,))
+    members = cur.fetchall()
+    cur.execute("SELECT progress, is_completed, completed_at IS NOT NULL FROM challenges WHERE id = %s", (challenge_id,))
+    return members, cur.fetchone()
+
+def test_compaction_folds_deltas_into_totals(challenge):
+    cur, challenge_id = challenge
+    _add_deltas(cur, challenge_id, [(1, 2), (2, 1), (1, 3)])
+    assert compact_challenge(cur, challenge_id) == 3
+    assert _totals(cur, challenge_id) == ([(1, 5), (2, 1), (3, 0)], (6, False, False))
+    # Nothing pending: a second run changes nothing
+    assert compact_challenge(cur, challenge_id) == 0
+    assert _totals(cur, challenge_id)[1] == (6, False, False)
+
+def test_compaction_completes_at_target(challenge):
+    cur, challenge_id = challenge
+    _add_deltas(cur, challenge_id, [(1, 6), (3, 4)])
+    assert compact_challenges(cur) == 2
+    assert _totals(cur, challenge_id) == ([(1, 6), (2, 0), (3, 4)], (10, True, True))
+    cur.execute("SELECT COUNT(*) FROM challenge_deltas")
+    assert cur.fetchone()[0] == 0
+
+def test_standings_add_pending_deltas_to_compacted_totals(challenge):
+    cur, challenge_id = challenge
+    _add_deltas(cur, challenge_id, [(1, 2), (2, 5)])
+    compact_challenge(cur, challenge_id)
+    _add_deltas(cur, challenge_id, [(1, 4)])
+    # A member who left keeps what they contributed
+    cur.execute("UPDATE challenge_members SET left_at = CURRENT_TIMESTAMP WHERE user_id = 2")
+    standings = get_standings(cur, challenge_id)
+    assert [(m['user_id'], m['contributed'], m['active']) for m in standings['members']] == [(1, 6, True), (2, 5, False), (3, 0, True)]
+    assert (standings['total'], standings['is_completed']) == (11, True)
+    # ... and compaction agrees with what readers were shown
+    compact_challenge(cur, challenge_id)
+    assert _totals(cur, challenge_id) == ([(1, 6), (2, 5), (3, 0)], (11, True, True))
@@ -0,0 +1,86 @@
+# Tests for the predetermined-goal rule engine (goal_engine.py): filters, the four
+# evaluator kinds and the compiled RULES for goals_definitions.PREDETERMINED_GOALS.
+import pytest
+from goal_engine import (
+    RULES, CountEvaluator, SingleEvaluator, StreakEvaluator, SumEvaluator, compile_filters, compile_rule, score_facts,
+)
+from goals_definitions import PREDETERMINED_GOALS
+
+def facts(stars=5.0, acc=0.97, is_fc=False, is_pfc=False, rank='S', mods=(), max_combo=500, map_length=120, score_id=1):
+    return score_facts(score_id, stars, acc, is_fc, is_pfc, rank, list(mods), max_combo, map_length)
+
+def run(evaluator, plays):
+    state = evaluator.initial_state()
+    for play in plays:
+        state = evaluator.update(state, play)
+    return evaluator.progress(state)
+
+@pytest.mark.parametrize('filters, play, expected', [
+    ({}, facts(), True),
+    ({'fc': True}, facts(is_fc=True), True),
+    ({'fc': True}, facts(), False),
+    ({'pfc': True}, facts(is_fc=True), False),
+    ({'pass': True}, facts(rank='F'), False),
+    ({'pass': True}, facts(rank='D'), True),
+    ({'ss': True}, facts(rank='XH'), True),
+    ({'ss': True}, facts(rank='S'), False),
+    ({'min_stars': 5.0}, facts(stars=5.0), True),
+    ({'min_stars': 5.0}, facts(stars=4.99), False),
+    ({'min_acc': 99.0}, facts(acc=0.99), True),
+    ({'min_acc': 99.0}, facts(acc=0.989), False),
+    ({'min_combo': 1000}, facts(max_combo=999), False),
+    ({'min_length': 180}, facts(map_length=180), True),
+    ({'mods_include': ['DT']}, facts(mods=['HD', 'DT']), True),
+    ({'mods_include': ['DT']}, facts(mods=['NC']), True),        # NC counts as DT
+    ({'mods_include': ['HD', 'DT']}, facts(mods=['DT']), False),
+    ({'mods_exact': ['DT']}, facts(mods=['HD', 'DT']), False),
+    ({'mods_exact': ['HD', 'DT']}, facts(mods=['DT', 'HD']), True),
+    ({'mods_exact': []}, facts(), True),
+    ({'fc': True, 'min_stars': 6.0}, facts(is_fc=True, stars=5.5), False),
+])
+def test_filters(filters, play, expected):
+    assert compile_filters(filters)(play) is expected
+
+def test_missing_facts_count_as_zero():
+    play = score_facts(1, None, None, None, None, None, [], None, None)
+    assert compile_filters({'min_stars': 0, 'min_combo': 0})(play)
+    assert not compile_filters({'min_acc': 1})(play)
+
+def test_count_evaluator():
+    evaluator = CountEvaluator(3, compile_filters({'fc': True}))
+    assert run(evaluator, [facts(is_fc=True), facts(), facts(is_fc=True)]) == 2
+
+def test_streak_evaluator_keeps_best_run():
+    evaluator = StreakEvaluator(5, compile_filters({'fc': True}))
+    plays = [facts(is_fc=True)] * 3 + [facts()] + [facts(is_fc=True)] * 2
+    state = evaluator.initial_state()
+    for play in plays:
+        state = evaluator.update(state, play)
+    assert state == {'current': 2, 'best': 3}
+    assert evaluator.progress(state) == 3
+
+def test_single_evaluator():
+    evaluator = SingleEvaluator(7, compile_filters({'ss': True}))
+    assert evaluator.target == 1
+    assert run(evaluator, [facts(), facts(rank='X'), facts()]) == 1
+    assert run(evaluator, [facts()]) == 0
+
+def test_sum_evaluator():
+    evaluator = compile_rule({'kind': 'sum', 'target': 600, 'filters': {'pass': True}})
+    assert isinstance(evaluator, SumEvaluator)
+    assert run(evaluator, [facts(map_length=200), facts(map_length=300, rank='F'), facts(map_length=250)]) == 450
+
+def test_every_predetermined_goal_compiles():
+    assert set(RULES) == {goal['logic_key'] for goal in PREDETERMINED_GOALS}
+
+@pytest.mark.parametrize('logic_key, plays, progress', [
+    ('fc_streak_5', [facts(is_fc=True)] * 5, 5),
+    ('fc_streak_5', [facts(is_fc=True)] * 4 + [facts()], 4),
+    ('accumulate_5star_10', [facts(is_fc=True, stars=5.2), facts(is_fc=True, stars=4.9), facts(stars=6)], 1),
+    ('single_acc_99', [facts(acc=0.995, stars=3.9)], 0),
+    ('single_acc_99', [facts(acc=0.995, stars=4.0)], 1),
+    ('pass_dt_6star', [facts(mods=['NC', 'HD'], stars=6.5)], 1),
+    ('pass_dt_6star', [facts(mods=['DT'], stars=6.5, rank='F')], 0),
+])
+def test_predetermined_rules(logic_key, plays, progress):
+    assert run(RULES[logic_key], plays) == progress
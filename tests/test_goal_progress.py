@@ -0,0 +1,111 @@
+# Tests for custom goal progress (goal_progress.py): criteria evaluation, the exact /
+# contains mod rules, the streak break rules and streak state across ingest batches.
+import pytest
+from goal_progress import GoalBatch, advance_streak, criteria_mod_bits, evaluate_criteria, goal_facts
+from scoring import MOD_BITS
+
+def facts(score_id=1, stars=5.0, acc=0.97, is_fc=False, rank='S', mod_bits=0, beatmap_id=100, max_combo=500,
+          map_length=120, played_at=0):
+    return goal_facts(score_id, stars, acc, is_fc, rank, mod_bits, beatmap_id, max_combo, map_length, played_at)
+
+class FakeCursor:
+    """Just enough of a cursor for GoalBatch.__init__ (no flush)."""
+
+    def __init__(self, rows):
+        self.rows = rows
+
+    def execute(self, sql, params=None):
+        pass
+
+    def fetchall(self):
+        return self.rows
+
+@pytest.mark.parametrize('criteria, play, expected', [
+    ({}, facts(), (True, True)),
+    ({'min_stars': 5.5}, facts(stars=5.4), (False, False)),
+    ({'min_stars': 5.5}, facts(stars=5.5), (True, True)),
+    ({'beatmap_id': '100'}, facts(), (True, True)),
+    ({'beatmap_id': 101}, facts(), (False, False)),
+    ({'use_length': True, 'map_length': 180}, facts(map_length=179), (False, False)),
+    # Combo and accuracy are about meeting the goal, not about the map: eligible but not a success
+    ({'use_combo': True, 'min_combo': 600}, facts(max_combo=599), (True, False)),
+    ({'use_acc': True, 'acc_needed': 98}, facts(acc=0.979), (True, False)),
+    ({'use_acc': True, 'acc_needed': 98}, facts(acc=0.98), (True, True)),
+    ({'type': 'pass'}, facts(rank='F'), (True, False)),
+    ({'type': 'pass'}, facts(rank='D'), (True, True)),
+    ({'type': 'fc'}, facts(), (True, False)),
+    ({'type': 'fc'}, facts(is_fc=True), (True, True)),
+    ({'type': 'ss'}, facts(rank='XH'), (True, True)),
+    ({'type': 'ss'}, facts(rank='S'), (True, False)),
+])
+def test_evaluate_criteria(criteria, play, expected):
+    assert evaluate_criteria(criteria, play) == expected
+
+HD, HR, DT, NC, SD, PF = (MOD_BITS[m] for m in ('HD', 'HR', 'DT', 'NC', 'SD', 'PF'))
+
+@pytest.mark.parametrize('criteria, mod_bits, eligible', [
+    ({'mod_combination': 'DTHD'}, HD | DT, True),
+    ({'mod_combination': 'DTHD'}, HD | NC, False),                 # exact means exact: NC is not DT ...
+    ({'mod_combination': 'NCHD'}, HD | NC, True),
+    ({'mod_combination': 'DTHD'}, HD | DT | HR, False),            # exact is the default
+    ({'mod_combination': 'DTHD'}, DT, False),
+    ({'mod_combination': 'DTHD', 'mod_match': 'exact'}, HD | DT, True),
+    ({'mod_combination': 'DTHD', 'mod_match': 'contains'}, HD | DT | HR, True),
+    ({'mod_combination': 'DTHD', 'mod_match': 'contains'}, HD | NC, True),   # ... but NC contains DT
+    ({'mod_combination': 'DTHD', 'mod_match': 'contains'}, DT, False),
+    ({'mod_combination': 'SD', 'mod_match': 'contains'}, PF | HD, True),   # PF implies SD
+    ({'mod_combination': 'NM'}, 0, True),
+    ({'mod_combination': 'NM'}, HD, False),
+    ({'mod_combination': 'Any'}, HD | DT | HR, True),
+    ({'mod_combination': 'HR', 'mod_bits': DT}, DT, True),         # the stored bitmask wins
+    # Older goals only have the single mastery group
+    ({'mod': 'DT'}, NC | HD, True),
+    ({'mod': 'DT'}, HR, False),
+    ({'mod': 'HR'}, HR | DT, False),                                # DT outranks HR
+    ({'mod': 'Any'}, HR, True),
+    ({'mod': 'HR', 'mod_combination': 'Any'}, DT, False),          # 'Any' combination falls back to mod
+])
+def test_mod_rules(criteria, mod_bits, eligible):
+    assert evaluate_criteria(criteria, facts(mod_bits=mod_bits))[0] is eligible
+
+def test_criteria_mod_bits():
+    assert criteria_mod_bits({'mod_combination': 'DTHD'}) == HD | DT
+    assert criteria_mod_bits({'mod_combination': 'NCHD'}) == HD | NC | DT
+    assert criteria_mod_bits({'mod_combination': 'NM'}) == 0
+    assert criteria_mod_bits({'mod_bits': HR, 'mod_combination': 'DT'}) == HR
+
+@pytest.mark.parametrize('state, eligible, success, break_on, expected', [
+    ((2, 2), True, True, 'any_play', (3, 3)),
+    ((2, 5), True, True, 'any_play', (3, 5)),
+    ((2, 2), True, False, 'any_play', (0, 2)),
+    ((2, 2), False, False, 'any_play', (0, 2)),           # any play that misses the goal breaks it
+    ((2, 2), False, False, 'matching_play', (2, 2)),      # ... unless only matching maps count
+    ((2, 2), True, False, 'matching_play', (0, 2)),
+])
+def test_advance_streak(state, eligible, success, break_on, expected):
+    assert advance_streak(*state, eligible, success, break_on) == expected
+
+def _streak_batch(criteria, streak_current=0, streak_best=0, last_score_id=None):
+    # id, current_progress, target_progress, criteria, is_paused, streak_current, streak_best, streak_last_score_id, window_state
+    return GoalBatch(FakeCursor([(1, streak_current, 5, criteria, False, streak_current, streak_best, last_score_id, None)]), 7)
+
+def test_streak_batch_counts_runs_and_skips_seen_scores():
+    batch = _streak_batch({'type': 'fc', 'streak': True}, streak_current=2, streak_best=2, last_score_id=10)
+    for play in (facts(9, is_fc=True), facts(10, is_fc=True), facts(11, is_fc=True), facts(12), facts(13, is_fc=True)):
+        batch.apply(play)
+    goal = batch.goals[0]
+    # 9 and 10 were already counted; 11 extends the run to 3, 12 breaks it, 13 starts a new one
+    assert (goal['streak_current'], goal['streak_best'], goal['streak_last_score_id']) == (1, 3, 13)
+    assert goal['progress'] == 1
+    assert batch.contributions == [(1, 11, 7), (1, 13, 7)]
+
+def test_streak_batch_matching_play_rule():
+    batch = _streak_batch({'type': 'fc', 'min_stars': 6, 'streak': True, 'streak_break': 'matching_play'})
+    for play in (facts(1, stars=6.2, is_fc=True), facts(2, stars=4.0), facts(3, stars=6.5, is_fc=True)):
+        batch.apply(play)
+    assert (batch.goals[0]['streak_current'], batch.goals[0]['streak_best']) == (2, 2)
+
+def test_paused_goal_ignores_plays():
+    batch = GoalBatch(FakeCursor([(1, 0, 5, {'type': 'fc', 'streak': True}, True, 3, 3, None, None)]), 7)
+    batch.apply(facts(1))
+    assert batch.goals[0]['streak_current'] == 3 and not batch.goals[0]['changed']
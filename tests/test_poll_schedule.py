@@ -0,0 +1,18 @@
+# Tests for the server-directed poll interval tiers (poll_schedule.next_poll_seconds).
+import pytest
+import poll_schedule
+
+@pytest.mark.parametrize('idle, headroom, inflight, expected', [
+    (0, 1.0, 0, 20),
+    (10 * 60 - 1, 1.0, 0, 20),
+    (10 * 60, 1.0, 0, 45),
+    (30 * 60, 1.0, 0, 90),
+    (2 * 3600, 1.0, 0, poll_schedule.DORMANT_POLL_SECONDS),
+    (None, 1.0, 0, poll_schedule.DORMANT_POLL_SECONDS),
+    (0, 0.2, 0, 40),                                     # low headroom: x2
+    (0, 0.05, 0, 80),                                    # critical headroom: x4
+    (0, 1.0, poll_schedule.BUSY_INFLIGHT + 1, 40),       # busy worker: x2
+    (None, 0.05, poll_schedule.BUSY_INFLIGHT + 1, poll_schedule.MAX_POLL_SECONDS),
+])
+def test_next_poll_seconds(idle, headroom, inflight, expected):
+    assert poll_schedule.next_poll_seconds(idle, headroom=headroom, inflight=inflight) == expected
@@ -0,0 +1,34 @@
+# Tests for the mergeable quantile sketch (quantiles.QuantileSketch): serialization
+# and the relative error bound, including after merging.
+import random
+import pytest
+from quantiles import RELATIVE_ERROR, QuantileSketch
+
+def _sketch(values):
+    sketch = QuantileSketch()
+    for value in values:
+        sketch.add(value)
+    return sketch
+
+def test_quantile_sketch_round_trip():
+    rng = random.Random(32)
+    # Values below 1 (negative bin indexes) and zeros exercise the zigzag encoding and zero count
+    sketch = _sketch([rng.uniform(0, 2) for _ in range(2000)] + [0.0] * 50 + [rng.uniform(100, 1e6) for _ in range(50)])
+    restored = QuantileSketch.from_bytes(sketch.to_bytes())
+    assert restored.bins == sketch.bins
+    assert restored.zero_count == sketch.zero_count == 50
+    assert restored.count == sketch.count
+    assert QuantileSketch.from_bytes(None).count == 0
+
+@pytest.mark.parametrize('q', [0.0, 0.01, 0.1, 0.25, 0.5, 0.75, 0.9, 0.99, 1.0])
+def test_quantile_sketch_error_bound(q):
+    rng = random.Random(7)
+    values = [rng.lognormvariate(0, 1.5) for _ in range(10000)]
+    expected = sorted(values)[int(q * (len(values) - 1))]
+    # Splitting across sketches and merging gives the same result
+    merged = _sketch(values[:3000]).merge(_sketch(values[3000:]))
+    assert abs(merged.quantile(q) - expected) <= RELATIVE_ERROR * expected
+    assert merged.quantile(q) == _sketch(values).quantile(q)
+
+def test_quantile_sketch_empty():
+    assert QuantileSketch().quantile(0.5) is None
@@ -0,0 +1,52 @@
+# Tests for rank history sampling and the tiered compaction (rank_history.py).
+# These run against a real database: set TEST_DATABASE_URL to a scratch Postgres.
+from datetime import timedelta
+from rank_history import RANK_HISTORY_TIERS, compact_rank_history, create_rank_history_table, record_rank
+
+def _truncate(ts, unit):
+    if unit == 'hour':
+        return ts.replace(minute=0, second=0, microsecond=0)
+    day = ts.replace(hour=0, minute=0, second=0, microsecond=0)
+    return day if unit == 'day' else day - timedelta(days=day.weekday())
+
+def _expected_survivors(samples, now):
+    """A sample survives if it is the last one in its bucket of the coarsest tier its age falls in."""
+    kept = []
+    for ts in samples:
+        tiers = [unit for age, unit in RANK_HISTORY_TIERS if ts < now - age]
+        if not tiers or not any(other > ts and _truncate(other, tiers[-1]) == _truncate(ts, tiers[-1]) for other in samples):
+            kept.append(ts)
+    return kept
+
+def test_compaction_keeps_last_sample_per_tier_bucket(db_cursor):
+    cur = db_cursor
+    create_rank_history_table(cur)
+    cur.execute("SELECT LOCALTIMESTAMP")
+    now = cur.fetchone()[0]
+    # One sample every 37 minutes for 120 days
+    samples = [now - timedelta(minutes=37 * i) for i in range(120 * 24 * 60 // 37, 0, -1)]
+    cur.executemany("INSERT INTO rank_history (user_id, sampled_at, global_rank) VALUES (1, %s, %s)",
+                    [(ts, 1000 + i) for i, ts in enumerate(samples)])
+    cur.execute("INSERT INTO rank_history (user_id, sampled_at, global_rank) VALUES (2, %s, 5)", (samples[0],))
+
+    compact_rank_history(cur, 1)
+
+    cur.execute("SELECT sampled_at FROM rank_history WHERE user_id = 1 ORDER BY sampled_at")
+    kept = [row[0] for row in cur.fetchall()]
+    assert kept == _expected_survivors(samples, now)
+    # The last day is untouched, and the thinning is substantial
+    assert [ts for ts in kept if ts >= now - timedelta(days=1)] == [ts for ts in samples if ts >= now - timedelta(days=1)]
+    assert len(kept) < len(samples) // 5
+    # Other users' rows are left alone
+    cur.execute("SELECT COUNT(*) FROM rank_history WHERE user_id = 2")
+    assert cur.fetchone()[0] == 1
+
+def test_record_rank_only_stores_changes(db_cursor):
+    cur = db_cursor
+    create_rank_history_table(cur)
+    assert not record_rank(cur, 1, None)
+    assert not record_rank(cur, 1, 0)
+    assert record_rank(cur, 1, 500)
+    assert not record_rank(cur, 1, 500)
+    cur.execute("SELECT global_rank FROM rank_history WHERE user_id = 1")
+    assert cur.fetchall() == [(500,)]
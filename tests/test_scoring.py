@@ -0,0 +1,86 @@
+# The batch scoring API (classify_fc_batch, effective_stars_batch, mod_group_batch)
+# must classify exactly like the scalar helpers live ingest uses; the mod bitmask
+# helpers must round-trip the stored combinations.
+import random
+import numpy as np
+import pytest
+from scoring import (
+    MASTERY_GROUPS, MOD_BITS, bitmask_to_combination, bitmask_to_mods, calculate_effective_stars, classify_fc,
+    classify_fc_batch, combination_to_bitmask, difficulty_mod_bitmask, effective_stars_batch, get_mod_group,
+    matching_bits, matching_mod_bitmask, mod_group_batch, mods_to_bitmask, parse_mod_combination,
+)
+
+# (score_rank, miss_count, max_combo, map_max_combo)
+FC_CASES = [
+    ('S', 0, 1000, 1000),      # PFC
+    ('A', 0, 970, 1000),       # at the 30 combo threshold
+    ('A', 0, 969, 1000),       # one past it: slider break
+    ('S', 0, 98, 100),         # 3% of a short map
+    ('S', 0, 96, 100),
+    ('A', 1, 1000, 1000),      # a miss is never an FC
+    ('X', 0, 500, 510),        # SS is always an FC
+    ('XH', 0, 500, None),      # ... even without the map combo
+    ('XH', 2, 500, 510),       # ... unless it has misses
+    ('S', 0, 500, None),       # NULL map combo: only SS can be an FC
+    ('S', 0, 500, 0),
+    ('S', None, None, None),
+    ('F', 0, 1000, 1000),      # failed plays are never FCs
+    ('F', 0, 500, None),
+    ('S', 0, 1010, 1000),      # combo over the map max
+    ('X', 0, 1010, 1000),
+]
+
+def test_classify_fc_batch_matches_scalar():
+    is_fc, is_pfc = classify_fc_batch(*zip(*FC_CASES))
+    for i, case in enumerate(FC_CASES):
+        assert (bool(is_fc[i]), bool(is_pfc[i])) == classify_fc(*case), case
+
+def test_classify_fc_batch_random():
+    rng = random.Random(26)
+    cases = []
+    for _ in range(5000):
+        map_combo = rng.choice([None, 0, rng.randint(1, 3000)])
+        combo = rng.randint(0, (map_combo or 1000) + 5)
+        cases.append((rng.choice(['XH', 'X', 'SH', 'S', 'A', 'B', 'C', 'D', 'F']),
+                      rng.choice([None, 0, 0, 0, 1, 5]), combo, map_combo))
+    is_fc, is_pfc = classify_fc_batch(*zip(*cases))
+    assert [(bool(a), bool(b)) for a, b in zip(is_fc, is_pfc)] == [classify_fc(*c) for c in cases]
+
+# (stars, acc, max_combo, map_max_combo)
+EFFECTIVE_STARS_CASES = [
+    (6.5, 0.98, 1000, 1000),
+    (6.5, 0.98, 500, 1000),
+    (4.2, 0.9, 300, None),     # NULL map combo: no combo ratio
+    (4.2, 0.9, 300, 0),
+    (5.0, 1.0, 1010, 1000),    # combo over the map max
+    (0.0, 0.5, 10, 20),
+]
+
+def test_effective_stars_batch_matches_scalar():
+    batch = effective_stars_batch(*zip(*EFFECTIVE_STARS_CASES))
+    expected = [calculate_effective_stars(*case) for case in EFFECTIVE_STARS_CASES]
+    np.testing.assert_allclose(batch, expected, rtol=1e-12)
+
+def test_mod_group_batch_matches_scalar():
+    bits = [0]
+    for mods in (('HD',), ('HR',), ('DT',), ('NC',), ('FL',), ('HD', 'DT'), ('HD', 'HR'), ('HR', 'DT'),
+                 ('HD', 'FL'), ('NC', 'HD', 'FL'), ('EZ', 'NF'), ('SD', 'PF')):
+        bits.append(sum(MOD_BITS[m] for m in mods))
+    groups = mod_group_batch(bits + [None])
+    assert [MASTERY_GROUPS[g] for g in groups] == [get_mod_group(bitmask_to_mods(b)) for b in bits] + ['NM']
+
+@pytest.mark.parametrize('mods', [[], ['HD'], ['DT', 'HD'], ['HD', 'HR', 'NC'], ['FL', 'PF', 'SD']])
+def test_bitmask_round_trip(mods):
+    bits = mods_to_bitmask(mods)
+    assert bitmask_to_mods(bits) == sorted(mods)
+    assert combination_to_bitmask(bitmask_to_combination(bits)) == bits
+
+def test_bitmask_helpers():
+    assert bitmask_to_combination(0) == 'NM' and bitmask_to_combination(None) == 'NM'
+    assert mods_to_bitmask(['HD', 'XX']) == MOD_BITS['HD']          # unknown acronyms are ignored
+    assert parse_mod_combination('DTHD') == ['DT', 'HD'] and parse_mod_combination('NM') == []
+    assert matching_mod_bitmask(['NC']) == MOD_BITS['NC'] | MOD_BITS['DT']
+    assert matching_bits(None) == 0
+    # Only difficulty-changing mods, NC folded into DT
+    assert difficulty_mod_bitmask(['HD', 'NC', 'SD']) == MOD_BITS['DT']
+    assert difficulty_mod_bitmask(['EZ', 'FL', 'NF']) == MOD_BITS['EZ'] | MOD_BITS['FL']
@@ -0,0 +1,48 @@
+# Tests for the what-if formula parser (whatif.parse_formula).
+import pytest
+import numpy as np
+from whatif import FORMULAS, LIVE_FORMULA, History, parse_formula
+
+def _history():
+    # user_ids, mod_bits, stars, acc, max_combo, map_max_combo, misses, length, is_fc
+    return History([1, 1, 2], [0, 8, 64], [5.0, 6.2, 4.1], [0.98, 0.95, 1.0], [500, 300, 800],
+                   [510, 0, 800], [0, 2, 0], [120, 90, 200], [True, False, True])
+
+def test_custom_formula_can_use_np():
+    columns = _history().columns
+    name, formula = parse_formula('x=stars * np.sqrt(acc) * np.minimum(combo_ratio, 1)')
+    assert name == 'x'
+    np.testing.assert_allclose(formula(columns), columns['stars'] * np.sqrt(columns['acc']) * np.minimum(columns['combo_ratio'], 1))
+
+def test_formula_np_functions_are_callable():
+    columns = _history().columns
+    _, formula = parse_formula('x=np.where(is_fc, np.clip(np.exp(np.log(stars)), 0, 6), np.power(acc, 2))')
+    np.testing.assert_allclose(formula(columns), np.where(columns['is_fc'], np.clip(columns['stars'], 0, 6), columns['acc'] ** 2))
+
+def test_constant_formula_broadcasts():
+    columns = _history().columns
+    assert parse_formula('flat=1.5')[1](columns).tolist() == [1.5, 1.5, 1.5]
+
+def test_builtin_formula():
+    assert parse_formula(LIVE_FORMULA) == (LIVE_FORMULA, FORMULAS[LIVE_FORMULA][1])
+
+@pytest.mark.parametrize('spec', [
+    'x=os.system',
+    'x=np.__class__',
+    'x=stars.__class__',
+    'x=np.linalg.norm(acc)',
+    'x=np.save("f", acc)',
+    'x=np.load("f")',
+    'x=np.fromfile("/etc/passwd")',
+    'x=np.memmap("f")',
+    'x=np.sqrt.__call__(acc)',
+    'x=np',
+    'x=np.sqrt(np)',
+    'x=__import__("os")',
+    'x=pp * 2',
+    'x=',
+    'nonsense',
+])
+def test_rejected_formulas(spec):
+    with pytest.raises(ValueError):
+        parse_formula(spec)
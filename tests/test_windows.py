@@ -0,0 +1,62 @@
+# Tests for the windowed goal counters (windows.py) and windowed goals in GoalBatch.
+from windows import RingCounter, window_progress
+from goal_progress import GoalBatch, goal_facts
+
+def test_ring_counter_window():
+    counter = RingCounter(3600, 24)
+    start = 1_000 * 3600
+    counter.add(start)
+    counter.add(start + 10)
+    counter.add(start + 5 * 3600)
+    assert counter.total(start + 5 * 3600) == 3
+    # The first bucket leaves the window 24 buckets later
+    assert counter.total(start + 24 * 3600) == 1
+    assert counter.total(start + 29 * 3600) == 0
+
+def test_ring_counter_ignores_plays_older_than_window():
+    counter = RingCounter(3600, 24)
+    now = 2_000 * 3600
+    counter.add(now)
+    counter.add(now - 24 * 3600)
+    counter.add(now - 23 * 3600, amount=2)
+    assert counter.total(now) == 3
+
+def test_ring_counter_state_round_trip():
+    counter = RingCounter.for_window('24h')
+    now = 3_000 * 3600
+    for hour in range(5):
+        counter.add(now - hour * 3600)
+    restored = RingCounter.for_window('24h', counter.to_state())
+    assert restored.total(now) == counter.total(now) == 5
+    # State from a different bucket size is discarded
+    assert RingCounter.for_window('7d', counter.to_state()).total(now) == 0
+
+def test_window_progress_is_read_only():
+    counter = RingCounter.for_window('24h')
+    now = 4_000 * 3600
+    counter.add(now)
+    state = counter.to_state()
+    assert window_progress({'window': '24h'}, state, now + 3600) == 1
+    assert window_progress({'window': '24h'}, state, now + 24 * 3600) == 0
+    assert state == counter.to_state()
+    assert window_progress({}, state) is None
+
+class FakeCursor:
+    def __init__(self, rows):
+        self.rows = rows
+
+    def execute(self, sql, params=None):
+        pass
+
+    def fetchall(self):
+        return self.rows
+
+def test_windowed_goal_batch():
+    criteria = {'type': 'fc', 'window': '24h'}
+    batch = GoalBatch(FakeCursor([(1, 0, 3, criteria, False, 0, 0, None, None)]), 7)
+    start = 5_000 * 3600
+    for i, (offset, is_fc) in enumerate([(0, True), (3600, False), (25 * 3600, True), (26 * 3600, True)]):
+        batch.apply(goal_facts(i + 1, 5.0, 0.97, is_fc, 'S', 0, 100, 500, 120, start + offset))
+    # The first FC dropped out of the window before the last two were played
+    assert batch.goals[0]['progress'] == 2
+    assert batch.goals[0]['window'].to_state()['bucket_seconds'] == 3600
@@ -0,0 +1,228 @@
+# token_store.py
+
+# Server-side store for the users' osu! OAuth tokens. /callback saves the access and
+# refresh tokens here (Fernet-encrypted, see TOKEN_ENCRYPTION_KEY) instead of putting
+# the access token in the session cookie, so any worker or offline job can call osu!
+# for a user, and expired tokens are refreshed instead of sending the user back
+# through the OAuth redirect.
+#
+# get_access_token() returns a token that is valid for at least REFRESH_MARGIN_SECONDS,
+# refreshing it first if needed. A worker also refreshes tokens that expire within
+# PROACTIVE_REFRESH_SECONDS in the background (refresh_in_background_if_due, or
+# maintenance.py refresh-tokens from cron), so polls rarely wait on a refresh.
+#
+# Refreshes are single-flight per user: osu! rotates the refresh token on every use,
+# so two workers refreshing at once would leave one of them with a revoked token. The
+# refresh runs in its own transaction under an advisory lock on
+# (TOKEN_LOCK_NAMESPACE, user_id); a second refresher waits for the lock, re-reads the
+# row and uses the token the first one stored.
+import os
+import time
+import base64
+import hashlib
+import threading
+import requests
+from cryptography.fernet import Fernet, MultiFernet, InvalidToken
+from osu_api import refresh_access_token
+
+# First key of the two-key advisory lock (sync_lock.py uses 7_300_002)
+TOKEN_LOCK_NAMESPACE = 7_300_004
+# How long a second refresher waits for the running refresh
+REFRESH_WAIT_SECONDS = 10
+# Tokens are refreshed on use when they expire within this
+REFRESH_MARGIN_SECONDS = 5 * 60
+# ... and in the background when they expire within this
+PROACTIVE_REFRESH_SECONDS = 60 * 60
+PROACTIVE_CHECK_SECONDS = 5 * 60
+PROACTIVE_BATCH = 100
+
+_proactive_state = {"running": False, "checked_at": 0}
+_proactive_state_lock = threading.Lock()
+_fernet = None
+
+def _cipher():
+    """
+    MultiFernet over TOKEN_ENCRYPTION_KEY (comma-separated Fernet keys: the first encrypts,
+    all decrypt, for key rotation). Without it, a key is derived from FLASK_SECRET_KEY.
+    Raises RuntimeError if neither is set.
+    """
+    global _fernet
+    if _fernet is None:
+        keys = [k.strip() for k in os.environ.get("TOKEN_ENCRYPTION_KEY", "").split(",") if k.strip()]
+        if not keys:
+            secret = os.environ.get("FLASK_SECRET_KEY")
+            if not secret:
+                raise RuntimeError("Neither TOKEN_ENCRYPTION_KEY nor FLASK_SECRET_KEY is set; osu! tokens can't be encrypted.")
+            keys = [base64.urlsafe_b64encode(hashlib.sha256(f"token-store:{secret}".encode()).digest())]
+        _fernet = MultiFernet([Fernet(k) for k in keys])
+    return _fernet
+
+def check_token_key():
+    """Raises RuntimeError now, rather than on the first login or refresh, if no token key is configured."""
+    _cipher()
+
+def encrypt(value):
+    return _cipher().encrypt(value.encode()) if value else None
+
+def decrypt(value):
+    if not value:
+        return None
+    try:
+        return _cipher().decrypt(bytes(value)).decode()
+    except InvalidToken:
+        # Encrypted with a key that is no longer configured: treat as missing (the user logs in again)
+        return None
+
+def create_token_table(cur):
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS oauth_tokens (
+            user_id BIGINT PRIMARY KEY,
+            access_token BYTEA,
+            refresh_token BYTEA,
+            expires_at TIMESTAMPTZ,
+            updated_at TIMESTAMPTZ DEFAULT CURRENT_TIMESTAMP,
+            refresh_failures INT DEFAULT 0,
+            last_error TEXT
+        );
+    """)
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_oauth_tokens_expires ON oauth_tokens (expires_at);")
+
+def save_tokens(cur, user_id, tokens):
+    """Stores a token response from osu! (access_token, refresh_token, expires_in)."""
+    cur.execute("""
+        INSERT INTO oauth_tokens (user_id, access_token, refresh_token, expires_at, updated_at, refresh_failures, last_error)
+        VALUES (%s, %s, %s, CURRENT_TIMESTAMP + make_interval(secs => %s), CURRENT_TIMESTAMP, 0, NULL)
+        ON CONFLICT (user_id) DO UPDATE SET
+            access_token = EXCLUDED.access_token,
+            refresh_token = COALESCE(EXCLUDED.refresh_token, oauth_tokens.refresh_token),
+            expires_at = EXCLUDED.expires_at, updated_at = EXCLUDED.updated_at,
+            refresh_failures = 0, last_error = NULL
+    """, (user_id, encrypt(tokens['access_token']), encrypt(tokens.get('refresh_token')),
+          int(tokens.get('expires_in', 86400))))
+
+def _read(cur, user_id):
+    """(access_token, refresh_token, seconds until expiry) or None."""
+    cur.execute("""
+        SELECT access_token, refresh_token, EXTRACT(EPOCH FROM expires_at - CURRENT_TIMESTAMP)
+        FROM oauth_tokens WHERE user_id = %s
+    """, (user_id,))
+    row = cur.fetchone()
+    if not row:
+        return None
+    return decrypt(row[0]), decrypt(row[1]), float(row[2]) if row[2] is not None else 0.0
+
+def get_access_token(cur, user_id, connect):
+    """
+    A valid access token for the user, refreshed first if it expires within
+    REFRESH_MARGIN_SECONDS, or None if there is none (the user has to log in again).
+    `cur` is only read from; a refresh commits on its own connection from `connect`.
+    """
+    stored = _read(cur, user_id)
+    if stored is None:
+        return None
+    access_token, refresh_token, expires_in = stored
+    if access_token and expires_in > REFRESH_MARGIN_SECONDS:
+        return access_token
+    refreshed = refresh_user_token(connect, user_id, REFRESH_MARGIN_SECONDS)
+    if refreshed:
+        return refreshed
+    # osu! unreachable: the old token is still good until it actually expires
+    return access_token if access_token and expires_in > 0 else None
+
+def refresh_user_token(connect, user_id, margin=REFRESH_MARGIN_SECONDS):
+    """
+    Single-flight refresh of one user's token if it expires within `margin`.
+    Returns the (possibly already refreshed) access token, or None if refreshing failed.
+    """
+    conn = connect()
+    try:
+        cur = conn.cursor()
+        cur.execute("SELECT set_config('lock_timeout', %s, true)", (f"{REFRESH_WAIT_SECONDS * 1000}ms",))
+        cur.execute("SELECT pg_advisory_xact_lock(%s, %s)", (TOKEN_LOCK_NAMESPACE, user_id))
+        # Another worker may have refreshed while we waited for the lock
+        stored = _read(cur, user_id)
+        if stored is None:
+            return None
+        access_token, refresh_token, expires_in = stored
+        if access_token and expires_in > margin:
+            return access_token
+        if not refresh_token:
+            return None
+
+        try:
+            response = refresh_access_token(refresh_token)
+        except requests.RequestException as e:
+            _record_failure(cur, user_id, str(e))
+            conn.commit()
+            return None
+        if response.status_code != 200:
+            if response.status_code in (400, 401):
+                # Revoked or already used refresh token: only a new login can fix this
+                cur.execute("UPDATE oauth_tokens SET access_token = NULL, refresh_token = NULL WHERE user_id = %s", (user_id,))
+            _record_failure(cur, user_id, f"HTTP {response.status_code}")
+            conn.commit()
+            return None
+
+        tokens = response.json()
+        save_tokens(cur, user_id, tokens)
+        conn.commit()
+        return tokens['access_token']
+    except Exception as e:
+        print(f"Token refresh failed for user {user_id}: {e}")
+        conn.rollback()
+        return None
+    finally:
+        conn.close()
+
+def _record_failure(cur, user_id, error):
+    cur.execute("UPDATE oauth_tokens SET refresh_failures = refresh_failures + 1, last_error = %s WHERE user_id = %s",
+                (error[:200], user_id))
+
+def expire_access_token(cur, user_id):
+    """osu! rejected the access token (401): the next get_access_token() refreshes it."""
+    cur.execute("UPDATE oauth_tokens SET expires_at = CURRENT_TIMESTAMP WHERE user_id = %s", (user_id,))
+
+def refresh_expiring_tokens(connect, within=PROACTIVE_REFRESH_SECONDS, limit=PROACTIVE_BATCH):
+    """Refreshes up to `limit` (None = all) tokens expiring within `within` seconds. Returns (refreshed, failed)."""
+    conn = connect()
+    cur = conn.cursor()
+    cur.execute("""
+        SELECT user_id FROM oauth_tokens
+        WHERE refresh_token IS NOT NULL AND expires_at < CURRENT_TIMESTAMP + make_interval(secs => %s)
+        ORDER BY expires_at
+        LIMIT %s
+    """, (within, limit))
+    user_ids = [r[0] for r in cur.fetchall()]
+    cur.close()
+    conn.close()
+
+    refreshed = failed = 0
+    for user_id in user_ids:
+        if refresh_user_token(connect, user_id, within):
+            refreshed += 1
+        else:
+            failed += 1
+    return refreshed, failed
+
+def refresh_in_background_if_due(connect):
+    """Runs refresh_expiring_tokens() on a daemon thread at most every PROACTIVE_CHECK_SECONDS per worker."""
+    with _proactive_state_lock:
+        now = time.time()
+        if _proactive_state["running"] or now - _proactive_state["checked_at"] < PROACTIVE_CHECK_SECONDS:
+            return
+        _proactive_state["checked_at"] = now
+        _proactive_state["running"] = True
+
+    def run():
+        try:
+            refresh_expiring_tokens(connect)
+        except Exception as e:
+            print(f"Proactive token refresh failed: {e}")
+        finally:
+            with _proactive_state_lock:
+                _proactive_state["running"] = False
+
+    threading.Thread(target=run, daemon=True).start()
+
+def delete_tokens(cur, user_id):
+    cur.execute("DELETE FROM oauth_tokens WHERE user_id = %s", (user_id,))
@@ -1,6 +1,20 @@
 import os
 import psycopg2
 from dotenv import load_dotenv
+from beatmaps import create_beatmaps_table
+from difficulty import create_attributes_table
+from analytics import ROLLUP_PERIODS, create_rollup_tables
+from leaderboards import create_leaderboard_tables
+from goal_engine import create_achievements_table
+from archive import SCORE_HISTORY_PARTITIONS, create_score_history_table, create_archive_tables, is_partitioned
+from scoring import MOD_BITS
+from rank_history import create_rank_history_table
+from beatmap_search import create_search_indexes, refresh_play_counts
+from performance import create_performance_table, rebuild_performance
+from quantiles import create_sketch_table, rebuild_sketches
+from challenges import create_challenge_tables
+from goal_reconcile import create_reconcile_tables
+from token_store import create_token_table
 
 # Ensure environment variables are loaded (like DATABASE_URL)
 load_dotenv()
@@ -223,6 +237,932 @@ def migrate_v8():
     except Exception as e:
         print(f"❌ General Error occurred: {e}")
 
+def migrate_v9():
+    """Adds score_rank, miss_count and map_max_combo to score_history so FC/PFC can be reclassified."""
+    if not DATABASE_URL:
+        print("❌ ERROR: DATABASE_URL not found in environment variables. Please check your .env file.")
+        return
+
+    print("🔧 Running v9 Migration: Adding score classification inputs...")
+    print("Connecting to Neon database...")
+    try:
+        conn = psycopg2.connect(DATABASE_URL)
+        cur = conn.cursor()
+
+        # Check if table exists
+        if not check_table_exists(cur, 'score_history'):
+            print("⚠️  Warning: score_history table does not exist. It will be created on first app run.")
+            conn.commit()
+            cur.close()
+            conn.close()
+            print("✅ v9 Migration completed (table will be created by app)")
+            return
+
+        columns_to_add = [
+            ('score_rank', 'TEXT'),
+            ('miss_count', 'INT'),
+            ('map_max_combo', 'INT')
+        ]
+
+        for col_name, col_type in columns_to_add:
+            if check_column_exists(cur, 'score_history', col_name):
+                print(f"✓ Column '{col_name}' already exists in score_history")
+            else:
+                print(f"Adding '{col_name}' column to score_history...")
+                cur.execute(f"ALTER TABLE score_history ADD COLUMN {col_name} {col_type};")
+                print(f"✓ Column '{col_name}' added successfully")
+
+        # Older rows have no rank/miss data, but a stored PFC implies no misses and a full combo
+        cur.execute("""
+            UPDATE score_history
+            SET miss_count = 0, map_max_combo = max_combo
+            WHERE is_pfc = TRUE AND miss_count IS NULL;
+        """)
+        print(f"✓ Backfilled {cur.rowcount} PFC rows")
+
+        conn.commit()
+        cur.close()
+        conn.close()
+        print("✅ v9 Database Schema Updated Successfully!")
+        print("ℹ️  Run 'python maintenance.py reclassify --all' to apply the current FC rules to stored scores.")
+
+    except psycopg2.Error as e:
+        print(f"❌ PostgreSQL Error occurred: {e}")
+        print("Check if your DATABASE_URL is correct and accessible.")
+    except Exception as e:
+        print(f"❌ General Error occurred: {e}")
+
+def migrate_v10():
+    """Creates the beatmaps metadata table and moves duplicated beatmap data out of score_history."""
+    if not DATABASE_URL:
+        print("❌ ERROR: DATABASE_URL not found in environment variables. Please check your .env file.")
+        return
+
+    print("🔧 Running v10 Migration: Creating beatmaps table...")
+    print("Connecting to Neon database...")
+    try:
+        conn = psycopg2.connect(DATABASE_URL)
+        cur = conn.cursor()
+
+        if check_table_exists(cur, 'beatmaps'):
+            print("✓ Table 'beatmaps' already exists")
+        else:
+            print("Creating beatmaps table...")
+            create_beatmaps_table(cur)
+            print("✓ Table 'beatmaps' created successfully")
+
+        if not check_table_exists(cur, 'score_history'):
+            print("⚠️  Warning: score_history table does not exist. It will be created on first app run.")
+            conn.commit()
+            cur.close()
+            conn.close()
+            print("✅ v10 Migration completed (table will be created by app)")
+            return
+
+        # Seed beatmaps from what score_history already knows. Rows of the same map can
+        # disagree (older ingest stored 0 or NULL combos), so take the largest known combo
+        # and length rather than whatever the newest row has, and only fill gaps in
+        # beatmaps rows that already exist.
+        cur.execute("""
+            INSERT INTO beatmaps (beatmap_id, title, total_length, max_combo)
+            SELECT beatmap_id, (array_agg(beatmap_name ORDER BY id DESC))[1],
+                   MAX(NULLIF(map_length, 0)), MAX(NULLIF(map_max_combo, 0))
+            FROM score_history
+            WHERE beatmap_id IS NOT NULL AND beatmap_id > 0 AND beatmap_name IS NOT NULL
+            GROUP BY beatmap_id
+            ON CONFLICT (beatmap_id) DO UPDATE SET
+                title = COALESCE(beatmaps.title, EXCLUDED.title),
+                total_length = COALESCE(beatmaps.total_length, EXCLUDED.total_length),
+                max_combo = COALESCE(beatmaps.max_combo, EXCLUDED.max_combo);
+        """)
+        print(f"✓ Seeded {cur.rowcount} beatmaps from score_history")
+        conn.commit()
+
+        # Drop the duplicated per-row copies in chunks so the table isn't locked for long.
+        # Rows whose map still lacks a combo or length in beatmaps keep their copies
+        # (reclassify and effective stars fall back to them); rerunning this migration after
+        # backfill-beatmaps has filled those maps clears them.
+        total = 0
+        while True:
+            cur.execute("""
+                UPDATE score_history SET beatmap_name = NULL, map_length = NULL, map_max_combo = NULL
+                WHERE id IN (
+                    SELECT sh.id FROM score_history sh
+                    JOIN beatmaps b ON b.beatmap_id = sh.beatmap_id
+                    WHERE sh.beatmap_name IS NOT NULL
+                      AND b.max_combo IS NOT NULL AND b.total_length IS NOT NULL
+                    LIMIT 5000
+                );
+            """)
+            conn.commit()
+            if cur.rowcount == 0: break
+            total += cur.rowcount
+        print(f"✓ Cleared duplicated beatmap data from {total} score rows")
+
+        cur.close()
+        conn.close()
+        print("✅ v10 Database Schema Updated Successfully!")
+        print("ℹ️  Run 'python maintenance.py backfill-beatmaps' to fill versions, max combos and difficulty from the osu! API.")
+
+    except psycopg2.Error as e:
+        print(f"❌ PostgreSQL Error occurred: {e}")
+        print("Check if your DATABASE_URL is correct and accessible.")
+    except Exception as e:
+        print(f"❌ General Error occurred: {e}")
+
+def migrate_v11():
+    """Creates the beatmap_attributes cache and tracks which score_history rows have mod-adjusted stars."""
+    if not DATABASE_URL:
+        print("❌ ERROR: DATABASE_URL not found in environment variables. Please check your .env file.")
+        return
+
+    print("🔧 Running v11 Migration: Adding mod-adjusted star ratings...")
+    print("Connecting to Neon database...")
+    try:
+        conn = psycopg2.connect(DATABASE_URL)
+        cur = conn.cursor()
+
+        if check_table_exists(cur, 'beatmap_attributes'):
+            print("✓ Table 'beatmap_attributes' already exists")
+        else:
+            print("Creating beatmap_attributes table...")
+            create_attributes_table(cur)
+            print("✓ Table 'beatmap_attributes' created successfully")
+
+        if not check_table_exists(cur, 'score_history'):
+            print("⚠️  Warning: score_history table does not exist. It will be created on first app run.")
+        elif check_column_exists(cur, 'score_history', 'stars_adjusted'):
+            print("✓ Column 'stars_adjusted' already exists in score_history")
+        else:
+            print("Adding 'stars_adjusted' column to score_history...")
+            cur.execute("ALTER TABLE score_history ADD COLUMN stars_adjusted BOOLEAN DEFAULT FALSE;")
+            print("✓ Column 'stars_adjusted' added successfully")
+
+        conn.commit()
+        cur.close()
+        conn.close()
+        print("✅ v11 Database Schema Updated Successfully!")
+        print("ℹ️  Run 'python maintenance.py backfill-star-ratings --all' to adjust stars on existing scores.")
+
+    except psycopg2.Error as e:
+        print(f"❌ PostgreSQL Error occurred: {e}")
+        print("Check if your DATABASE_URL is correct and accessible.")
+    except Exception as e:
+        print(f"❌ General Error occurred: {e}")
+
+def migrate_v12():
+    """Creates the daily/weekly analytics rollup tables."""
+    if not DATABASE_URL:
+        print("❌ ERROR: DATABASE_URL not found in environment variables. Please check your .env file.")
+        return
+
+    print("🔧 Running v12 Migration: Creating analytics rollup tables...")
+    print("Connecting to Neon database...")
+    try:
+        conn = psycopg2.connect(DATABASE_URL)
+        cur = conn.cursor()
+
+        create_rollup_tables(cur)
+        print("✓ Rollup tables ready")
+
+        conn.commit()
+        cur.close()
+        conn.close()
+        print("✅ v12 Database Schema Updated Successfully!")
+        print("ℹ️  Run 'python maintenance.py rebuild-rollups --all' to fill them from existing scores.")
+
+    except psycopg2.Error as e:
+        print(f"❌ PostgreSQL Error occurred: {e}")
+        print("Check if your DATABASE_URL is correct and accessible.")
+    except Exception as e:
+        print(f"❌ General Error occurred: {e}")
+
+def migrate_v13():
+    """Creates the leaderboard snapshot tables and the indexes the rankings are built from."""
+    if not DATABASE_URL:
+        print("❌ ERROR: DATABASE_URL not found in environment variables. Please check your .env file.")
+        return
+
+    print("🔧 Running v13 Migration: Creating leaderboard tables...")
+    print("Connecting to Neon database...")
+    try:
+        conn = psycopg2.connect(DATABASE_URL)
+        cur = conn.cursor()
+
+        if not check_table_exists(cur, 'score_history') or not check_table_exists(cur, 'user_active_goals'):
+            print("⚠️  Warning: base tables do not exist yet. They will be created on first app run.")
+            conn.commit()
+            cur.close()
+            conn.close()
+            print("✅ v13 Migration completed (tables will be created by app)")
+            return
+
+        create_leaderboard_tables(cur)
+        print("✓ Leaderboard tables and indexes ready")
+
+        conn.commit()
+        cur.close()
+        conn.close()
+        print("✅ v13 Database Schema Updated Successfully!")
+        print("ℹ️  Run 'python maintenance.py refresh-leaderboards' (e.g. every few minutes from cron) to build rankings.")
+
+    except psycopg2.Error as e:
+        print(f"❌ PostgreSQL Error occurred: {e}")
+        print("Check if your DATABASE_URL is correct and accessible.")
+    except Exception as e:
+        print(f"❌ General Error occurred: {e}")
+
+def migrate_v14():
+    """Creates user_achievements for the rule-engine state of predetermined goals."""
+    if not DATABASE_URL:
+        print("❌ ERROR: DATABASE_URL not found in environment variables. Please check your .env file.")
+        return
+
+    print("🔧 Running v14 Migration: Creating user_achievements table...")
+    print("Connecting to Neon database...")
+    try:
+        conn = psycopg2.connect(DATABASE_URL)
+        cur = conn.cursor()
+
+        if check_table_exists(cur, 'user_achievements'):
+            print("✓ Table 'user_achievements' already exists")
+        else:
+            print("Creating user_achievements table...")
+            create_achievements_table(cur)
+            print("✓ Table 'user_achievements' created successfully")
+
+        conn.commit()
+        cur.close()
+        conn.close()
+        print("✅ v14 Database Schema Updated Successfully!")
+
+    except psycopg2.Error as e:
+        print(f"❌ PostgreSQL Error occurred: {e}")
+        print("Check if your DATABASE_URL is correct and accessible.")
+    except Exception as e:
+        print(f"❌ General Error occurred: {e}")
+
+def migrate_v15():
+    """Adds stored streak state (current run, best run, last evaluated score) to user_active_goals."""
+    if not DATABASE_URL:
+        print("❌ ERROR: DATABASE_URL not found in environment variables. Please check your .env file.")
+        return
+
+    print("🔧 Running v15 Migration: Adding streak state to user_active_goals...")
+    print("Connecting to Neon database...")
+    try:
+        conn = psycopg2.connect(DATABASE_URL)
+        cur = conn.cursor()
+
+        if not check_table_exists(cur, 'user_active_goals'):
+            print("⚠️  Warning: user_active_goals table does not exist. It will be created on first app run.")
+            conn.commit()
+            cur.close()
+            conn.close()
+            print("✅ v15 Migration completed (table will be created by app)")
+            return
+
+        columns_to_add = [
+            ('streak_current', 'INT DEFAULT 0'),
+            ('streak_best', 'INT DEFAULT 0'),
+            ('streak_last_score_id', 'BIGINT')
+        ]
+
+        for col_name, col_type in columns_to_add:
+            if check_column_exists(cur, 'user_active_goals', col_name):
+                print(f"✓ Column '{col_name}' already exists in user_active_goals")
+            else:
+                print(f"Adding '{col_name}' column to user_active_goals...")
+                cur.execute(f"ALTER TABLE user_active_goals ADD COLUMN {col_name} {col_type};")
+                print(f"✓ Column '{col_name}' added successfully")
+
+        # Existing streak goals kept their run in current_progress
+        cur.execute("""
+            UPDATE user_active_goals
+            SET streak_current = COALESCE(current_progress, 0), streak_best = COALESCE(current_progress, 0)
+            WHERE (criteria->>'streak')::boolean IS TRUE AND streak_last_score_id IS NULL AND streak_best = 0;
+        """)
+        print(f"✓ Seeded streak state for {cur.rowcount} existing streak goals")
+
+        conn.commit()
+        cur.close()
+        conn.close()
+        print("✅ v15 Database Schema Updated Successfully!")
+
+    except psycopg2.Error as e:
+        print(f"❌ PostgreSQL Error occurred: {e}")
+        print("Check if your DATABASE_URL is correct and accessible.")
+    except Exception as e:
+        print(f"❌ General Error occurred: {e}")
+
+def migrate_v16():
+    """Adds window_state (ring-buffer counters for time-windowed goals) to user_active_goals."""
+    if not DATABASE_URL:
+        print("❌ ERROR: DATABASE_URL not found in environment variables. Please check your .env file.")
+        return
+
+    print("🔧 Running v16 Migration: Adding window_state to user_active_goals...")
+    print("Connecting to Neon database...")
+    try:
+        conn = psycopg2.connect(DATABASE_URL)
+        cur = conn.cursor()
+
+        if not check_table_exists(cur, 'user_active_goals'):
+            print("⚠️  Warning: user_active_goals table does not exist. It will be created on first app run.")
+        elif check_column_exists(cur, 'user_active_goals', 'window_state'):
+            print("✓ Column 'window_state' already exists in user_active_goals")
+        else:
+            print("Adding 'window_state' column to user_active_goals...")
+            cur.execute("ALTER TABLE user_active_goals ADD COLUMN window_state JSONB;")
+            print("✓ Column 'window_state' added successfully")
+
+        conn.commit()
+        cur.close()
+        conn.close()
+        print("✅ v16 Database Schema Updated Successfully!")
+
+    except psycopg2.Error as e:
+        print(f"❌ PostgreSQL Error occurred: {e}")
+        print("Check if your DATABASE_URL is correct and accessible.")
+    except Exception as e:
+        print(f"❌ General Error occurred: {e}")
+
+def migrate_v17():
+    """De-duplicates score_history and adds the (user_id, osu_score_id) unique index plus osu_users.last_synced_at."""
+    if not DATABASE_URL:
+        print("❌ ERROR: DATABASE_URL not found in environment variables. Please check your .env file.")
+        return
+
+    print("🔧 Running v17 Migration: Single-flight score sync...")
+    print("Connecting to Neon database...")
+    try:
+        conn = psycopg2.connect(DATABASE_URL)
+        cur = conn.cursor()
+
+        if check_table_exists(cur, 'osu_users'):
+            if check_column_exists(cur, 'osu_users', 'last_synced_at'):
+                print("✓ Column 'last_synced_at' already exists in osu_users")
+            else:
+                print("Adding 'last_synced_at' column to osu_users...")
+                cur.execute("ALTER TABLE osu_users ADD COLUMN last_synced_at TIMESTAMP;")
+                print("✓ Column 'last_synced_at' added successfully")
+
+        if not check_table_exists(cur, 'score_history'):
+            print("⚠️  Warning: score_history table does not exist. It will be created on first app run.")
+        else:
+            # Concurrent syncs could store the same play twice; keep the first copy
+            cur.execute("""
+                CREATE TEMP TABLE duplicate_scores ON COMMIT DROP AS
+                SELECT id FROM (
+                    SELECT id, ROW_NUMBER() OVER (PARTITION BY user_id, osu_score_id ORDER BY id) AS copy
+                    FROM score_history
+                ) s WHERE copy > 1;
+            """)
+            cur.execute("DELETE FROM goal_contributions WHERE score_history_id IN (SELECT id FROM duplicate_scores);")
+            cur.execute("DELETE FROM score_history WHERE id IN (SELECT id FROM duplicate_scores);")
+            print(f"✓ Removed {cur.rowcount} duplicate score rows")
+
+            print("Creating unique index on score_history (user_id, osu_score_id)...")
+            cur.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_score_history_user_score ON score_history (user_id, osu_score_id);")
+            print("✓ Index 'idx_score_history_user_score' ready")
+
+        conn.commit()
+        cur.close()
+        conn.close()
+        print("✅ v17 Database Schema Updated Successfully!")
+        print("ℹ️  If duplicates were removed, run 'python maintenance.py rebuild-rollups --all' to fix the analytics rollups.")
+
+    except psycopg2.Error as e:
+        print(f"❌ PostgreSQL Error occurred: {e}")
+        print("Check if your DATABASE_URL is correct and accessible.")
+    except Exception as e:
+        print(f"❌ General Error occurred: {e}")
+
+# score_history as v18 created it (v19 changes the live definition in archive.py)
+V18_SCORE_HISTORY_COLUMNS = """
+    id SERIAL, user_id BIGINT NOT NULL, osu_score_id BIGINT, beatmap_name TEXT, mods TEXT, mod_combination TEXT,
+    stars FLOAT, effective_stars FLOAT, accuracy FLOAT, timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    is_fc BOOLEAN DEFAULT FALSE, is_pfc BOOLEAN DEFAULT FALSE, beatmap_id BIGINT, map_length INT, max_combo INT,
+    score_rank TEXT, miss_count INT, map_max_combo INT, stars_adjusted BOOLEAN DEFAULT FALSE,
+    PRIMARY KEY (user_id, id)
+"""
+V18_COPY_COLUMNS = """id, user_id, osu_score_id, beatmap_name, mods, mod_combination, stars, effective_stars, accuracy, timestamp,
+                      is_fc, is_pfc, beatmap_id, map_length, max_combo, score_rank, miss_count, map_max_combo, stars_adjusted"""
+V18_COPY_BATCH_USERS = 200
+
+def migrate_v18():
+    """Converts score_history into a hash-partitioned table and creates the score archive tables."""
+    if not DATABASE_URL:
+        print("❌ ERROR: DATABASE_URL not found in environment variables. Please check your .env file.")
+        return
+
+    print("🔧 Running v18 Migration: Partitioning score_history...")
+    print("Connecting to Neon database...")
+    try:
+        conn = psycopg2.connect(DATABASE_URL)
+        cur = conn.cursor()
+
+        if not check_table_exists(cur, 'score_history'):
+            print("⚠️  Warning: score_history table does not exist. It will be created on first app run.")
+        elif is_partitioned(cur, 'score_history'):
+            print("✓ score_history is already partitioned")
+        else:
+            # Build the partitioned copy next to the live table, a batch of users per transaction,
+            # so syncs keep writing to score_history while the bulk of the rows is copied
+            print(f"Creating score_history_v18 with {SCORE_HISTORY_PARTITIONS} hash partitions on user_id...")
+            cur.execute("DROP TABLE IF EXISTS score_history_v18;")  # left over from an interrupted run
+            create_score_history_table(cur, table='score_history_v18', columns=V18_SCORE_HISTORY_COLUMNS)
+            conn.commit()
+
+            cur.execute("SELECT COALESCE(MAX(id), 0) FROM score_history;")
+            copied_up_to = cur.fetchone()[0]
+            cur.execute("SELECT COUNT(*) FROM score_history WHERE user_id IS NULL;")
+            orphaned = cur.fetchone()[0]
+            if orphaned:
+                print(f"⚠️  {orphaned} rows have no user_id and will not be copied (the partition key cannot be NULL)")
+            cur.execute("SELECT DISTINCT user_id FROM score_history WHERE user_id IS NOT NULL ORDER BY user_id;")
+            user_ids = [row[0] for row in cur.fetchall()]
+
+            copied = 0
+            for start in range(0, len(user_ids), V18_COPY_BATCH_USERS):
+                batch = user_ids[start:start + V18_COPY_BATCH_USERS]
+                cur.execute(f"""
+                    INSERT INTO score_history_v18 ({V18_COPY_COLUMNS})
+                    SELECT {V18_COPY_COLUMNS} FROM score_history WHERE user_id = ANY(%s) AND id <= %s;
+                """, (batch, copied_up_to))
+                copied += cur.rowcount
+                conn.commit()
+                print(f"   ... {min(start + V18_COPY_BATCH_USERS, len(user_ids))}/{len(user_ids)} users, {copied} rows")
+
+            # Temporary names: the live table still owns the real ones until the swap
+            cur.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_score_history_v18_user_score ON score_history_v18 (user_id, osu_score_id);")
+            cur.execute("CREATE INDEX IF NOT EXISTS idx_score_history_v18_fc_stars ON score_history_v18 (user_id, stars) WHERE is_fc = TRUE;")
+            conn.commit()
+
+            # The swap blocks writes (reads still work) only while it catches up on what changed during the copy.
+            # Deleted rows are caught up too; UPDATEs are not, so don't run maintenance.py jobs during the copy.
+            print("Swapping in the partitioned table...")
+            cur.execute("LOCK TABLE score_history IN EXCLUSIVE MODE;")
+            cur.execute(f"""
+                INSERT INTO score_history_v18 ({V18_COPY_COLUMNS})
+                SELECT {V18_COPY_COLUMNS} FROM score_history WHERE id > %s AND user_id IS NOT NULL;
+            """, (copied_up_to,))
+            print(f"✓ Copied {copied + cur.rowcount} rows ({cur.rowcount} written during the copy)")
+            cur.execute("""
+                DELETE FROM score_history_v18 n
+                WHERE NOT EXISTS (SELECT 1 FROM score_history o WHERE o.id = n.id);
+            """)
+            if cur.rowcount:
+                print(f"✓ Dropped {cur.rowcount} rows deleted during the copy")
+
+            cur.execute("ALTER TABLE score_history RENAME TO score_history_unpartitioned;")
+            # Index names are schema-wide; free them for the partitioned table
+            cur.execute("SELECT indexname FROM pg_indexes WHERE tablename = 'score_history_unpartitioned';")
+            for (index_name,) in cur.fetchall():
+                cur.execute(f"ALTER INDEX {index_name} RENAME TO {index_name}_unpartitioned;")
+            cur.execute("ALTER TABLE score_history_v18 RENAME TO score_history;")
+            for i in range(SCORE_HISTORY_PARTITIONS):
+                cur.execute(f"ALTER TABLE score_history_v18_p{i} RENAME TO score_history_p{i};")
+            cur.execute("ALTER INDEX idx_score_history_v18_user_score RENAME TO idx_score_history_user_score;")
+            cur.execute("ALTER INDEX idx_score_history_v18_fc_stars RENAME TO idx_score_history_fc_stars;")
+            cur.execute("DROP TABLE score_history_unpartitioned;")
+            cur.execute("ALTER INDEX score_history_v18_pkey RENAME TO score_history_pkey;")
+            cur.execute("ALTER SEQUENCE score_history_v18_id_seq RENAME TO score_history_id_seq;")
+            cur.execute("SELECT setval(pg_get_serial_sequence('score_history', 'id'), COALESCE(MAX(id), 0) + 1, false) FROM score_history;")
+            print("✓ score_history partitioned")
+
+        print("Creating score_archive tables...")
+        create_archive_tables(cur)
+        print("✓ Tables 'score_archive' and 'score_archive_fc_counts' ready")
+
+        conn.commit()
+        cur.close()
+        conn.close()
+        print("✅ v18 Database Schema Updated Successfully!")
+        print("ℹ️  Run 'python maintenance.py archive-scores --all' (e.g. monthly from cron) to move old plays to the archive.")
+
+    except psycopg2.Error as e:
+        print(f"❌ PostgreSQL Error occurred: {e}")
+        print("Check if your DATABASE_URL is correct and accessible.")
+    except Exception as e:
+        print(f"❌ General Error occurred: {e}")
+
+def migrate_v19():
+    """Replaces score_history's mods/mod_combination text with a mod_bits bitmask and stores stars/accuracy as REAL."""
+    if not DATABASE_URL:
+        print("❌ ERROR: DATABASE_URL not found in environment variables. Please check your .env file.")
+        return
+
+    print("🔧 Running v19 Migration: Compact score_history rows...")
+    print("Connecting to Neon database...")
+    try:
+        conn = psycopg2.connect(DATABASE_URL)
+        cur = conn.cursor()
+
+        if not check_table_exists(cur, 'score_history'):
+            print("⚠️  Warning: score_history table does not exist. It will be created on first app run.")
+            cur.close()
+            conn.close()
+            return
+
+        if check_column_exists(cur, 'score_history', 'mod_bits'):
+            print("✓ Column 'mod_bits' already exists in score_history")
+        else:
+            print("Adding 'mod_bits' column to score_history...")
+            cur.execute("ALTER TABLE score_history ADD COLUMN mod_bits INT;")
+            conn.commit()
+            print("✓ Column 'mod_bits' added successfully")
+
+        if check_column_exists(cur, 'score_history', 'mod_combination'):
+            # "HDDT" -> 8 | 64, two characters per mod like scoring.parse_mod_combination
+            mod_values = ', '.join(f"('{mod}', {bit})" for mod, bit in MOD_BITS.items())
+            mod_bits_sql = f"""(
+                SELECT COALESCE(BIT_OR(m.bit), 0)
+                FROM regexp_matches(COALESCE(mod_combination, ''), '..', 'g') AS r(acronym)
+                JOIN (VALUES {mod_values}) AS m(acronym, bit) ON m.acronym = r.acronym[1]
+            )"""
+
+            cur.execute("SELECT DISTINCT user_id FROM score_history WHERE mod_bits IS NULL;")
+            user_ids = [r[0] for r in cur.fetchall()]
+            print(f"Converting mod combinations for {len(user_ids)} user(s) in chunks...")
+            total = 0
+            for user_id in user_ids:
+                while True:
+                    cur.execute(f"""
+                        UPDATE score_history SET mod_bits = {mod_bits_sql}
+                        WHERE user_id = %s AND id IN (
+                            SELECT id FROM score_history WHERE user_id = %s AND mod_bits IS NULL LIMIT 5000
+                        );
+                    """, (user_id, user_id))
+                    conn.commit()
+                    if cur.rowcount == 0: break
+                    total += cur.rowcount
+            print(f"✓ Converted {total} score rows")
+
+        changes = ["ALTER COLUMN mod_bits SET DEFAULT 0", "ALTER COLUMN mod_bits SET NOT NULL"]
+        for col in ['mods', 'mod_combination']:
+            if check_column_exists(cur, 'score_history', col):
+                changes.append(f"DROP COLUMN {col}")
+        cur.execute("""
+            SELECT column_name FROM information_schema.columns
+            WHERE table_name = 'score_history' AND column_name IN ('stars', 'effective_stars', 'accuracy') AND data_type = 'double precision';
+        """)
+        real_columns = [col for (col,) in cur.fetchall()]
+        changes += [f"ALTER COLUMN {col} TYPE REAL" for col in real_columns]
+
+        # Rows that had no mod text at all count as NM
+        cur.execute("UPDATE score_history SET mod_bits = 0 WHERE mod_bits IS NULL;")
+        if real_columns:
+            print(f"Converting {', '.join(real_columns)} to REAL (rewrites the table once)...")
+        print(f"Applying {len(changes)} column change(s)...")
+        cur.execute(f"ALTER TABLE score_history {', '.join(changes)};")
+        print("✓ score_history columns compacted")
+
+        conn.commit()
+        cur.close()
+        conn.close()
+        print("✅ v19 Database Schema Updated Successfully!")
+
+    except psycopg2.Error as e:
+        print(f"❌ PostgreSQL Error occurred: {e}")
+        print("Check if your DATABASE_URL is correct and accessible.")
+    except Exception as e:
+        print(f"❌ General Error occurred: {e}")
+
+def migrate_v20():
+    """Adds osu_users.state_version, the key of the per-user dashboard cache (dashboard_cache.py)."""
+    if not DATABASE_URL:
+        print("❌ ERROR: DATABASE_URL not found in environment variables. Please check your .env file.")
+        return
+
+    print("🔧 Running v20 Migration: Dashboard state version...")
+    print("Connecting to Neon database...")
+    try:
+        conn = psycopg2.connect(DATABASE_URL)
+        cur = conn.cursor()
+
+        if not check_table_exists(cur, 'osu_users'):
+            print("⚠️  Warning: osu_users table does not exist. It will be created on first app run.")
+        elif check_column_exists(cur, 'osu_users', 'state_version'):
+            print("✓ Column 'state_version' already exists in osu_users")
+        else:
+            print("Adding 'state_version' column to osu_users...")
+            cur.execute("ALTER TABLE osu_users ADD COLUMN state_version BIGINT NOT NULL DEFAULT 0;")
+            print("✓ Column 'state_version' added successfully")
+
+        conn.commit()
+        cur.close()
+        conn.close()
+        print("✅ v20 Database Schema Updated Successfully!")
+
+    except psycopg2.Error as e:
+        print(f"❌ PostgreSQL Error occurred: {e}")
+        print("Check if your DATABASE_URL is correct and accessible.")
+    except Exception as e:
+        print(f"❌ General Error occurred: {e}")
+
+def migrate_v21():
+    """Creates rank_history and seeds it with every user's stored rank."""
+    if not DATABASE_URL:
+        print("❌ ERROR: DATABASE_URL not found in environment variables. Please check your .env file.")
+        return
+
+    print("🔧 Running v21 Migration: Rank history...")
+    print("Connecting to Neon database...")
+    try:
+        conn = psycopg2.connect(DATABASE_URL)
+        cur = conn.cursor()
+
+        create_rank_history_table(cur)
+        print("✓ rank_history table ready")
+
+        if check_table_exists(cur, 'osu_users'):
+            # History starts with the rank we already know
+            cur.execute("""
+                INSERT INTO rank_history (user_id, global_rank)
+                SELECT u.user_id, u.global_rank FROM osu_users u
+                WHERE u.global_rank > 0
+                  AND NOT EXISTS (SELECT 1 FROM rank_history rh WHERE rh.user_id = u.user_id)
+            """)
+            print(f"✓ Seeded {cur.rowcount} user(s) with their current rank")
+
+        conn.commit()
+        cur.close()
+        conn.close()
+        print("✅ v21 Database Schema Updated Successfully!")
+
+    except psycopg2.Error as e:
+        print(f"❌ PostgreSQL Error occurred: {e}")
+        print("Check if your DATABASE_URL is correct and accessible.")
+    except Exception as e:
+        print(f"❌ General Error occurred: {e}")
+
+def migrate_v22():
+    """Adds the beatmap search columns and indexes and counts plays per beatmap."""
+    if not DATABASE_URL:
+        print("❌ ERROR: DATABASE_URL not found in environment variables. Please check your .env file.")
+        return
+
+    print("🔧 Running v22 Migration: Beatmap search...")
+    print("Connecting to Neon database...")
+    try:
+        conn = psycopg2.connect(DATABASE_URL)
+        cur = conn.cursor()
+
+        if not check_table_exists(cur, 'beatmaps'):
+            print("⚠️  Warning: beatmaps table does not exist. It will be created on first app run.")
+            conn.commit()
+            cur.close()
+            conn.close()
+            print("✅ v22 Migration completed (tables will be created by app)")
+            return
+
+        if check_column_exists(cur, 'beatmaps', 'play_count'):
+            print("✓ Column 'play_count' already exists in beatmaps")
+        else:
+            print("Adding 'play_count' column to beatmaps...")
+            cur.execute("ALTER TABLE beatmaps ADD COLUMN play_count INT DEFAULT 0;")
+            print("✓ Column 'play_count' added successfully")
+
+        if check_column_exists(cur, 'beatmaps', 'search_text'):
+            print("✓ Column 'search_text' already exists in beatmaps")
+        else:
+            print("Adding generated 'search_text' column to beatmaps (rewrites the table once)...")
+            cur.execute("""
+                ALTER TABLE beatmaps ADD COLUMN search_text TEXT GENERATED ALWAYS AS (
+                    lower(COALESCE(artist, '') || ' ' || COALESCE(title, '') || ' ' || COALESCE(version, ''))
+                ) STORED;
+            """)
+            print("✓ Column 'search_text' added successfully")
+
+        if create_search_indexes(cur):
+            print("✓ Title prefix and trigram indexes ready")
+        else:
+            print("✓ Title prefix index ready (install pg_trgm and re-run for word search)")
+
+        if check_table_exists(cur, 'score_history'):
+            print(f"✓ Play counts updated for {refresh_play_counts(cur)} beatmap(s)")
+
+        conn.commit()
+        cur.close()
+        conn.close()
+        print("✅ v22 Database Schema Updated Successfully!")
+
+    except psycopg2.Error as e:
+        print(f"❌ PostgreSQL Error occurred: {e}")
+        print("Check if your DATABASE_URL is correct and accessible.")
+    except Exception as e:
+        print(f"❌ General Error occurred: {e}")
+
+def migrate_v23():
+    """Creates the user_performance aggregates behind goal recommendations and fills them from existing scores."""
+    if not DATABASE_URL:
+        print("❌ ERROR: DATABASE_URL not found in environment variables. Please check your .env file.")
+        return
+
+    print("🔧 Running v23 Migration: Performance aggregates for goal recommendations...")
+    print("Connecting to Neon database...")
+    try:
+        conn = psycopg2.connect(DATABASE_URL)
+        cur = conn.cursor()
+
+        create_performance_table(cur)
+        print("✓ user_performance table ready")
+        conn.commit()
+
+        if check_table_exists(cur, 'score_history') and check_table_exists(cur, 'osu_users'):
+            # Users that already have aggregates were filled by an earlier run (or by ingest since)
+            cur.execute("""
+                SELECT u.user_id FROM osu_users u
+                WHERE NOT EXISTS (SELECT 1 FROM user_performance p WHERE p.user_id = u.user_id)
+                ORDER BY u.user_id
+            """)
+            user_ids = [r[0] for r in cur.fetchall()]
+            for user_id in user_ids:
+                rebuild_performance(cur, user_id)
+                conn.commit()
+            print(f"✓ Aggregates built for {len(user_ids)} user(s)")
+
+        cur.close()
+        conn.close()
+        print("✅ v23 Database Schema Updated Successfully!")
+
+    except psycopg2.Error as e:
+        print(f"❌ PostgreSQL Error occurred: {e}")
+        print("Check if your DATABASE_URL is correct and accessible.")
+    except Exception as e:
+        print(f"❌ General Error occurred: {e}")
+
+def migrate_v24():
+    """Creates score_sketches (percentile sketches) and fills them from existing scores."""
+    if not DATABASE_URL:
+        print("❌ ERROR: DATABASE_URL not found in environment variables. Please check your .env file.")
+        return
+
+    print("🔧 Running v24 Migration: Quantile sketches...")
+    print("Connecting to Neon database...")
+    try:
+        conn = psycopg2.connect(DATABASE_URL)
+        cur = conn.cursor()
+
+        create_sketch_table(cur)
+        print("✓ score_sketches table ready")
+        conn.commit()
+
+        if check_table_exists(cur, 'score_history') and check_table_exists(cur, 'osu_users'):
+            cur.execute("""
+                SELECT u.user_id FROM osu_users u
+                WHERE NOT EXISTS (SELECT 1 FROM score_sketches s WHERE s.user_id = u.user_id)
+                ORDER BY u.user_id
+            """)
+            user_ids = [r[0] for r in cur.fetchall()]
+            for user_id in user_ids:
+                rebuild_sketches(cur, user_id)
+                conn.commit()
+            print(f"✓ Sketches built for {len(user_ids)} user(s)")
+
+        cur.close()
+        conn.close()
+        print("✅ v24 Database Schema Updated Successfully!")
+
+    except psycopg2.Error as e:
+        print(f"❌ PostgreSQL Error occurred: {e}")
+        print("Check if your DATABASE_URL is correct and accessible.")
+    except Exception as e:
+        print(f"❌ General Error occurred: {e}")
+
+def migrate_v25():
+    """Adds osu_users.last_played_at (drives the /check_scores poll interval) and seeds it from score_history."""
+    if not DATABASE_URL:
+        print("❌ ERROR: DATABASE_URL not found in environment variables. Please check your .env file.")
+        return
+
+    print("🔧 Running v25 Migration: Adaptive poll interval...")
+    print("Connecting to Neon database...")
+    try:
+        conn = psycopg2.connect(DATABASE_URL)
+        cur = conn.cursor()
+
+        if not check_table_exists(cur, 'osu_users'):
+            print("⚠️  Warning: osu_users table does not exist. It will be created on first app run.")
+            conn.commit()
+            cur.close()
+            conn.close()
+            print("✅ v25 Migration completed (tables will be created by app)")
+            return
+
+        if check_column_exists(cur, 'osu_users', 'last_played_at'):
+            print("✓ Column 'last_played_at' already exists in osu_users")
+        else:
+            print("Adding 'last_played_at' column to osu_users...")
+            cur.execute("ALTER TABLE osu_users ADD COLUMN last_played_at TIMESTAMPTZ;")
+            print("✓ Column 'last_played_at' added successfully")
+
+        if check_table_exists(cur, 'score_history'):
+            # Ingest time of the newest stored score is close enough for users who haven't synced since
+            cur.execute("""
+                UPDATE osu_users u SET last_played_at = latest.played_at
+                FROM (SELECT user_id, MAX(timestamp) AS played_at FROM score_history GROUP BY user_id) latest
+                WHERE latest.user_id = u.user_id AND u.last_played_at IS NULL
+            """)
+            print(f"✓ Seeded last_played_at for {cur.rowcount} user(s)")
+
+        conn.commit()
+        cur.close()
+        conn.close()
+        print("✅ v25 Database Schema Updated Successfully!")
+
+    except psycopg2.Error as e:
+        print(f"❌ PostgreSQL Error occurred: {e}")
+        print("Check if your DATABASE_URL is correct and accessible.")
+    except Exception as e:
+        print(f"❌ General Error occurred: {e}")
+
+def migrate_v26():
+    """Creates the group challenge tables (challenges, challenge_members, challenge_deltas)."""
+    if not DATABASE_URL:
+        print("❌ ERROR: DATABASE_URL not found in environment variables. Please check your .env file.")
+        return
+
+    print("🔧 Running v26 Migration: Group challenges...")
+    print("Connecting to Neon database...")
+    try:
+        conn = psycopg2.connect(DATABASE_URL)
+        cur = conn.cursor()
+
+        create_challenge_tables(cur)
+        print("✓ challenges, challenge_members and challenge_deltas tables ready")
+
+        conn.commit()
+        cur.close()
+        conn.close()
+        print("✅ v26 Database Schema Updated Successfully!")
+
+    except psycopg2.Error as e:
+        print(f"❌ PostgreSQL Error occurred: {e}")
+        print("Check if your DATABASE_URL is correct and accessible.")
+    except Exception as e:
+        print(f"❌ General Error occurred: {e}")
+
+def migrate_v27():
+    """Creates goal_reconciliation_log and the goal_contributions (goal_id) index used by reconcile-goals."""
+    if not DATABASE_URL:
+        print("❌ ERROR: DATABASE_URL not found in environment variables. Please check your .env file.")
+        return
+
+    print("🔧 Running v27 Migration: Goal progress reconciliation...")
+    print("Connecting to Neon database...")
+    try:
+        conn = psycopg2.connect(DATABASE_URL)
+        cur = conn.cursor()
+
+        if not check_table_exists(cur, 'goal_contributions'):
+            print("⚠️  Warning: goal_contributions table does not exist. It will be created on first app run.")
+            cur.close()
+            conn.close()
+            print("✅ v27 Migration completed (tables will be created by app)")
+            return
+
+        create_reconcile_tables(cur)
+        print("✓ goal_reconciliation_log table and goal_contributions index ready")
+
+        conn.commit()
+        cur.close()
+        conn.close()
+        print("✅ v27 Database Schema Updated Successfully!")
+
+    except psycopg2.Error as e:
+        print(f"❌ PostgreSQL Error occurred: {e}")
+        print("Check if your DATABASE_URL is correct and accessible.")
+    except Exception as e:
+        print(f"❌ General Error occurred: {e}")
+
+def migrate_v28():
+    """Creates oauth_tokens, the server-side encrypted osu! token store."""
+    if not DATABASE_URL:
+        print("❌ ERROR: DATABASE_URL not found in environment variables. Please check your .env file.")
+        return
+
+    print("🔧 Running v28 Migration: OAuth token store...")
+    print("Connecting to Neon database...")
+    try:
+        conn = psycopg2.connect(DATABASE_URL)
+        cur = conn.cursor()
+
+        create_token_table(cur)
+        print("✓ oauth_tokens table ready (users' tokens are stored on their next login)")
+
+        conn.commit()
+        cur.close()
+        conn.close()
+        print("✅ v28 Database Schema Updated Successfully!")
+
+    except psycopg2.Error as e:
+        print(f"❌ PostgreSQL Error occurred: {e}")
+        print("Check if your DATABASE_URL is correct and accessible.")
+    except Exception as e:
+        print(f"❌ General Error occurred: {e}")
+
 def verify_schema():
     """Verify that all required columns and tables exist."""
     if not DATABASE_URL:
@@ -235,7 +1175,7 @@ def verify_schema():
         cur = conn.cursor()
 
         # Check score_history columns
-        score_history_columns = ['mod_combination', 'beatmap_id', 'map_length', 'max_combo', 'is_fc', 'is_pfc']
+        score_history_columns = ['mod_bits', 'beatmap_id', 'map_length', 'max_combo', 'is_fc', 'is_pfc', 'score_rank', 'miss_count', 'map_max_combo', 'stars_adjusted']
         print("\nChecking score_history table:")
         if check_table_exists(cur, 'score_history'):
             for col in score_history_columns:
@@ -248,9 +1188,10 @@ def verify_schema():
         # Check user_active_goals columns
         print("\nChecking user_active_goals table:")
         if check_table_exists(cur, 'user_active_goals'):
-            exists = check_column_exists(cur, 'user_active_goals', 'completed_at')
-            status = "✓" if exists else "✗"
-            print(f"  {status} completed_at")
+            for col in ['completed_at', 'streak_current', 'streak_best', 'streak_last_score_id', 'window_state']:
+                exists = check_column_exists(cur, 'user_active_goals', col)
+                status = "✓" if exists else "✗"
+                print(f"  {status} {col}")
         else:
             print("  ⚠️  Table does not exist (will be created on first app run)")
 
@@ -260,6 +1201,104 @@ def verify_schema():
         status = "✓" if exists else "✗"
         print(f"  {status} goal_contributions table exists")
 
+        # Check single-flight sync support
+        print("\nChecking score sync:")
+        exists = check_column_exists(cur, 'osu_users', 'last_synced_at')
+        status = "✓" if exists else "✗"
+        print(f"  {status} osu_users.last_synced_at")
+        exists = check_column_exists(cur, 'osu_users', 'state_version')
+        status = "✓" if exists else "✗"
+        print(f"  {status} osu_users.state_version (dashboard cache)")
+        exists = check_column_exists(cur, 'osu_users', 'last_played_at')
+        status = "✓" if exists else "✗"
+        print(f"  {status} osu_users.last_played_at (poll interval)")
+        cur.execute("SELECT 1 FROM pg_indexes WHERE indexname = 'idx_score_history_user_score';")
+        status = "✓" if cur.fetchone() else "✗"
+        print(f"  {status} unique index on score_history (user_id, osu_score_id)")
+
+        # Check partitioning + archive
+        print("\nChecking score_history partitioning:")
+        status = "✓" if is_partitioned(cur, 'score_history') else "✗"
+        print(f"  {status} score_history hash-partitioned by user_id")
+        for table in ['score_archive', 'score_archive_fc_counts']:
+            exists = check_table_exists(cur, table)
+            status = "✓" if exists else "✗"
+            print(f"  {status} {table} table exists")
+
+        # Check beatmap cache tables
+        print("\nChecking beatmap cache tables:")
+        for table in ['beatmaps', 'beatmap_attributes']:
+            exists = check_table_exists(cur, table)
+            status = "✓" if exists else "✗"
+            print(f"  {status} {table} table exists")
+
+        # Check beatmap search
+        print("\nChecking beatmap search:")
+        for col in ['play_count', 'search_text']:
+            exists = check_column_exists(cur, 'beatmaps', col)
+            status = "✓" if exists else "✗"
+            print(f"  {status} beatmaps.{col}")
+        cur.execute("SELECT 1 FROM pg_indexes WHERE indexname = 'idx_beatmaps_search_trgm';")
+        status = "✓" if cur.fetchone() else "⚠️ "
+        print(f"  {status} trigram index (optional, needs pg_trgm)")
+
+        # Check analytics rollups
+        print("\nChecking analytics rollup tables:")
+        for table, _ in ROLLUP_PERIODS.values():
+            exists = check_table_exists(cur, table)
+            status = "✓" if exists else "✗"
+            print(f"  {status} {table} table exists")
+
+        # Check achievements table
+        print("\nChecking user_achievements table:")
+        exists = check_table_exists(cur, 'user_achievements')
+        status = "✓" if exists else "✗"
+        print(f"  {status} user_achievements table exists")
+
+        # Check recommendation aggregates
+        print("\nChecking user_performance table:")
+        exists = check_table_exists(cur, 'user_performance')
+        status = "✓" if exists else "✗"
+        print(f"  {status} user_performance table exists")
+
+        # Check quantile sketches
+        print("\nChecking score_sketches table:")
+        exists = check_table_exists(cur, 'score_sketches')
+        status = "✓" if exists else "✗"
+        print(f"  {status} score_sketches table exists")
+
+        # Check rank history
+        print("\nChecking rank_history table:")
+        exists = check_table_exists(cur, 'rank_history')
+        status = "✓" if exists else "✗"
+        print(f"  {status} rank_history table exists")
+
+        # Check leaderboard tables
+        print("\nChecking leaderboard tables:")
+        for table in ['leaderboard_snapshots', 'leaderboard_meta']:
+            exists = check_table_exists(cur, table)
+            status = "✓" if exists else "✗"
+            print(f"  {status} {table} table exists")
+
+        # Check group challenge tables
+        print("\nChecking group challenge tables:")
+        for table in ['challenges', 'challenge_members', 'challenge_deltas']:
+            exists = check_table_exists(cur, table)
+            status = "✓" if exists else "✗"
+            print(f"  {status} {table} table exists")
+
+        # Check goal reconciliation log
+        print("\nChecking goal_reconciliation_log table:")
+        exists = check_table_exists(cur, 'goal_reconciliation_log')
+        status = "✓" if exists else "✗"
+        print(f"  {status} goal_reconciliation_log table exists")
+
+        # Check OAuth token store
+        print("\nChecking oauth_tokens table:")
+        exists = check_table_exists(cur, 'oauth_tokens')
+        status = "✓" if exists else "✗"
+        print(f"  {status} oauth_tokens table exists")
+
         cur.close()
         conn.close()
         print("\n✅ Schema verification completed!")
@@ -286,6 +1325,46 @@ def migrate_all():
     migrate_v7()
     print()
     migrate_v8()
+    print()
+    migrate_v9()
+    print()
+    migrate_v10()
+    print()
+    migrate_v11()
+    print()
+    migrate_v12()
+    print()
+    migrate_v13()
+    print()
+    migrate_v14()
+    print()
+    migrate_v15()
+    print()
+    migrate_v16()
+    print()
+    migrate_v17()
+    print()
+    migrate_v18()
+    print()
+    migrate_v19()
+    print()
+    migrate_v20()
+    print()
+    migrate_v21()
+    print()
+    migrate_v22()
+    print()
+    migrate_v23()
+    print()
+    migrate_v24()
+    print()
+    migrate_v25()
+    print()
+    migrate_v26()
+    print()
+    migrate_v27()
+    print()
+    migrate_v28()
     
     print("\n" + "=" * 60)
     print("✅ All migrations completed!")
@@ -0,0 +1,264 @@
+# whatif.py
+
+# Offline what-if sandbox for the mastery ratings (python maintenance.py what-if).
+# Replays stored plays under candidate effective-star formulas and EMA weights and
+# compares the resulting ratings, without writing anything.
+#
+# History is loaded once into NumPy columns: score_history joined with beatmaps
+# (streamed with a server-side cursor) plus the archived months. Every candidate is
+# then replayed in one vectorized pass. The live EMA starts each rating at 0, and
+#   r <- (1 - w) * r + w * x
+# after N plays gives r_N = sum_i w * (1 - w)^(N-1-i) * x_i,
+# so each (user, mod group) rating is a weighted segment sum (np.add.reduceat)
+# and there is no Python loop over plays or users.
+import ast
+from datetime import timezone
+from types import SimpleNamespace
+import numpy as np
+from archive import archived_scores
+from scoring import MASTERY_GROUPS, MASTERY_WEIGHT, effective_stars_batch, mod_group_batch
+
+LIVE_FORMULA = 'live'
+
+# name -> (description, f(columns) -> effective stars per play)
+FORMULAS = {
+    LIVE_FORMULA: ("stars × acc³ × combo ratio (calculate_effective_stars)",
+                   lambda c: effective_stars_batch(c['stars'], c['acc'], c['max_combo'], c['map_max_combo'])),
+    'acc5': ("stars × acc⁵ × combo ratio",
+             lambda c: c['stars'] * c['acc'] ** 5 * c['combo_ratio']),
+    'sqrt-combo': ("stars × acc³ × √combo ratio",
+                   lambda c: c['stars'] * c['acc'] ** 3 * np.sqrt(c['combo_ratio'])),
+    'miss-penalty': ("stars × acc³ × 0.97^misses (no combo ratio)",
+                     lambda c: c['stars'] * c['acc'] ** 3 * 0.97 ** c['misses']),
+    'fc-bonus': ("live, +5% for FCs",
+                 lambda c: effective_stars_batch(c['stars'], c['acc'], c['max_combo'], c['map_max_combo']) * np.where(c['is_fc'], 1.05, 1.0)),
+}
+# Names usable in a custom formula expression ("name=expr")
+FORMULA_COLUMNS = ('stars', 'acc', 'combo_ratio', 'max_combo', 'map_max_combo', 'misses', 'length', 'is_fc')
+# The only np.<name> a custom formula may call: elementwise math, nothing that touches files
+FORMULA_NP_FUNCTIONS = ('abs', 'clip', 'exp', 'log', 'log1p', 'log2', 'log10', 'maximum', 'minimum', 'power',
+                        'sqrt', 'square', 'tanh', 'where')
+_formula_np = {name: getattr(np, name) for name in FORMULA_NP_FUNCTIONS}
+
+DEFAULT_WEIGHTS = (MASTERY_WEIGHT, 0.02, 0.1)
+FETCH_SIZE = 50000
+
+def parse_formula(spec):
+    """(name, function) for a FORMULAS name or a "name=expression" over FORMULA_COLUMNS and FORMULA_NP_FUNCTIONS."""
+    if spec in FORMULAS:
+        return spec, FORMULAS[spec][1]
+    name, sep, expression = spec.partition('=')
+    if not sep or not name.strip() or not expression.strip():
+        raise ValueError(f"Unknown formula {spec!r}: use one of {', '.join(FORMULAS)} or name=expression")
+    tree = ast.parse(expression.strip(), mode='eval')
+    unknown = set()
+    np_names = set()
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Attribute):
+            if isinstance(node.value, ast.Name) and node.value.id == 'np' and node.attr in FORMULA_NP_FUNCTIONS:
+                np_names.add(id(node.value))
+            else:
+                unknown.add(ast.unparse(node))
+        elif isinstance(node, ast.Name) and node.id not in FORMULA_COLUMNS and id(node) not in np_names:
+            unknown.add(node.id)
+    if unknown:
+        raise ValueError(f"Formula {name!r} uses unknown names: {', '.join(sorted(unknown))} "
+                         f"(np functions: {', '.join(FORMULA_NP_FUNCTIONS)})")
+    # Evaluated with np.<function> resolved from the whitelist only, never the numpy module
+    code = compile(tree, f"<formula {name}>", 'eval')
+    namespace = {'__builtins__': {}, 'np': SimpleNamespace(**_formula_np)}
+    return name.strip(), lambda c: np.broadcast_to(eval(code, namespace, c), c['stars'].shape)
+
+# --- LOADING ---
+
+class History:
+    """Every play of the loaded users as parallel columns, ordered by user, then play order."""
+
+    def __init__(self, user_ids, mod_bits, stars, acc, max_combo, map_max_combo, misses, length, is_fc):
+        self.user_ids = np.asarray(user_ids, dtype=np.int64)
+        self.groups = mod_group_batch(mod_bits)
+        max_combo = np.asarray(max_combo, dtype=np.float64)
+        map_max_combo = np.asarray(map_max_combo, dtype=np.float64)
+        combo_ratio = np.ones_like(max_combo)
+        has_map_combo = map_max_combo > 0
+        combo_ratio[has_map_combo] = max_combo[has_map_combo] / map_max_combo[has_map_combo]
+        self.columns = {
+            'stars': np.asarray(stars, dtype=np.float64),
+            'acc': np.asarray(acc, dtype=np.float64),
+            'combo_ratio': combo_ratio,
+            'max_combo': max_combo,
+            'map_max_combo': map_max_combo,
+            'misses': np.asarray(misses, dtype=np.float64),
+            'length': np.asarray(length, dtype=np.float64),
+            'is_fc': np.asarray(is_fc, dtype=bool),
+        }
+
+    def __len__(self):
+        return len(self.user_ids)
+
+# Loaded columns: user_id, epoch, id, then History's columns from mod_bits on
+LOAD_DTYPES = (np.int64, np.float64, np.int64, np.int64, np.float64, np.float64, np.float64, np.float64,
+               np.float64, np.float64, bool)
+
+def _to_columns(rows):
+    """A chunk of row tuples as one NumPy array per column (dropping the tuples early keeps memory flat)."""
+    return [np.array(col, dtype=dtype) for col, dtype in zip(zip(*rows), LOAD_DTYPES)]
+
+def load_history(conn, user_ids=None):
+    """
+    Loads the plays of `user_ids` (None = everyone) from score_history and score_archive.
+    Plays are ordered like live ingest applied them: by timestamp, then id.
+    """
+    chunks = []
+    cur = conn.cursor(name='whatif_history')
+    user_filter = "AND sh.user_id = ANY(%s)" if user_ids is not None else ""
+    cur.execute(f"""
+        SELECT sh.user_id, COALESCE(EXTRACT(EPOCH FROM sh.timestamp), 0), sh.id, sh.mod_bits, sh.stars, sh.accuracy,
+               COALESCE(sh.max_combo, 0), COALESCE(b.max_combo, sh.map_max_combo, 0), COALESCE(sh.miss_count, 0),
+               COALESCE(b.total_length, sh.map_length, 0), COALESCE(sh.is_fc, FALSE)
+        FROM score_history sh
+        LEFT JOIN beatmaps b ON b.beatmap_id = sh.beatmap_id
+        WHERE sh.stars IS NOT NULL AND sh.accuracy IS NOT NULL {user_filter}
+    """, (list(user_ids),) if user_ids is not None else None)
+    while True:
+        rows = cur.fetchmany(FETCH_SIZE)
+        if not rows: break
+        chunks.append(_to_columns(rows))
+    cur.close()
+
+    cur = conn.cursor()
+    if user_ids is None:
+        cur.execute("SELECT DISTINCT user_id FROM score_archive")
+    else:
+        cur.execute("SELECT DISTINCT user_id FROM score_archive WHERE user_id = ANY(%s)", (list(user_ids),))
+    archived = []
+    for (user_id,) in cur.fetchall():
+        archived.extend((user_id, a) for a in archived_scores(cur, user_id) if a['stars'] is not None and a['accuracy'] is not None)
+    if archived:
+        # Archived rows only carry the beatmap id; map combo and length come from beatmaps like above
+        cur.execute("SELECT beatmap_id, max_combo, total_length FROM beatmaps WHERE beatmap_id = ANY(%s)",
+                    (list({a['beatmap_id'] for _, a in archived if a['beatmap_id']}),))
+        beatmaps = {r[0]: r[1:] for r in cur.fetchall()}
+        rows = []
+        for user_id, a in archived:
+            map_combo, length = beatmaps.get(a['beatmap_id'], (None, None))
+            rows.append((user_id, a['timestamp'].replace(tzinfo=timezone.utc).timestamp() if a['timestamp'] else 0, a['id'], a['mod_bits'] or 0,
+                         a['stars'], a['accuracy'], a['max_combo'] or 0, map_combo or a['map_max_combo'] or 0,
+                         a['miss_count'] or 0, length or 0, bool(a['is_fc'])))
+        chunks.append(_to_columns(rows))
+    cur.close()
+
+    if not chunks:
+        return History(*([] for _ in range(9)))
+    user_col, epoch, id_col, *columns = (np.concatenate(col) for col in zip(*chunks))
+    order = np.lexsort((id_col, epoch, user_col))
+    return History(user_col[order], *(col[order] for col in columns))
+
+def load_stored_ratings(cur, user_ids):
+    """user_mastery ratings as a (users, MASTERY_GROUPS) array (0 for missing rows)."""
+    columns = ', '.join(f"{g.lower()}_rating" for g in MASTERY_GROUPS)
+    cur.execute(f"SELECT user_id, {columns} FROM user_mastery WHERE user_id = ANY(%s)", (list(map(int, user_ids)),))
+    index = {u: i for i, u in enumerate(user_ids)}
+    stored = np.zeros((len(user_ids), len(MASTERY_GROUPS)))
+    for user_id, *ratings in cur.fetchall():
+        stored[index[user_id]] = [r or 0 for r in ratings]
+    return stored
+
+# --- REPLAY ---
+
+class Replay:
+    """
+    ratings[formula, weight, user, group] after replaying every play;
+    plays[user, group] is the number of plays behind each rating.
+    """
+
+    def __init__(self, formulas, weights, users, ratings, plays):
+        self.formulas = formulas
+        self.weights = weights
+        self.users = users
+        self.ratings = ratings
+        self.plays = plays
+
+def replay(history, formulas, weights):
+    """Replays `history` under every (formula, EMA weight) pair. formulas: [(name, function)]."""
+    users, user_index = np.unique(history.user_ids, return_inverse=True)
+    group_count = len(MASTERY_GROUPS)
+    ratings = np.zeros((len(formulas), len(weights), len(users), group_count))
+    plays = np.zeros((len(users), group_count), dtype=np.int64)
+    if not len(history):
+        return Replay([f[0] for f in formulas], list(weights), users, ratings, plays)
+
+    # One segment per (user, group), plays kept in order inside it
+    segment = user_index.astype(np.int64) * group_count + history.groups
+    order = np.argsort(segment, kind='stable')
+    segment = segment[order]
+    starts = np.flatnonzero(np.r_[True, segment[1:] != segment[:-1]])
+    ends = np.r_[starts[1:], len(segment)]
+    # Plays after this one in its segment: the exponent of (1 - w)
+    after = np.repeat(ends, ends - starts) - np.arange(len(segment)) - 1
+    segment_ids = segment[starts]
+    plays.flat[segment_ids] = ends - starts
+
+    values = [np.asarray(function(history.columns), dtype=np.float64)[order] for _, function in formulas]
+    for w_index, weight in enumerate(weights):
+        decay = weight * (1 - weight) ** after
+        for f_index, formula_values in enumerate(values):
+            ratings[f_index, w_index].flat[segment_ids] = np.add.reduceat(decay * formula_values, starts)
+    return Replay([f[0] for f in formulas], list(weights), users, ratings, plays)
+
+# --- COMPARISON ---
+
+def _ranks(values):
+    ranks = np.empty(len(values))
+    ranks[np.argsort(values, kind='stable')] = np.arange(len(values))
+    return ranks
+
+def compare(result, baseline=(0, 0)):
+    """
+    One row per (formula, weight, group) over users with plays in the group: rating
+    distribution plus how far the ranking moves from the baseline candidate
+    (Spearman correlation, mean rank shift in percentiles, share of the top 10% kept).
+    """
+    rows = []
+    for g_index, group in enumerate(MASTERY_GROUPS):
+        played = result.plays[:, g_index] > 0
+        count = int(played.sum())
+        if not count:
+            continue
+        base = result.ratings[baseline[0], baseline[1], played, g_index]
+        base_ranks = _ranks(base)
+        top = max(count // 10, 1)
+        base_top = set(np.argsort(-base, kind='stable')[:top])
+        for f_index, name in enumerate(result.formulas):
+            for w_index, weight in enumerate(result.weights):
+                ratings = result.ratings[f_index, w_index, played, g_index]
+                ranks = _ranks(ratings)
+                spearman = np.corrcoef(base_ranks, ranks)[0, 1] if count > 1 else 1.0
+                kept = len(base_top & set(np.argsort(-ratings, kind='stable')[:top])) / top
+                rows.append({
+                    'group': group, 'formula': name, 'weight': weight, 'users': count,
+                    'mean': ratings.mean(), 'p50': np.percentile(ratings, 50), 'p90': np.percentile(ratings, 90),
+                    'max': ratings.max(),
+                    'spearman': 1.0 if np.isnan(spearman) else spearman,
+                    'rank_shift': np.abs(ranks - base_ranks).mean() / count * 100,
+                    'top10_kept': kept * 100,
+                })
+    return rows
+
+def stored_drift(result, stored, baseline=(0, 0)):
+    """(mean, max) absolute difference between the baseline replay and user_mastery, over rated groups."""
+    replayed = result.ratings[baseline[0], baseline[1]]
+    played = result.plays > 0
+    if not played.any():
+        return 0.0, 0.0
+    diff = np.abs(replayed[played] - stored[played])
+    return float(diff.mean()), float(diff.max())
+
+def format_table(rows, columns):
+    """Plain-text table of dict rows; floats rounded to 3 places."""
+    cells = [[f"{r[c]:.3f}" if isinstance(r[c], (float, np.floating)) else str(r[c]) for c in columns] for r in rows]
+    widths = [max([len(c)] + [len(row[i]) for row in cells]) for i, c in enumerate(columns)]
+    lines = ['  '.join(c.rjust(w) for c, w in zip(columns, widths)),
+             '  '.join('-' * w for w in widths)]
+    lines += ['  '.join(v.rjust(w) for v, w in zip(row, widths)) for row in cells]
+    return '\n'.join(lines)
@@ -0,0 +1,82 @@
+# windows.py
+
+# Time-windowed goal counters ("10 FCs within 7 days"). Each windowed goal keeps
+# a small ring buffer of per-bucket counts in user_active_goals.window_state, so a
+# new play is one increment and expiring old plays is just zeroing the slots the
+# clock has moved past - nothing is re-counted from score_history.
+import time
+from datetime import datetime
+
+# window -> (label, bucket size in seconds, number of buckets)
+# 'today' is a single UTC calendar-day bucket; the rolling windows are as precise as their bucket size.
+GOAL_WINDOWS = {
+    'today': ("today", 86400, 1),
+    '24h': ("within 24 hours", 3600, 24),
+    '7d': ("within 7 days", 6 * 3600, 28),
+    '30d': ("within 30 days", 86400, 30),
+}
+
+def to_epoch(value):
+    """Epoch seconds for an osu! ISO timestamp ('2024-01-01T12:00:00Z') or a datetime; now if missing."""
+    if isinstance(value, datetime):
+        return value.timestamp()
+    if value:
+        try:
+            return datetime.fromisoformat(value.replace('Z', '+00:00')).timestamp()
+        except (ValueError, AttributeError):
+            pass
+    return time.time()
+
+class RingCounter:
+    """Fixed-size ring of bucket counts; `head` is the absolute index of the newest bucket."""
+
+    def __init__(self, bucket_seconds, size, head=None, counts=None):
+        self.bucket_seconds = bucket_seconds
+        self.size = size
+        self.head = head
+        self.counts = list(counts) if counts and len(counts) == size else [0] * size
+
+    @classmethod
+    def for_window(cls, window, state=None):
+        _, bucket_seconds, size = GOAL_WINDOWS[window]
+        state = state or {}
+        if state.get('bucket_seconds') != bucket_seconds:
+            state = {}
+        return cls(bucket_seconds, size, state.get('head'), state.get('counts'))
+
+    def to_state(self):
+        return {'bucket_seconds': self.bucket_seconds, 'head': self.head, 'counts': self.counts}
+
+    def _advance(self, index):
+        """Moves the head forward to `index`, clearing the buckets that fell out of the window."""
+        if self.head is None or index - self.head >= self.size:
+            self.counts = [0] * self.size
+        else:
+            for i in range(self.head + 1, index + 1):
+                self.counts[i % self.size] = 0
+        self.head = index
+
+    def add(self, ts, amount=1):
+        """Counts a play at `ts`. Plays older than the window are ignored."""
+        index = int(ts // self.bucket_seconds)
+        if self.head is None or index > self.head:
+            self._advance(index)
+        elif index <= self.head - self.size:
+            return
+        self.counts[index % self.size] += amount
+
+    def total(self, now=None):
+        """Plays still inside the window at `now`."""
+        if self.head is None:
+            return 0
+        index = int((now if now is not None else time.time()) // self.bucket_seconds)
+        if index > self.head:
+            self._advance(index)
+        return sum(self.counts)
+
+def window_progress(criteria, window_state, now=None):
+    """Current in-window count for a windowed goal (for display; doesn't modify the stored state)."""
+    window = (criteria or {}).get('window')
+    if window not in GOAL_WINDOWS:
+        return None
+    return RingCounter.for_window(window, window_state).total(now)